@@ -0,0 +1,108 @@
+"""
+Micro-benchmark for decoding API responses into `Incarnation` and `IncarnationWithDetails` objects (and into
+records with only some of their fields) with the available JSON codecs, and for the memory used by the resulting
+objects. Also compares eager and lazy decoding of the template data with msgspec for growing template data, to
+show where lazy decoding starts to pay off.
+
+Usage: python benchmarks/parsing.py [--count 100000] [--variables 1,10,100]
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from stub_server import incarnation_details
+
+from foxops_client import Incarnation, IncarnationRecord, IncarnationWithDetails
+from foxops_client.serialization import JsonCodec, MsgspecCodec, OrjsonCodec
+
+
+def available_codecs() -> list[tuple[str, JsonCodec]]:
+    codecs: list[tuple[str, JsonCodec]] = [("json", JsonCodec())]
+    for name, codec in (
+        ("orjson", OrjsonCodec),
+        ("msgspec", MsgspecCodec),
+        ("msgspec, lazy", lambda: MsgspecCodec(lazy_template_data=True)),
+    ):
+        try:
+            codecs.append((name, codec()))
+        except ImportError:
+            pass
+    return codecs
+
+
+def details_with_variables(incarnation_id: int, variables: int) -> dict[str, Any]:
+    details = incarnation_details(incarnation_id)
+    details["template_data"] = {f"variable_{i}": f"value-{incarnation_id}-{i}" for i in range(variables)}
+    details["template_data_full"] = {**details["template_data"], "other_variable": "bar"}
+    return details
+
+
+def measure(name: str, decode: Callable[[bytes], list[Any]], payload: bytes, count: int) -> None:
+    start = time.perf_counter()
+    decode(payload)
+    parse_time = time.perf_counter() - start
+
+    # measure the memory held by the objects, including the decoded JSON they reference
+    gc.collect()
+    tracemalloc.start()
+    objects = decode(payload)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+
+    print(f"{name:>34} {parse_time / count * 1e6:>12.2f} {size / count:>14.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument(
+        "--variables",
+        type=lambda value: [int(x) for x in value.split(",")],
+        default=[1, 10, 100],
+        help="numbers of template variables to compare eager and lazy decoding with",
+    )
+    args = parser.parse_args()
+
+    payload = json.dumps([incarnation_details(i) for i in range(args.count)]).encode()
+
+    print(f"{'type (codec)':>34} {'parse (µs)':>12} {'bytes/object':>14}")
+    for name, codec in available_codecs():
+        for cls in (Incarnation, IncarnationWithDetails):
+            measure(
+                f"{cls.__name__} ({name})",
+                lambda data: codec.decode_list(data, cls),  # noqa: B023
+                payload,
+                args.count,
+            )
+
+        record = IncarnationRecord.of(IncarnationWithDetails, ["id", "commit_sha"])
+        measure(
+            f"id, commit_sha ({name})",
+            lambda data: codec.decode_records(data, record),  # noqa: B023
+            payload,
+            args.count,
+        )
+
+    try:
+        codecs = [("msgspec", MsgspecCodec()), ("msgspec, lazy", MsgspecCodec(lazy_template_data=True))]
+    except ImportError:
+        return
+
+    print(f"\n{'template variables (codec)':>34} {'parse (µs)':>12} {'bytes/object':>14}")
+    for variables in args.variables:
+        payload = json.dumps([details_with_variables(i, variables) for i in range(args.count)]).encode()
+        for name, codec in codecs:
+            measure(
+                f"{variables} ({name})",
+                lambda data: codec.decode_list(data, IncarnationWithDetails),  # noqa: B023
+                payload,
+                args.count,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Measures `get_incarnation` throughput of the async client against a local stub server for different pool sizes.
+
+Usage: python benchmarks/pool_size.py [--requests 2000] [--concurrency 200] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import time
+
+from stub_server import StubServer
+
+from foxops_client import AsyncFoxopsClient
+
+POOL_SIZES = [1, 5, 10, 25, 50, 100, 200]
+
+
+async def measure(url: str, pool_size: int, requests: int, concurrency: int) -> float:
+    async with AsyncFoxopsClient(
+        url, "dummy", max_connections=pool_size, max_keepalive_connections=pool_size
+    ) as client:
+        # warm up the connection pool
+        await client.get_incarnations(range(pool_size), concurrency=pool_size)
+
+        start = time.perf_counter()
+        await client.get_incarnations(range(requests), concurrency=concurrency)
+        elapsed = time.perf_counter() - start
+
+    return requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="server-side latency per request in seconds")
+    args = parser.parse_args()
+
+    with StubServer(latency=args.latency) as server:
+        print(f"{'pool size':>10} {'requests/s':>12}")
+        for pool_size in POOL_SIZES:
+            throughput = asyncio.run(measure(server.url, pool_size, args.requests, args.concurrency))
+            print(f"{pool_size:>10} {throughput:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
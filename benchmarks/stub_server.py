@@ -0,0 +1,80 @@
+"""
+A minimal threaded HTTP/1.1 server that mimics the FoxOps incarnation endpoints with a fixed latency.
+
+It's used by the benchmarks to exercise the real network stack (sockets, connection pool, keep-alive).
+The server runs in a separate process so that it doesn't compete with the client for the GIL.
+"""
+import json
+import multiprocessing
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+
+def incarnation_details(incarnation_id: int) -> dict[str, Any]:
+    return {
+        "id": incarnation_id,
+        "incarnation_repository": f"group/incarnation-{incarnation_id}",
+        "target_directory": ".",
+        "commit_sha": "0123456789abcdef0123456789abcdef01234567",
+        "commit_url": f"https://gitlab.example.com/group/incarnation-{incarnation_id}/-/commit/0123456789abcdef",
+        "merge_request_id": None,
+        "merge_request_url": None,
+        "merge_request_status": None,
+        "template_repository": "group/template",
+        "template_repository_version": "v1.0.0",
+        "template_repository_version_hash": "fedcba9876543210fedcba9876543210fedcba98",
+        "template_data": {"input_variable": "foo"},
+        "template_data_full": {"input_variable": "foo", "other_variable": "bar"},
+    }
+
+
+class StubServer:
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.process: multiprocessing.Process | None = None
+        self.port: int | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "StubServer":
+        parent_conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_serve, args=(self.latency, child_conn), daemon=True)
+        self.process.start()
+        self.port = parent_conn.recv()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+
+
+def _serve(latency: float, conn) -> None:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latency)
+
+            incarnation_id = int(self.path.rsplit("/", 1)[-1])
+            body = json.dumps(incarnation_details(incarnation_id)).encode()
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+
+    conn.send(server.server_address[1])
+    server.serve_forever()
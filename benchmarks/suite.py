@@ -0,0 +1,264 @@
+"""
+Offline benchmark suite for the FoxOps client. Runs every client method (async and sync) against the in-process
+`FakeFoxopsServer` and reports throughput, latency percentiles, parse cost and memory usage.
+
+Results can be written to a JSON file and compared against a baseline, failing on regressions:
+
+    python benchmarks/suite.py --output baseline.json
+    python benchmarks/suite.py --baseline baseline.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+from foxops_client import AsyncFoxopsClient, FoxopsClient
+from foxops_client.serialization import default_codec
+from foxops_client.testing import FakeFoxopsServer
+from foxops_client.types import Incarnation, IncarnationWithDetails
+
+AsyncCall = Callable[[AsyncFoxopsClient, int], Awaitable[Any]]
+SyncCall = Callable[[FoxopsClient, int], Any]
+
+
+async def _iter_incarnations(client: AsyncFoxopsClient, i: int) -> None:
+    async for _ in client.iter_incarnations():
+        pass
+
+
+ASYNC_SCENARIOS: dict[str, AsyncCall] = {
+    "verify_token": lambda c, i: c.verify_token(),
+    "list_incarnations": lambda c, i: c.list_incarnations(),
+    "iter_incarnations": _iter_incarnations,
+    "get_incarnation": lambda c, i: c.get_incarnation(i + 1),
+    "get_incarnations": lambda c, i: c.get_incarnations(range(1, 11)),
+    "patch_incarnation": lambda c, i: c.patch_incarnation(i + 1, automerge=True, requested_data={"input": str(i)}),
+    "put_incarnation": lambda c, i: c.put_incarnation(i + 1, True, "v2.0.0", {"input": str(i)}),
+    "create_incarnation": lambda c, i: c.create_incarnation(f"bench/new-{i}", "group/template", "v1.0.0", {}),
+    "delete_incarnation": lambda c, i: c.delete_incarnation(i + 1),
+}
+
+SYNC_SCENARIOS: dict[str, SyncCall] = {
+    "verify_token": lambda c, i: c.verify_token(),
+    "list_incarnations": lambda c, i: c.list_incarnations(),
+    "iter_incarnations": lambda c, i: list(c.iter_incarnations()),
+    "get_incarnation": lambda c, i: c.get_incarnation(i + 1),
+    "get_incarnations": lambda c, i: c.get_incarnations(range(1, 11)),
+    "patch_incarnation": lambda c, i: c.patch_incarnation(i + 1, automerge=True, requested_data={"input": str(i)}),
+    "put_incarnation": lambda c, i: c.put_incarnation(i + 1, True, "v2.0.0", {"input": str(i)}),
+    "create_incarnation": lambda c, i: c.create_incarnation(f"bench/new-{i}", "group/template", "v1.0.0", {}),
+    "delete_incarnation": lambda c, i: c.delete_incarnation(i + 1),
+}
+
+# response payloads whose parse cost is measured separately
+PARSED_PAYLOADS: dict[str, tuple[str, type[Incarnation], bool]] = {
+    "list_incarnations": ("/api/incarnations", Incarnation, True),
+    "iter_incarnations": ("/api/incarnations", Incarnation, True),
+    "get_incarnation": ("/api/incarnations/1", IncarnationWithDetails, False),
+    "get_incarnations": ("/api/incarnations/1", IncarnationWithDetails, False),
+}
+
+
+@dataclass
+class Result:
+    scenario: str
+    mode: str
+    requests_per_second: float
+    p50_ms: float
+    p99_ms: float
+    parse_us: float | None
+    peak_memory_kib: float
+    # calls that failed, e.g. because the retries for the errors of the server were exhausted
+    errors: int = 0
+
+
+def create_server(args: argparse.Namespace) -> FakeFoxopsServer:
+    server = FakeFoxopsServer(
+        latency=args.latency, error_rate=args.error_rate, template_data_size=args.template_data_size, seed=0
+    )
+    server.add_incarnations(args.incarnations, template_data={"input": "foo"})
+    return server
+
+
+async def run_async(
+    call: AsyncCall, client: AsyncFoxopsClient, requests: int, concurrency: int
+) -> list[tuple[float, bool]]:
+    """Returns the latency of every call, and whether it failed."""
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[tuple[float, bool]] = []
+
+    async def timed(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await call(client, i)
+            except Exception:
+                latencies.append((time.perf_counter() - start, True))
+            else:
+                latencies.append((time.perf_counter() - start, False))
+
+    await asyncio.gather(*[timed(i) for i in range(requests)])
+    return latencies
+
+
+def run_sync(call: SyncCall, client: FoxopsClient, requests: int, concurrency: int) -> list[tuple[float, bool]]:
+    """Returns the latency of every call, and whether it failed."""
+
+    def timed(i: int) -> tuple[float, bool]:
+        start = time.perf_counter()
+        try:
+            call(client, i)
+        except Exception:
+            return time.perf_counter() - start, True
+        return time.perf_counter() - start, False
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        return list(executor.map(timed, range(requests)))
+
+
+def measure(scenario: str, mode: str, args: argparse.Namespace) -> Result:
+    def run(requests: int) -> tuple[list[tuple[float, bool]], float]:
+        server = create_server(args)
+        start = time.perf_counter()
+        if mode == "async":
+
+            async def main() -> list[tuple[float, bool]]:
+                async with AsyncFoxopsClient("http://foxops", server.token, transport=server.transport()) as client:
+                    return await run_async(ASYNC_SCENARIOS[scenario], client, requests, args.concurrency)
+
+            latencies = asyncio.run(main())
+        else:
+            with FoxopsClient("http://foxops", server.token, transport=server.transport()) as client:
+                latencies = run_sync(SYNC_SCENARIOS[scenario], client, requests, args.concurrency)
+        return latencies, time.perf_counter() - start
+
+    calls, elapsed = run(args.requests)
+    latencies = [latency for latency, _ in calls]
+
+    tracemalloc.start()
+    run(max(1, args.requests // 10))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return Result(
+        scenario=scenario,
+        mode=mode,
+        requests_per_second=len(latencies) / elapsed,
+        p50_ms=quantiles[49] * 1000,
+        p99_ms=quantiles[98] * 1000,
+        parse_us=measure_parse(scenario, args),
+        peak_memory_kib=peak / 1024,
+        errors=sum(failed for _, failed in calls),
+    )
+
+
+def measure_parse(scenario: str, args: argparse.Namespace) -> float | None:
+    if scenario not in PARSED_PAYLOADS:
+        return None
+
+    path, cls, many = PARSED_PAYLOADS[scenario]
+    server = create_server(args)
+    request = httpx.Request("GET", f"http://foxops{path}", headers={"Authorization": f"Bearer {server.token}"})
+    payload = asyncio.run(server.handle(request)).content
+    codec = default_codec()
+
+    rounds = 20
+    start = time.perf_counter()
+    for _ in range(rounds):
+        if many:
+            codec.decode_list(payload, cls)
+        else:
+            codec.decode_object(payload, cls)
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def compare(results: list[Result], baseline_path: str, tolerance: float) -> list[str]:
+    with open(baseline_path) as f:
+        baseline = {(x["scenario"], x["mode"]): x for x in json.load(f)}
+
+    regressions = []
+    for result in results:
+        base = baseline.get((result.scenario, result.mode))
+        if base is None:
+            continue
+
+        name = f"{result.scenario} ({result.mode})"
+        if result.requests_per_second < base["requests_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {result.requests_per_second:.0f} req/s (baseline {base['requests_per_second']:.0f})"
+            )
+        if result.p99_ms > base["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {result.p99_ms:.2f}ms (baseline {base['p99_ms']:.2f}ms)")
+        if (
+            result.parse_us is not None
+            and base.get("parse_us") is not None
+            and result.parse_us > base["parse_us"] * (1 + tolerance)
+        ):
+            regressions.append(f"{name}: parse {result.parse_us:.1f}µs (baseline {base['parse_us']:.1f}µs)")
+        if result.peak_memory_kib > base["peak_memory_kib"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: peak memory {result.peak_memory_kib:.0f}KiB (baseline {base['peak_memory_kib']:.0f}KiB)"
+            )
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--incarnations", type=int, default=1000, help="number of incarnations on the fake server")
+    parser.add_argument("--latency", type=float, default=0.0, help="server latency per request in seconds")
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="fraction of requests that fail with 503 Service Unavailable"
+    )
+    parser.add_argument("--template-data-size", type=int, default=0, help="bytes of filler in template_data_full")
+    parser.add_argument("--scenario", action="append", choices=ASYNC_SCENARIOS, help="run only the given scenario(s)")
+    parser.add_argument("--mode", action="append", choices=["async", "sync"], help="run only the given mode(s)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results to this JSON file and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    if args.requests > args.incarnations:
+        parser.error("--requests must not be larger than --incarnations")
+
+    print(
+        f"{'scenario':>20} {'mode':>6} {'req/s':>10} {'p50 (ms)':>10} {'p99 (ms)':>10} {'parse (µs)':>11} {'peak KiB':>10}"
+        f" {'errors':>7}"
+    )
+    results = []
+    for scenario in args.scenario or ASYNC_SCENARIOS:
+        for mode in args.mode or ["async", "sync"]:
+            r = measure(scenario, mode, args)
+            results.append(r)
+            parse = f"{r.parse_us:.1f}" if r.parse_us is not None else "-"
+            print(
+                f"{r.scenario:>20} {r.mode:>6} {r.requests_per_second:>10.0f} {r.p50_ms:>10.2f} {r.p99_ms:>10.2f}"
+                f" {parse:>11} {r.peak_memory_kib:>10.0f} {r.errors:>7}"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump([asdict(r) for r in results], f, indent=2)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
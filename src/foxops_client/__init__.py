@@ -4,10 +4,16 @@ from foxops_client.client_async import AsyncFoxopsClient
 from foxops_client.client_sync import FoxopsClient
 from foxops_client.exceptions import (
     AuthenticationError,
+    CircuitOpenError,
     FoxopsApiError,
     IncarnationDoesNotExistError,
 )
-from foxops_client.types import Incarnation, IncarnationWithDetails, MergeRequestStatus
+from foxops_client.types import (
+    Incarnation,
+    IncarnationRecord,
+    IncarnationWithDetails,
+    MergeRequestStatus,
+)
 
 __version__ = version("foxops_client")
 
@@ -17,9 +23,11 @@ __all__ = [
     # Types
     "Incarnation",
     "IncarnationWithDetails",
+    "IncarnationRecord",
     "MergeRequestStatus",
     # Exceptions
     "FoxopsApiError",
     "AuthenticationError",
     "IncarnationDoesNotExistError",
+    "CircuitOpenError",
 ]
@@ -0,0 +1,51 @@
+"""Building blocks of the bulk operations: rollouts, provisioning and reconciliation."""
+import asyncio
+from enum import Enum
+from typing import Any, Awaitable, Callable, ClassVar, Generic, Sequence, TypeVar, cast
+
+T = TypeVar("T")
+U = TypeVar("U")
+R = TypeVar("R")
+S = TypeVar("S", bound=Enum)
+
+
+class StatusReport(Generic[R, S]):
+    """
+    Base of reports that consist of results with a status.
+
+    Subclasses are dataclasses that set `_statuses` to the enum of the statuses, and `_results` and `_status` to the
+    names of the attributes that hold the results and the status of a result, if they differ from the defaults.
+    """
+
+    _statuses: ClassVar[type[Enum]]
+    _results: ClassVar[str] = "results"
+    _status: ClassVar[str] = "status"
+
+    def with_status(self, status: S) -> list[R]:
+        return [r for r in getattr(self, self._results) if getattr(r, self._status) == status]
+
+    def counts(self) -> dict[S, int]:
+        counts = {cast(S, status): 0 for status in self._statuses}
+        for r in getattr(self, self._results):
+            counts[getattr(r, self._status)] += 1
+        return counts
+
+
+async def run_bounded(items: Sequence[T], concurrency: int, fn: Callable[[T], Awaitable[U]]) -> list[U]:
+    """
+    Calls `fn` for every item, with at most `concurrency` calls running at the same time, and returns the results in
+    the order of the items. The calls are started in the order of the items.
+    """
+
+    results: list[Any] = [None] * len(items)
+    pending = iter(enumerate(items))
+
+    async def worker() -> None:
+        for i, item in pending:
+            results[i] = await fn(item)
+
+    async with asyncio.TaskGroup() as tg:
+        for _ in range(min(concurrency, len(items))):
+            tg.create_task(worker())
+
+    return results
@@ -0,0 +1,52 @@
+"""Comparison of template data and versions, to find out which writes actually change an incarnation."""
+import re
+from typing import Any, Mapping
+
+_MISSING = object()
+
+# refs that always point to the same commit: version tags (`v1.2.3`, `1.2.0-rc1`) and commit hashes
+_VERSION_TAG = re.compile(r"v?\d+(\.\d+)*([-+][0-9A-Za-z.-]+)?")
+_COMMIT_HASH = re.compile(r"[0-9a-f]{7,40}")
+
+
+def changed_data(actual: Mapping[str, Any] | None, desired: Mapping[str, Any]) -> dict[str, Any]:
+    """Returns the variables of `desired` that are missing in `actual` or have a different value there."""
+
+    actual = actual or {}
+    return {key: value for key, value in desired.items() if not same_value(actual.get(key, _MISSING), value)}
+
+
+def removed_keys(actual: Mapping[str, Any] | None, desired: Mapping[str, Any]) -> list[str]:
+    """Returns the variables of `actual` that are not in `desired`."""
+
+    return [key for key in actual or {} if key not in desired]
+
+
+def same_version(requested: str, current_version: str | None, current_hash: str | None) -> bool:
+    """
+    Whether an incarnation that is on `current_version` (which resolved to the commit `current_hash`) is already on
+    the requested version of its template.
+
+    Branches (and other refs that are neither a version tag nor a commit hash) might have moved since the incarnation
+    was updated, so they never count as the same version. Updating to them again picks up their new commits.
+    """
+
+    if _COMMIT_HASH.fullmatch(requested) and current_hash and current_hash.startswith(requested):
+        return True
+    return requested == current_version and (
+        _VERSION_TAG.fullmatch(requested) is not None or _COMMIT_HASH.fullmatch(requested) is not None
+    )
+
+
+def same_value(a: Any, b: Any) -> bool:
+    """Compares JSON values. Unlike `==`, booleans are not equal to numbers (`True != 1`)."""
+
+    if isinstance(a, bool) or isinstance(b, bool):
+        return a is b
+    if isinstance(a, Mapping) and isinstance(b, Mapping):
+        return len(a) == len(b) and all(key in b and same_value(value, b[key]) for key, value in a.items())
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(same_value(x, y) for x, y in zip(a, b))
+    if isinstance(a, (Mapping, list, tuple)) or isinstance(b, (Mapping, list, tuple)):
+        return False
+    return a == b
@@ -0,0 +1,280 @@
+import asyncio
+import copy
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import Any, Hashable, Iterator
+
+from foxops_client.dispatch import Call, CallHandler, Result
+from foxops_client.exceptions import FoxopsApiError
+from foxops_client.types import IncarnationWithDetails
+
+GET_INCARNATION = "get_incarnation"
+LIST_INCARNATIONS = "list_incarnations"
+CACHEABLE_ENDPOINTS = (GET_INCARNATION, LIST_INCARNATIONS)
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    revalidations: int = 0
+    # stale entries that were served while being revalidated in the background
+    stale_hits: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    etag: str | None
+    expires_at: float
+
+    def is_fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+
+@dataclass
+class ResponseCache:
+    """
+    In-memory LRU cache for the parsed responses of read endpoints of the FoxOps API.
+
+    Entries expire after the TTL of their endpoint. Expired entries that came with an `ETag` are kept and
+    revalidated with a conditional request (`If-None-Match`) instead of being downloaded again.
+    Writes through the client invalidate the affected entries.
+
+    Entries that expired less than `stale_while_revalidate` seconds ago are still served, while they are revalidated
+    in the background (or downloaded again, if they don't have an ETag). This is useful together with snapshots
+    (see `foxops_client.snapshot`).
+
+    Every invalidation increments the generation of the affected keys. Responses that were requested before an
+    invalidation are not stored anymore, as they might not contain the write yet (see `generation`).
+    """
+
+    get_incarnation_ttl: float = 30.0
+    list_incarnations_ttl: float = 10.0
+    max_entries: int = 10_000
+    stale_while_revalidate: float = 0.0
+
+    stats: CacheStats = field(default_factory=CacheStats)
+    _entries: OrderedDict[tuple[str, Hashable], CacheEntry] = field(default_factory=OrderedDict, repr=False)
+    # keys of all cached lists, which need to be invalidated on every write
+    _list_keys: set[tuple[str, Hashable]] = field(default_factory=set, repr=False)
+    # generations of the incarnations that were invalidated (lists share a single generation, as every write
+    # invalidates all of them)
+    _generations: dict[Hashable, int] = field(default_factory=dict, repr=False)
+    _list_generation: int = field(default=0, repr=False)
+
+    def ttl(self, endpoint: str) -> float:
+        if endpoint == GET_INCARNATION:
+            return self.get_incarnation_ttl
+        if endpoint == LIST_INCARNATIONS:
+            return self.list_incarnations_ttl
+
+        raise ValueError(f"endpoint {endpoint} is not cacheable")
+
+    def lookup(self, endpoint: str, key: Hashable) -> CacheEntry | None:
+        """
+        Returns the cache entry for the given request.
+
+        The entry might be stale, in which case it must be revalidated using its ETag before it can be used.
+        Stale entries without ETag are only returned while they may still be served (see `serve_stale`).
+        """
+
+        entry = self._entries.get((endpoint, key))
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        if entry.is_fresh():
+            self.stats.hits += 1
+            self._entries.move_to_end((endpoint, key))
+            return entry
+
+        if entry.etag is None and not self.serve_stale(entry):
+            self.stats.misses += 1
+            self._remove((endpoint, key))
+            return None
+
+        return entry
+
+    def generation(self, endpoint: str, key: Hashable) -> int:
+        """Returns the current generation of the key, which changes whenever the key is invalidated."""
+
+        if endpoint == LIST_INCARNATIONS:
+            return self._list_generation
+        return self._generations.get(key, 0)
+
+    def store(
+        self, endpoint: str, key: Hashable, value: Any, etag: str | None = None, generation: int | None = None
+    ) -> None:
+        """
+        Adds the value to the cache.
+
+        If the `generation` of the key at the time the value was requested is given, the value is only stored if
+        the key wasn't invalidated since then.
+        """
+
+        if generation is not None and generation != self.generation(endpoint, key):
+            return
+        self.restore(endpoint, key, CacheEntry(value, etag, time.monotonic() + self.ttl(endpoint)))
+
+    def restore(self, endpoint: str, key: Hashable, entry: CacheEntry) -> None:
+        """Adds an existing entry, e.g. from a snapshot, keeping its expiry time."""
+
+        self._entries[(endpoint, key)] = entry
+        self._entries.move_to_end((endpoint, key))
+        if endpoint == LIST_INCARNATIONS:
+            self._list_keys.add((endpoint, key))
+
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._list_keys.discard(evicted)
+            self.stats.evictions += 1
+
+    def revalidated(self, endpoint: str, key: Hashable, entry: CacheEntry, generation: int | None = None) -> CacheEntry:
+        """Marks the entry as fresh again, after the server confirmed that it was not modified."""
+
+        self.store(endpoint, key, entry.value, entry.etag, generation)
+        self.stats.revalidations += 1
+
+        return self._entries.get((endpoint, key), entry)
+
+    def invalidate_incarnation(self, incarnation_id: int | None = None) -> None:
+        """
+        Removes all entries that might contain the given incarnation.
+
+        This includes all cached lists, as they might contain the incarnation (or not contain a newly created one).
+        """
+
+        self._list_generation += 1
+        self._generations[incarnation_id] = self._generations.get(incarnation_id, 0) + 1
+
+        keys = list(self._list_keys)
+        if (GET_INCARNATION, incarnation_id) in self._entries:
+            keys.append((GET_INCARNATION, incarnation_id))
+
+        for k in keys:
+            self._remove(k)
+
+        self.stats.invalidations += len(keys)
+
+    def serve_stale(self, entry: CacheEntry) -> bool:
+        """Whether the stale entry may still be served while it's being revalidated."""
+
+        return time.monotonic() < entry.expires_at + self.stale_while_revalidate
+
+    def discard(self, endpoint: str, key: Hashable) -> None:
+        if (endpoint, key) in self._entries:
+            self._remove((endpoint, key))
+
+    def entries(self) -> Iterator[tuple[str, Hashable, CacheEntry]]:
+        """Returns all entries (including stale ones) from the least to the most recently used."""
+
+        for (endpoint, key), entry in list(self._entries.items()):
+            yield endpoint, key, entry
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._list_keys.clear()
+
+    def _remove(self, key: tuple[str, Hashable]) -> None:
+        del self._entries[key]
+        self._list_keys.discard(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CacheMiddleware:
+    """
+    Answers cacheable reads from a `ResponseCache` (revalidating stale entries) and invalidates it on writes.
+
+    Every caller gets its own copy of cached incarnations, so changing their template data doesn't change the cache.
+    """
+
+    def __init__(self, cache: ResponseCache):
+        self.cache = cache
+
+        self._revalidating: set[tuple[str, Hashable]] = set()
+        self._tasks: set[asyncio.Task[Any]] = set()
+
+    async def __call__(self, call: Call, call_next: CallHandler) -> Result:
+        endpoint = call.endpoint.name
+
+        if not call.endpoint.is_read:
+            try:
+                return await call_next(call)
+            finally:
+                self.cache.invalidate_incarnation(call.incarnation_id)
+
+        if endpoint not in CACHEABLE_ENDPOINTS or call.record is not None:
+            # projections are not cached, the cache only holds complete incarnations
+            return await call_next(call)
+
+        cached = self.cache.lookup(endpoint, call.key)
+        if cached is not None:
+            if cached.is_fresh():
+                return Result(_copy(cached.value))
+            if self.cache.serve_stale(cached):
+                self.cache.stats.stale_hits += 1
+                self._revalidate_in_background(call, call_next, cached)
+                return Result(_copy(cached.value))
+
+        return await self._fetch(call, call_next, cached)
+
+    async def _fetch(self, call: Call, call_next: CallHandler, cached: CacheEntry | None) -> Result:
+        endpoint = call.endpoint.name
+
+        if cached is not None and cached.etag is not None:
+            call.headers["If-None-Match"] = cached.etag
+
+        generation = self.cache.generation(endpoint, call.key)
+        result = await call_next(call)
+        if result.not_modified and cached is not None:
+            entry = self.cache.revalidated(endpoint, call.key, cached, generation)
+            return Result(_copy(entry.value), result.response)
+
+        assert result.response is not None
+        etag = result.response.headers.get("ETag")
+        self.cache.store(endpoint, call.key, _copy(result.value), etag, generation)
+        return result
+
+    def _revalidate_in_background(self, call: Call, call_next: CallHandler, cached: CacheEntry) -> None:
+        key = (call.endpoint.name, call.key)
+        if key in self._revalidating:
+            return
+
+        async def revalidate() -> None:
+            try:
+                await self._fetch(call, call_next, cached)
+            except FoxopsApiError:
+                # e.g. the incarnation was deleted
+                self.cache.discard(*key)
+            except Exception as e:
+                # the entry stays stale, the next lookup tries again
+                log.debug(f"failed to revalidate {key}: {e!r}")
+            finally:
+                self._revalidating.discard(key)
+
+        self._revalidating.add(key)
+        task = asyncio.create_task(revalidate())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+def _copy(value: Any) -> Any:
+    # incarnations are immutable, apart from their template data
+    if isinstance(value, list):
+        return [_copy(x) for x in value]
+    if isinstance(value, IncarnationWithDetails):
+        return replace(
+            value,
+            template_data=copy.deepcopy(value.template_data),
+            template_data_full=copy.deepcopy(value.template_data_full),
+        )
+    return value
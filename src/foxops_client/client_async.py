@@ -1,16 +1,45 @@
+import asyncio
 import logging
-from typing import Any
+from functools import partial
+from typing import Any, AsyncGenerator, Callable, Iterable, Self, overload
 
 import httpx
-from httpx import Response
 
-from foxops_client.exceptions import (
-    AuthenticationError,
-    FoxopsApiError,
-    IncarnationDoesNotExistError,
+from foxops_client.cache import CacheMiddleware, ResponseCache
+from foxops_client.dispatch import (
+    CREATE_INCARNATION,
+    DELETE_INCARNATION,
+    GET_INCARNATION,
+    LIST_INCARNATIONS,
+    PATCH_INCARNATION,
+    PUT_INCARNATION,
+    VERIFY_TOKEN,
+    Call,
+    Dispatcher,
+    Middleware,
+    SendMiddleware,
+)
+from foxops_client.elision import WriteElisionMiddleware
+from foxops_client.exceptions import FoxopsApiError
+from foxops_client.hedging import RequestHedger
+from foxops_client.instrumentation import Observer
+from foxops_client.limits import (
+    AdaptiveConcurrencyLimiter,
+    CircuitBreaker,
+    RateLimiter,
+)
+from foxops_client.retries import RetryAttempt, RetryBudget, retry_policy
+from foxops_client.serialization import JsonCodec, default_codec
+from foxops_client.singleflight import CoalescingMiddleware, SingleFlight
+from foxops_client.streaming import iter_json_array
+from foxops_client.types import (
+    Incarnation,
+    IncarnationRecord,
+    IncarnationWithDetails,
+    TemplateData,
 )
-from foxops_client.retries import default_retry
-from foxops_client.types import Incarnation, IncarnationWithDetails, TemplateData
+
+DEFAULT_TIMEOUT = httpx.Timeout(120.0, connect=60.0)
 
 
 class AsyncFoxopsClient:
@@ -23,80 +52,281 @@ class AsyncFoxopsClient:
     It does not contain any business logic.
     """
 
-    def __init__(self, base_url: str, token: str):
-        self.retry_function = default_retry()
+    def __init__(
+        self,
+        base_url: str,
+        token: str,
+        max_connections: int | None = 10,
+        max_keepalive_connections: int | None = 5,
+        keepalive_expiry: float | None = 5.0,
+        timeout: httpx.Timeout | float | None = DEFAULT_TIMEOUT,
+        http2: bool = False,
+        retry_budget: RetryBudget | None = None,
+        on_retry: Callable[[RetryAttempt], None] | None = None,
+        cache: ResponseCache | None = None,
+        coalesce_reads: bool = False,
+        codec: JsonCodec | None = None,
+        client: httpx.AsyncClient | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+        observers: Iterable[Observer] = (),
+        rate_limiter: RateLimiter | None = None,
+        concurrency_limiter: AdaptiveConcurrencyLimiter | None = None,
+        skip_unchanged_writes: bool = False,
+        circuit_breaker: CircuitBreaker | None = None,
+        hedger: RequestHedger | None = None,
+    ):
+        """
+        :param max_connections: maximum number of concurrent connections to the FoxOps API (None for no limit)
+        :param max_keepalive_connections: maximum number of idle connections kept in the pool
+        :param keepalive_expiry: time in seconds after which idle connections are closed
+        :param timeout: request timeout. Pass an `httpx.Timeout` to configure the connect, read, write and pool
+            phases individually
+        :param http2: enable HTTP/2, which multiplexes concurrent requests over a single connection.
+            Requires the `h2` package (`pip install httpx[http2]`)
+        :param retry_budget: limits the number of retries of this client to a fraction of its requests.
+            Can be shared between clients. Defaults to a new budget per client
+        :param on_retry: hook that is called whenever a request is about to be retried
+        :param cache: cache for the responses of `get_incarnation` and `list_incarnations`. Disabled by default
+        :param coalesce_reads: let concurrent identical calls of `get_incarnation` and `list_incarnations` share
+            a single request and its result
+        :param codec: used to encode request and decode response bodies. Defaults to `JsonCodec`, which uses the
+            standard library; faster codecs are opt-in (see `foxops_client.serialization`)
+        :param client: an existing `httpx.AsyncClient` to send the requests with, e.g. to share one connection pool
+            between many FoxOps clients. The connection pool and timeout settings of this client are ignored then,
+            and the given client is not closed by `aclose`
+        :param transport: the transport used by the `httpx.AsyncClient` that is created by this client
+        :param observers: get notified about every API call, e.g. to collect metrics (see `foxops_client.instrumentation`)
+        :param rate_limiter: limits the request rate, separately for reads and writes (see `foxops_client.limits`)
+        :param concurrency_limiter: limits the number of concurrent requests and adapts the limit to the load of the
+            server (see `foxops_client.limits`)
+        :param skip_unchanged_writes: compare `patch_incarnation` and `put_incarnation` calls with the current state
+            of the incarnation, skip those that wouldn't change anything and only send the template variables that
+            changed (see `foxops_client.elision`). Costs a read per write, which can be served from the `cache`
+        :param circuit_breaker: fails requests immediately with `CircuitOpenError` while the server is unhealthy
+            (see `foxops_client.limits`)
+        :param hedger: sends a second request for reads that take unusually long and uses the first response
+            (see `foxops_client.hedging`)
+        """
+
+        self.retry_budget = retry_budget or RetryBudget()
+        self.retrying = retry_policy(budget=self.retry_budget, on_retry=on_retry)
         self.log: logging.Logger = logging.getLogger(self.__class__.__name__)
-
-        self.client = httpx.AsyncClient(
-            base_url=base_url,
-            headers={"Authorization": f"Bearer {token}"},
+        self.cache = cache
+        self.single_flight = SingleFlight() if coalesce_reads else None
+        self.write_elision = WriteElisionMiddleware() if skip_unchanged_writes else None
+        self.codec = codec or default_codec()
+        self.observers = list(observers)
+
+        # the base URL and credentials are added to every request (instead of configuring them on the httpx client),
+        # so that an httpx client can be shared between FoxOps clients for different servers or tokens
+        self.base_url = base_url.rstrip("/")
+
+        self._owns_client = client is None
+        self._new_client = partial(
+            httpx.AsyncClient,
             verify=True,
-            timeout=httpx.Timeout(120.0, connect=60.0),
-            limits=httpx.Limits(max_keepalive_connections=5, max_connections=10),
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            http2=http2,
+            transport=transport,
+        )
+        self.client = client or self._new_client()
+
+        middlewares: list[Middleware] = []
+        if self.write_elision is not None:
+            # first, so that its reads of the current state go through the coalescing and the cache
+            middlewares.append(self.write_elision)
+        if self.single_flight is not None:
+            middlewares.append(CoalescingMiddleware(self.single_flight))
+        if self.cache is not None:
+            middlewares.append(CacheMiddleware(self.cache))
+
+        send_middlewares: list[SendMiddleware] = []
+        if hedger is not None:
+            # first, so that hedges go through the circuit breaker and the limiters as well
+            send_middlewares.append(hedger)
+        # the circuit breaker comes first, so that rejected requests don't wait for the limiters
+        for limiter in (circuit_breaker, rate_limiter, concurrency_limiter):
+            if limiter is not None:
+                limiter.observe(self.observers)
+                send_middlewares.append(limiter)
+
+        self._dispatch = Dispatcher(
+            self.client,
+            self.base_url,
+            {"Authorization": f"Bearer {token}"},
+            self.codec,
+            self.retrying,
+            self.log,
+            self.observers,
+            middlewares,
+            send_middlewares,
         )
 
-    def _handle_unexpected_response(self, resp: Response):
-        if resp.status_code == httpx.codes.UNAUTHORIZED:
-            self.log.error(f"Authentication failed with status code 401: {resp.text}")
-            raise AuthenticationError()
+    async def aclose(self) -> None:
+        """Closes the connections of this client. Clients that were passed in via `client` are left open."""
 
-        self.log.error(f"received unexpected response from FoxOps API: {resp.status_code} {resp.headers} {resp.text}")
-        self.log.error(f"request: {resp.request.method} {resp.request.url}")
+        if self._owns_client:
+            await self.client.aclose()
 
-        resp.raise_for_status()
+    def _reset_connections(self) -> None:
+        """
+        Replaces the connection pool after the process was forked. The inherited connections share their sockets
+        with the parent process, so they must neither be used nor closed by the child.
 
-    async def verify_token(self):
-        resp = await self.retry_function(self.client.get)("/auth/test")
+        Clients that were passed in via `client` are kept, it's up to their owner to not use them across a fork.
+        """
 
-        if resp.status_code == httpx.codes.OK:
-            return
+        if self._owns_client:
+            self.client = self._dispatch.client = self._new_client()
 
-        self._handle_unexpected_response(resp)
-        raise ValueError("unexpected response")
+    async def __aenter__(self) -> Self:
+        return self
 
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def verify_token(self):
+        await self._dispatch(Call(VERIFY_TOKEN))
+
+    @overload
     async def list_incarnations(
-        self, incarnation_repository: str | None = None, target_directory: str | None = None
+        self, incarnation_repository: str | None = None, target_directory: str | None = None, *, fields: None = None
     ) -> list[Incarnation]:
-        params = {}
-        if incarnation_repository is not None:
-            params["incarnation_repository"] = incarnation_repository
-        if target_directory is not None:
-            params["target_directory"] = target_directory
+        ...
 
-        resp = await self.retry_function(self.client.get)("/api/incarnations", params=params)
+    @overload
+    async def list_incarnations(
+        self, incarnation_repository: str | None = None, target_directory: str | None = None, *, fields: Iterable[str]
+    ) -> list[IncarnationRecord]:
+        ...
 
-        match resp.status_code:
-            case httpx.codes.OK:
-                return [Incarnation.from_dict(x) for x in resp.json()]
-            case httpx.codes.NOT_FOUND:
-                raise IncarnationDoesNotExistError(resp.json()["message"])
+    async def list_incarnations(
+        self,
+        incarnation_repository: str | None = None,
+        target_directory: str | None = None,
+        *,
+        fields: Iterable[str] | None = None,
+    ) -> list[Incarnation] | list[IncarnationRecord]:
+        """
+        :param fields: only decode these fields of the incarnations and return them as `IncarnationRecord`s,
+            which is much faster for large lists. The API always returns all fields
+        """
+
+        call = Call(
+            LIST_INCARNATIONS,
+            params=_list_params(incarnation_repository, target_directory),
+            record=_record_type(Incarnation, fields),
+        )
+        # the list might be shared with the cache or with coalesced callers, every caller gets its own copy
+        return list(await self._dispatch(call))
+
+    @overload
+    def iter_incarnations(
+        self, incarnation_repository: str | None = None, target_directory: str | None = None, *, fields: None = None
+    ) -> AsyncGenerator[Incarnation, None]:
+        ...
+
+    @overload
+    def iter_incarnations(
+        self, incarnation_repository: str | None = None, target_directory: str | None = None, *, fields: Iterable[str]
+    ) -> AsyncGenerator[IncarnationRecord, None]:
+        ...
+
+    async def iter_incarnations(
+        self,
+        incarnation_repository: str | None = None,
+        target_directory: str | None = None,
+        *,
+        fields: Iterable[str] | None = None,
+    ) -> AsyncGenerator[Incarnation | IncarnationRecord, None]:
+        """
+        Like `list_incarnations`, but parses the response incrementally while it's being received and yields the
+        incarnations one by one. Memory usage is independent of the number of incarnations.
+
+        The FoxOps API doesn't support pagination, so all incarnations are still transferred in a single response.
+        """
+
+        record = _record_type(Incarnation, fields)
+        call = Call(LIST_INCARNATIONS, params=_list_params(incarnation_repository, target_directory), stream=True)
+        resp = await self._dispatch.send(call)
+        try:
+            if resp.status_code != httpx.codes.OK:
+                self._dispatch.raise_error(call, resp)
+
+            from_dict = record.from_dict if record is not None else Incarnation.from_dict
+            async for item in iter_json_array(resp.aiter_bytes()):
+                yield from_dict(item)
+        finally:
+            await resp.aclose()
+
+    @overload
+    async def get_incarnation(self, incarnation_id: int, *, fields: None = None) -> IncarnationWithDetails:
+        ...
+
+    @overload
+    async def get_incarnation(self, incarnation_id: int, *, fields: Iterable[str]) -> IncarnationRecord:
+        ...
+
+    async def get_incarnation(
+        self, incarnation_id: int, *, fields: Iterable[str] | None = None
+    ) -> IncarnationWithDetails | IncarnationRecord:
+        """
+        :param fields: only decode these fields of the incarnation and return them as `IncarnationRecord`.
+            The API always returns all fields
+        """
+
+        return await self._dispatch(
+            Call(GET_INCARNATION, incarnation_id, record=_record_type(IncarnationWithDetails, fields))
+        )
 
-        self._handle_unexpected_response(resp)
-        raise ValueError("unexpected response")
+    @overload
+    async def get_incarnations(
+        self, incarnation_ids: Iterable[int], concurrency: int = 10, *, fields: None = None
+    ) -> list[IncarnationWithDetails | FoxopsApiError]:
+        ...
 
-    async def get_incarnation(self, incarnation_id: int) -> IncarnationWithDetails:
-        resp = await self.retry_function(self.client.get)(f"/api/incarnations/{incarnation_id}")
+    @overload
+    async def get_incarnations(
+        self, incarnation_ids: Iterable[int], concurrency: int = 10, *, fields: Iterable[str]
+    ) -> list[IncarnationRecord | FoxopsApiError]:
+        ...
 
-        match resp.status_code:
-            case httpx.codes.OK:
-                return IncarnationWithDetails.from_dict(resp.json())
-            case httpx.codes.NOT_FOUND:
-                raise IncarnationDoesNotExistError(resp.json()["message"])
+    async def get_incarnations(
+        self, incarnation_ids: Iterable[int], concurrency: int = 10, *, fields: Iterable[str] | None = None
+    ) -> list[IncarnationWithDetails | FoxopsApiError] | list[IncarnationRecord | FoxopsApiError]:
+        """
+        Fetches the details of many incarnations concurrently, with at most `concurrency` requests in flight.
 
-        self._handle_unexpected_response(resp)
-        raise ValueError("unexpected response")
+        Results are returned in the order of the given ids. API errors for individual incarnations
+        (e.g. `IncarnationDoesNotExistError` for a missing id) are returned in place of the result instead of
+        aborting the whole batch. Any other error cancels the outstanding requests and is raised.
+        """
 
-    async def delete_incarnation(self, incarnation_id: int):
-        resp = await self.retry_function(self.client.delete)(f"/api/incarnations/{incarnation_id}")
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+
+        record = _record_type(IncarnationWithDetails, fields)
+        semaphore = asyncio.Semaphore(concurrency)
 
-        match resp.status_code:
-            case httpx.codes.NO_CONTENT:
-                return
-            case httpx.codes.NOT_FOUND:
-                raise IncarnationDoesNotExistError(resp.json()["message"])
+        async def fetch(incarnation_id: int) -> Any:
+            async with semaphore:
+                try:
+                    return await self._dispatch(Call(GET_INCARNATION, incarnation_id, record=record))
+                except FoxopsApiError as e:
+                    return e
 
-        self._handle_unexpected_response(resp)
-        raise ValueError("unexpected response")
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(fetch(incarnation_id)) for incarnation_id in incarnation_ids]
+
+        return [task.result() for task in tasks]
+
+    async def delete_incarnation(self, incarnation_id: int):
+        await self._dispatch(Call(DELETE_INCARNATION, incarnation_id))
 
     async def patch_incarnation(
         self,
@@ -113,19 +343,7 @@ class AsyncFoxopsClient:
         if requested_data is not None:
             data["requested_data"] = requested_data
 
-        resp = await self.retry_function(self.client.patch)(f"/api/incarnations/{incarnation_id}", json=data)
-
-        match resp.status_code:
-            case httpx.codes.OK:
-                return IncarnationWithDetails.from_dict(resp.json())
-            case httpx.codes.NOT_FOUND:
-                raise IncarnationDoesNotExistError(resp.json()["message"])
-            case httpx.codes.BAD_REQUEST | httpx.codes.CONFLICT:
-                self.log.error(f"received error from FoxOps API: {resp.status_code} {resp.headers} {resp.text}")
-                raise FoxopsApiError(resp.json()["message"])
-
-        self._handle_unexpected_response(resp)
-        raise ValueError("unexpected response")
+        return await self._dispatch(Call(PATCH_INCARNATION, incarnation_id, body=data))
 
     async def put_incarnation(
         self,
@@ -140,19 +358,7 @@ class AsyncFoxopsClient:
             "template_data": template_data,
         }
 
-        resp = await self.retry_function(self.client.put)(f"/api/incarnations/{incarnation_id}", json=request)
-
-        match resp.status_code:
-            case httpx.codes.OK:
-                return IncarnationWithDetails.from_dict(resp.json())
-            case httpx.codes.NOT_FOUND:
-                raise IncarnationDoesNotExistError(resp.json()["message"])
-            case httpx.codes.BAD_REQUEST | httpx.codes.CONFLICT:
-                self.log.error(f"received error from FoxOps API: {resp.status_code} {resp.headers} {resp.text}")
-                raise FoxopsApiError(resp.json()["message"])
-
-        self._handle_unexpected_response(resp)
-        raise ValueError("unexpected response")
+        return await self._dispatch(Call(PUT_INCARNATION, incarnation_id, body=request))
 
     async def create_incarnation(
         self,
@@ -174,14 +380,19 @@ class AsyncFoxopsClient:
         if automerge is not None:
             data["automerge"] = automerge
 
-        resp = await self.retry_function(self.client.post)("/api/incarnations", json=data)
+        return await self._dispatch(Call(CREATE_INCARNATION, body=data))
+
+
+def _list_params(incarnation_repository: str | None, target_directory: str | None) -> dict[str, str]:
+    params = {}
+    if incarnation_repository is not None:
+        params["incarnation_repository"] = incarnation_repository
+    if target_directory is not None:
+        params["target_directory"] = target_directory
+    return params
 
-        match resp.status_code:
-            case httpx.codes.CREATED:
-                return IncarnationWithDetails.from_dict(resp.json())
-            case httpx.codes.BAD_REQUEST | httpx.codes.CONFLICT:
-                self.log.error(f"received error from FoxOps API: {resp.status_code} {resp.headers} {resp.text}")
-                raise FoxopsApiError(resp.json()["message"])
 
-        self._handle_unexpected_response(resp)
-        raise ValueError("unexpected response")
+def _record_type(result_type: type[Incarnation], fields: Iterable[str] | None) -> type[IncarnationRecord] | None:
+    if fields is None:
+        return None
+    return IncarnationRecord.of(result_type, fields)
@@ -1,7 +1,62 @@
 import asyncio
+import os
+import threading
+from typing import (
+    Any,
+    AsyncIterator,
+    Coroutine,
+    Iterable,
+    Iterator,
+    Self,
+    TypeVar,
+    overload,
+)
 
 from foxops_client.client_async import AsyncFoxopsClient
-from foxops_client.types import Incarnation, IncarnationWithDetails, TemplateData
+from foxops_client.exceptions import FoxopsApiError
+from foxops_client.types import (
+    Incarnation,
+    IncarnationRecord,
+    IncarnationWithDetails,
+    TemplateData,
+)
+
+T = TypeVar("T")
+
+_shared_loop: asyncio.AbstractEventLoop | None = None
+_shared_loop_thread: threading.Thread | None = None
+_shared_loop_lock = threading.Lock()
+# serializes the clients that adopt a forked process
+_fork_lock = threading.Lock()
+
+
+def _get_shared_loop() -> tuple[asyncio.AbstractEventLoop, threading.Thread]:
+    """Returns the event loop (and the thread running it) that is shared by all synchronous clients."""
+
+    global _shared_loop, _shared_loop_thread
+
+    with _shared_loop_lock:
+        if _shared_loop is None or _shared_loop_thread is None or not _shared_loop_thread.is_alive():
+            _shared_loop = asyncio.new_event_loop()
+            _shared_loop_thread = threading.Thread(target=_shared_loop.run_forever, name="foxops-client", daemon=True)
+            _shared_loop_thread.start()
+
+        return _shared_loop, _shared_loop_thread
+
+
+def _reset_shared_loop() -> None:
+    # the thread running the shared loop doesn't exist in a forked child (and the lock might have been held while
+    # forking). The child starts its own loop when it needs one
+    global _shared_loop, _shared_loop_thread, _shared_loop_lock, _fork_lock
+
+    _shared_loop = None
+    _shared_loop_thread = None
+    _shared_loop_lock = threading.Lock()
+    _fork_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_shared_loop)
 
 
 class FoxopsClient:
@@ -14,26 +69,149 @@ class FoxopsClient:
     It does not contain any business logic.
 
     This synchronous version of the foxops client is merely a thin wrapper around the async version.
+    The async clients of all synchronous clients run on a single event loop in a background thread. The client can be
+    used from multiple threads concurrently (which then share the connection pool) and from code that already runs
+    an event loop. A client that is inherited by a forked process switches to the event loop of that process and
+    opens new connections.
     """
 
-    def __init__(self, base_url: str, token: str):
-        self.client = AsyncFoxopsClient(base_url, token)
+    def __init__(self, base_url: str, token: str, **kwargs: Any):
+        """
+        Additional keyword arguments (connection pool size, timeouts, ...) are passed on to `AsyncFoxopsClient`.
+        An `httpx.AsyncClient` passed in via `client` can be shared between synchronous clients, but not with
+        code running on other event loops.
+        """
+
+        self.client = AsyncFoxopsClient(base_url, token, **kwargs)
+
+        self.loop, self._thread = _get_shared_loop()
+        self._pid = os.getpid()
+
+    def close(self) -> None:
+        """Closes the connections of this client."""
+
+        self.run(self.client.aclose())
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """
+        Runs a coroutine that uses the async client (`self.client`) on its event loop and returns its result, e.g. to
+        call helpers that are built on `AsyncFoxopsClient` from synchronous code.
+        """
+
+        if self._pid != os.getpid():
+            self._adopt_forked_process()
+
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("the synchronous client can't be called from its own event loop")
 
-        self.loop = asyncio.new_event_loop()
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result()
+        except BaseException:
+            # e.g. KeyboardInterrupt while waiting for the result
+            future.cancel()
+            raise
+
+    def _adopt_forked_process(self) -> None:
+        # the loop of the parent process isn't running in this one, and its connections belong to the parent
+        with _fork_lock:
+            if self._pid == os.getpid():
+                return
+
+            self.loop, self._thread = _get_shared_loop()
+            self.client._reset_connections()
+            self._pid = os.getpid()
 
     def verify_token(self):
-        return self.loop.run_until_complete(self.client.verify_token())
+        return self.run(self.client.verify_token())
 
+    @overload
     def list_incarnations(
-        self, incarnation_repository: str | None = None, target_directory: str | None = None
+        self, incarnation_repository: str | None = None, target_directory: str | None = None, *, fields: None = None
     ) -> list[Incarnation]:
-        return self.loop.run_until_complete(self.client.list_incarnations(incarnation_repository, target_directory))
+        ...
+
+    @overload
+    def list_incarnations(
+        self, incarnation_repository: str | None = None, target_directory: str | None = None, *, fields: Iterable[str]
+    ) -> list[IncarnationRecord]:
+        ...
+
+    def list_incarnations(
+        self,
+        incarnation_repository: str | None = None,
+        target_directory: str | None = None,
+        *,
+        fields: Iterable[str] | None = None,
+    ) -> Any:
+        return self.run(self.client.list_incarnations(incarnation_repository, target_directory, fields=fields))
+
+    @overload
+    def iter_incarnations(
+        self, incarnation_repository: str | None = None, target_directory: str | None = None, *, fields: None = None
+    ) -> Iterator[Incarnation]:
+        ...
+
+    @overload
+    def iter_incarnations(
+        self, incarnation_repository: str | None = None, target_directory: str | None = None, *, fields: Iterable[str]
+    ) -> Iterator[IncarnationRecord]:
+        ...
 
-    def get_incarnation(self, incarnation_id: int) -> IncarnationWithDetails:
-        return self.loop.run_until_complete(self.client.get_incarnation(incarnation_id))
+    def iter_incarnations(
+        self,
+        incarnation_repository: str | None = None,
+        target_directory: str | None = None,
+        *,
+        fields: Iterable[str] | None = None,
+    ) -> Iterator[Any]:
+        iterator = self.client.iter_incarnations(incarnation_repository, target_directory, fields=fields)
+        try:
+            while True:
+                try:
+                    yield self.run(_anext(iterator))
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(iterator.aclose())
+
+    @overload
+    def get_incarnation(self, incarnation_id: int, *, fields: None = None) -> IncarnationWithDetails:
+        ...
+
+    @overload
+    def get_incarnation(self, incarnation_id: int, *, fields: Iterable[str]) -> IncarnationRecord:
+        ...
+
+    def get_incarnation(self, incarnation_id: int, *, fields: Iterable[str] | None = None) -> Any:
+        return self.run(self.client.get_incarnation(incarnation_id, fields=fields))
+
+    @overload
+    def get_incarnations(
+        self, incarnation_ids: Iterable[int], concurrency: int = 10, *, fields: None = None
+    ) -> list[IncarnationWithDetails | FoxopsApiError]:
+        ...
+
+    @overload
+    def get_incarnations(
+        self, incarnation_ids: Iterable[int], concurrency: int = 10, *, fields: Iterable[str]
+    ) -> list[IncarnationRecord | FoxopsApiError]:
+        ...
+
+    def get_incarnations(
+        self, incarnation_ids: Iterable[int], concurrency: int = 10, *, fields: Iterable[str] | None = None
+    ) -> Any:
+        return self.run(self.client.get_incarnations(incarnation_ids, concurrency=concurrency, fields=fields))
 
     def delete_incarnation(self, incarnation_id: int):
-        return self.loop.run_until_complete(self.client.delete_incarnation(incarnation_id))
+        return self.run(self.client.delete_incarnation(incarnation_id))
 
     def patch_incarnation(
         self,
@@ -42,7 +220,7 @@ class FoxopsClient:
         requested_version: str | None = None,
         requested_data: TemplateData | None = None,
     ):
-        return self.loop.run_until_complete(
+        return self.run(
             self.client.patch_incarnation(
                 incarnation_id,
                 automerge,
@@ -58,7 +236,7 @@ class FoxopsClient:
         template_repository_version: str,
         template_data: TemplateData,
     ) -> IncarnationWithDetails:
-        return self.loop.run_until_complete(
+        return self.run(
             self.client.put_incarnation(
                 incarnation_id,
                 automerge,
@@ -76,7 +254,7 @@ class FoxopsClient:
         target_directory: str | None = None,
         automerge: bool | None = None,
     ) -> IncarnationWithDetails:
-        return self.loop.run_until_complete(
+        return self.run(
             self.client.create_incarnation(
                 incarnation_repository,
                 template_repository,
@@ -86,3 +264,7 @@ class FoxopsClient:
                 automerge=automerge,
             )
         )
+
+
+async def _anext(iterator: AsyncIterator[T]) -> T:
+    return await anext(iterator)
@@ -0,0 +1,327 @@
+"""
+The request pipeline of the FoxOps client. Every API call is described by a `Call` of an `Endpoint` and goes
+through the same steps:
+
+    middlewares (coalescing, caching, ...) -> build request -> retries -> send middlewares -> send
+        -> decode the response or map it to an exception
+
+Middlewares see the whole call and can answer it without sending a request (e.g. from a cache). Send middlewares
+run once per attempt, right before the request goes to the transport.
+"""
+import logging
+from dataclasses import dataclass, field
+from functools import partial
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Hashable,
+    Iterable,
+    Mapping,
+    NoReturn,
+    Protocol,
+)
+
+import httpx
+from httpx import Response
+from tenacity import AsyncRetrying
+
+from foxops_client.exceptions import (
+    AuthenticationError,
+    FoxopsApiError,
+    IncarnationDoesNotExistError,
+)
+from foxops_client.instrumentation import Observer, RequestTimer
+from foxops_client.serialization import JsonCodec
+from foxops_client.types import Incarnation, IncarnationRecord, IncarnationWithDetails
+
+# request extension that passes the `RequestTimer` of the call on to the end of the send middlewares
+_TIMER = "foxops_client.timer"
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    """Describes an endpoint of the FoxOps API: how to call it and how to interpret its responses."""
+
+    name: str
+    method: str
+    # path relative to the base URL, with an `{id}` placeholder for the incarnation id
+    path: str
+
+    # status code of a successful response, and the type its body is decoded into (None to ignore the body)
+    success: int
+    result_type: type[Incarnation] | None = None
+    many: bool = False
+
+    # error responses (with a message in the body) and the exceptions they are raised as
+    errors: Mapping[int, type[FoxopsApiError]] = field(default_factory=dict)
+
+    @property
+    def is_read(self) -> bool:
+        return self.method == "GET"
+
+
+_NOT_FOUND: dict[int, type[FoxopsApiError]] = {httpx.codes.NOT_FOUND: IncarnationDoesNotExistError}
+_INVALID: dict[int, type[FoxopsApiError]] = {
+    httpx.codes.BAD_REQUEST: FoxopsApiError,
+    httpx.codes.CONFLICT: FoxopsApiError,
+}
+
+VERIFY_TOKEN = Endpoint("verify_token", "GET", "/auth/test", httpx.codes.OK)
+LIST_INCARNATIONS = Endpoint(
+    "list_incarnations", "GET", "/api/incarnations", httpx.codes.OK, Incarnation, many=True, errors=_NOT_FOUND
+)
+GET_INCARNATION = Endpoint(
+    "get_incarnation", "GET", "/api/incarnations/{id}", httpx.codes.OK, IncarnationWithDetails, errors=_NOT_FOUND
+)
+DELETE_INCARNATION = Endpoint(
+    "delete_incarnation", "DELETE", "/api/incarnations/{id}", httpx.codes.NO_CONTENT, errors=_NOT_FOUND
+)
+PATCH_INCARNATION = Endpoint(
+    "patch_incarnation",
+    "PATCH",
+    "/api/incarnations/{id}",
+    httpx.codes.OK,
+    IncarnationWithDetails,
+    errors={**_NOT_FOUND, **_INVALID},
+)
+PUT_INCARNATION = Endpoint(
+    "put_incarnation",
+    "PUT",
+    "/api/incarnations/{id}",
+    httpx.codes.OK,
+    IncarnationWithDetails,
+    errors={**_NOT_FOUND, **_INVALID},
+)
+CREATE_INCARNATION = Endpoint(
+    "create_incarnation", "POST", "/api/incarnations", httpx.codes.CREATED, IncarnationWithDetails, errors=_INVALID
+)
+
+
+@dataclass
+class Call:
+    """A single call of an endpoint. Middlewares may add headers before the request is built."""
+
+    endpoint: Endpoint
+    incarnation_id: int | None = None
+    params: dict[str, str] = field(default_factory=dict)
+    # request body, encoded with the codec of the client
+    body: Any = None
+    headers: dict[str, str] = field(default_factory=dict)
+    stream: bool = False
+    # decode the response into records with only these fields, instead of the result type of the endpoint
+    record: type[IncarnationRecord] | None = None
+
+    @property
+    def path(self) -> str:
+        if self.incarnation_id is None:
+            return self.endpoint.path
+        return self.endpoint.path.format(id=self.incarnation_id)
+
+    @property
+    def key(self) -> Hashable:
+        """Identifies the resource of the call within its endpoint, e.g. for caching."""
+
+        key: Hashable = self.incarnation_id
+        if key is None:
+            key = tuple(sorted(self.params.items()))
+        if self.record is not None:
+            key = (key, self.record._fields)
+        return key
+
+
+@dataclass
+class Result:
+    # the decoded response body
+    value: Any
+    # None if the call was answered without sending a request
+    response: Response | None = None
+
+    @property
+    def not_modified(self) -> bool:
+        return self.response is not None and self.response.status_code == httpx.codes.NOT_MODIFIED
+
+
+CallHandler = Callable[[Call], Awaitable[Result]]
+SendHandler = Callable[[Call, httpx.Request], Awaitable[Response]]
+
+
+class Middleware(Protocol):
+    async def __call__(self, call: Call, call_next: CallHandler) -> Result:
+        ...
+
+
+class SendMiddleware(Protocol):
+    async def __call__(self, call: Call, request: httpx.Request, send_next: SendHandler) -> Response:
+        ...
+
+
+class Dispatcher:
+    """
+    Executes calls of FoxOps API endpoints.
+
+    The middleware chains and the retry policy are set up once, every call only copies the retry policy
+    (tenacity keeps the state of a call on the `AsyncRetrying` object, which must not be shared by concurrent calls).
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        base_url: str,
+        headers: dict[str, str],
+        codec: JsonCodec,
+        retrying: AsyncRetrying,
+        log: logging.Logger,
+        observers: list[Observer],
+        middlewares: Iterable[Middleware] = (),
+        send_middlewares: Iterable[SendMiddleware] = (),
+    ):
+        self.client = client
+        self.base_url = base_url
+        self.headers = headers
+        self.codec = codec
+        self.retrying = retrying
+        self.log = log
+        self.observers = observers
+
+        handler: CallHandler = self._call
+        for middleware in reversed(list(middlewares)):
+            handler = partial(middleware, call_next=handler)
+        self._handler = handler
+
+        send_handler: SendHandler = self._send
+        for send_middleware in reversed(list(send_middlewares)):
+            send_handler = partial(send_middleware, send_next=send_handler)
+        self._send_handler = send_handler
+
+    async def __call__(self, call: Call) -> Any:
+        """Executes the call and returns the decoded response body."""
+
+        return (await self._handler(call)).value
+
+    def build_request(self, call: Call) -> httpx.Request:
+        headers = {**self.headers, **call.headers}
+        content = None
+        if call.body is not None:
+            content = self.codec.encode(call.body)
+            headers["Content-Type"] = self.codec.content_type
+
+        return self.client.build_request(
+            call.endpoint.method,
+            self.base_url + call.path,
+            params=call.params or None,
+            content=content,
+            headers=headers,
+        )
+
+    async def send(self, call: Call) -> Response:
+        """Sends the request of the call with retries and notifies the observers about the result."""
+
+        request = self.build_request(call)
+
+        timer = RequestTimer(request.method, call.endpoint.path) if self.observers else None
+        if timer is not None:
+            request.extensions["trace"] = timer.trace
+            request.extensions[_TIMER] = timer
+
+        try:
+            resp: Response = await self.retrying.copy()(self._attempt, call, request, timer)
+        except Exception as e:
+            if timer is not None:
+                self._notify_observers(timer, exception=e)
+            raise
+
+        if timer is not None:
+            if call.stream and not resp.is_closed:
+                # the body is received while it's being consumed, the call is finished when the response is closed
+                resp.stream = _NotifyingStream(resp.stream, partial(self._notify_observers, timer, response=resp))
+            else:
+                self._notify_observers(timer, response=resp)
+        return resp
+
+    def decode(self, call: Call, resp: Response) -> Result:
+        endpoint = call.endpoint
+
+        if resp.status_code == endpoint.success:
+            if endpoint.result_type is None:
+                return Result(None, resp)
+            if call.record is not None:
+                if endpoint.many:
+                    return Result(self.codec.decode_records(resp.content, call.record), resp)
+                return Result(self.codec.decode_record(resp.content, call.record), resp)
+            if endpoint.many:
+                return Result(self.codec.decode_list(resp.content, endpoint.result_type), resp)
+            return Result(self.codec.decode_object(resp.content, endpoint.result_type), resp)
+
+        if resp.status_code == httpx.codes.NOT_MODIFIED and "If-None-Match" in call.headers:
+            return Result(None, resp)
+
+        self.raise_error(call, resp)
+
+    def raise_error(self, call: Call, resp: Response) -> NoReturn:
+        """Raises the exception for an unsuccessful response."""
+
+        error = call.endpoint.errors.get(resp.status_code)
+        if error is not None:
+            if resp.status_code != httpx.codes.NOT_FOUND:
+                self.log.error(f"received error from FoxOps API: {resp.status_code} {resp.headers} {resp.text}")
+            raise error(self.codec.decode(resp.content)["message"])
+
+        if resp.status_code == httpx.codes.UNAUTHORIZED:
+            self.log.error(f"Authentication failed with status code 401: {resp.text}")
+            raise AuthenticationError()
+
+        self.log.error(f"received unexpected response from FoxOps API: {resp.status_code} {resp.headers} {resp.text}")
+        self.log.error(f"request: {resp.request.method} {resp.request.url}")
+
+        resp.raise_for_status()
+        raise ValueError("unexpected response")
+
+    async def _call(self, call: Call) -> Result:
+        return self.decode(call, await self.send(call))
+
+    async def _attempt(self, call: Call, request: httpx.Request, timer: RequestTimer | None) -> Response:
+        if timer is not None:
+            timer.attempt_started(len(request.content))
+        return await self._send_handler(call, request)
+
+    async def _send(self, call: Call, request: httpx.Request) -> Response:
+        timer = request.extensions.get(_TIMER)
+        if timer is not None:
+            # after the send middlewares, so that waiting for the limits isn't reported as latency or pool wait
+            timer.sending()
+
+        resp = await self.client.send(request, stream=call.stream)
+        if call.stream and resp.status_code != call.endpoint.success:
+            # error responses are small, read them completely (which also releases the connection)
+            await resp.aread()
+        return resp
+
+    def _notify_observers(self, timer: RequestTimer, **kwargs: Any) -> None:
+        event = timer.finish(**kwargs)
+        for observer in self.observers:
+            try:
+                observer.request_finished(event)
+            except Exception:
+                self.log.exception(f"observer {observer} failed")
+
+
+class _NotifyingStream(httpx.AsyncByteStream):
+    """Calls `on_close` once the response stream is closed, e.g. after it was consumed."""
+
+    def __init__(self, stream: Any, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close: Callable[[], None] | None = on_close
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close()
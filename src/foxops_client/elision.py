@@ -0,0 +1,76 @@
+from dataclasses import dataclass, replace
+
+from foxops_client._diff import changed_data, same_value, same_version
+from foxops_client.dispatch import (
+    GET_INCARNATION,
+    PATCH_INCARNATION,
+    PUT_INCARNATION,
+    Call,
+    CallHandler,
+    Result,
+)
+from foxops_client.types import IncarnationWithDetails
+
+
+@dataclass
+class WriteElisionStats:
+    # writes that were compared with the current state of their incarnation
+    checked: int = 0
+    # writes that were not sent, because they wouldn't have changed anything
+    elided: int = 0
+    # patches that were sent with fewer template variables than requested
+    reduced: int = 0
+
+
+class WriteElisionMiddleware:
+    """
+    Compares `patch_incarnation` and `put_incarnation` calls with the current state of the incarnation and skips
+    them if they wouldn't change anything. The incarnation is returned as it is then. Patches that do change
+    something only send the template variables that differ.
+
+    The current state is read with `get_incarnation`, so it's served from the response cache if the client has one.
+    A cached state can be outdated, e.g. if the incarnation was changed by someone else, so a write that is needed
+    might be skipped until the entry expires.
+
+    Writes to a branch of the template are always sent (see `same_version`), as the branch might have moved.
+    """
+
+    def __init__(self) -> None:
+        self.stats = WriteElisionStats()
+
+    async def __call__(self, call: Call, call_next: CallHandler) -> Result:
+        if call.endpoint not in (PATCH_INCARNATION, PUT_INCARNATION):
+            return await call_next(call)
+
+        current = (await call_next(Call(GET_INCARNATION, call.incarnation_id))).value
+        self.stats.checked += 1
+
+        body = dict(call.body)
+        if call.endpoint == PUT_INCARNATION:
+            if _same_version(body["template_repository_version"], current) and same_value(
+                body["template_data"], current.template_data
+            ):
+                self.stats.elided += 1
+                return Result(current)
+            return await call_next(call)
+
+        if "requested_version" in body and _same_version(body["requested_version"], current):
+            del body["requested_version"]
+
+        requested_data = body.pop("requested_data", None)
+        if requested_data is not None:
+            changed = changed_data(current.template_data, requested_data)
+            if changed:
+                body["requested_data"] = changed
+
+        if "requested_version" not in body and "requested_data" not in body:
+            self.stats.elided += 1
+            return Result(current)
+
+        if requested_data is not None and len(body.get("requested_data", ())) < len(requested_data):
+            self.stats.reduced += 1
+        return await call_next(replace(call, body=body))
+
+
+def _same_version(requested: str, current: IncarnationWithDetails) -> bool:
+    return same_version(requested, current.template_repository_version, current.template_repository_version_hash)
@@ -10,3 +10,16 @@ class AuthenticationError(Exception):
 
 class IncarnationDoesNotExistError(FoxopsApiError):
     pass
+
+
+class CircuitOpenError(Exception):
+    """Raised without sending a request while the circuit breaker for the endpoint class is open."""
+
+    def __init__(self, endpoint_class: str, retry_after: float | None):
+        super().__init__(endpoint_class, retry_after)
+        self.endpoint_class = endpoint_class
+        # seconds until the next request is let through to probe the server, None if a probe is in progress
+        self.retry_after = retry_after
+
+    def __str__(self) -> str:
+        return f"circuit breaker for {self.endpoint_class} requests is open"
@@ -0,0 +1,125 @@
+"""
+Hedged requests: if a read takes unusually long, a second identical request is sent and whichever response arrives
+first is used. This cuts the tail latency caused by single slow server instances or stalled connections, for a
+small number of additional requests.
+
+    client = AsyncFoxopsClient(url, token, hedger=RequestHedger(percentile=0.95, max_hedge_ratio=0.05))
+
+Hedging must only be used from a single event loop, but a hedger can be shared between clients on that loop.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+
+import httpx
+from httpx import Response
+
+from foxops_client.dispatch import Call, SendHandler
+from foxops_client.retries import RetryBudget
+
+
+class RequestHedger:
+    """
+    Sends a second request for reads (`GET`) that didn't get a response within the hedging delay, and returns the
+    response that arrives first. The other request is cancelled. Streamed responses are never hedged.
+
+    The delay is either fixed (`delay`) or the `percentile` of the latencies of the recent requests to the same
+    endpoint. Reads are not hedged until `min_samples` latencies were observed then. The percentile must be lower
+    than the share of fast requests: if more than 5% of the requests are slow, the 95th percentile is a slow latency
+    itself and hedging after it doesn't help.
+
+    At most `max_hedge_ratio` of the requests are hedged (after an initial allowance of a few hedges), so that
+    hedging can't multiply the load on a server that is slow for everyone.
+
+    Hedges are sent through the send middlewares that come after the hedger (e.g. rate and concurrency limits)
+    and share the connection pool of the client.
+    """
+
+    def __init__(
+        self,
+        delay: float | None = None,
+        percentile: float = 0.95,
+        min_samples: int = 20,
+        max_hedge_ratio: float = 0.1,
+        window_size: int = 200,
+    ):
+        if not 0 < percentile < 1:
+            raise ValueError("percentile must be between 0 and 1")
+
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window_size = window_size
+        self.budget = RetryBudget(ratio=max_hedge_ratio, min_retries_per_second=0.0)
+
+        # number of hedges that were sent, and how many of them returned before the original request
+        self.hedges = 0
+        self.wins = 0
+        self._latencies: dict[str, deque[float]] = {}
+
+    def hedge_delay(self, endpoint: str) -> float | None:
+        """Returns the time after which reads of the endpoint are hedged, None if they are not hedged yet."""
+
+        if self.delay is not None:
+            return self.delay
+
+        latencies = self._latencies.get(endpoint)
+        if latencies is None or len(latencies) < self.min_samples:
+            return None
+        return sorted(latencies)[min(len(latencies) - 1, math.ceil(self.percentile * len(latencies)) - 1)]
+
+    async def __call__(self, call: Call, request: httpx.Request, send_next: SendHandler) -> Response:
+        if not call.endpoint.is_read or call.stream:
+            return await send_next(call, request)
+
+        self.budget.deposit()
+        endpoint = call.endpoint.name
+        delay = self.hedge_delay(endpoint)
+
+        start = time.monotonic()
+        primary = asyncio.ensure_future(self._timed(call, request, send_next))
+        tasks = {primary}
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self.budget.try_withdraw():
+                    self.hedges += 1
+                    tasks.add(asyncio.ensure_future(self._timed(call, _copy(request), send_next)))
+
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.discard(task)
+                    # if the first request failed, wait for the other one
+                    if task.exception() is None or not tasks:
+                        if task is not primary:
+                            self.wins += 1
+                        if not primary.done():
+                            # the original request is cancelled, but its latency is at least this long
+                            self._observe(endpoint, time.monotonic() - start)
+                        return task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _timed(self, call: Call, request: httpx.Request, send_next: SendHandler) -> Response:
+        start = time.monotonic()
+        resp = await send_next(call, request)
+        self._observe(call.endpoint.name, time.monotonic() - start)
+        return resp
+
+    def _observe(self, endpoint: str, latency: float) -> None:
+        latencies = self._latencies.get(endpoint)
+        if latencies is None:
+            latencies = self._latencies[endpoint] = deque(maxlen=self.window_size)
+        latencies.append(latency)
+
+
+def _copy(request: httpx.Request) -> httpx.Request:
+    # the instrumentation of the original request (e.g. its trace) belongs to its attempt, it must not be fed by
+    # the hedge
+    extensions = {"timeout": request.extensions["timeout"]} if "timeout" in request.extensions else {}
+    return httpx.Request(
+        request.method, request.url, headers=request.headers, content=request.content, extensions=extensions
+    )
@@ -0,0 +1,199 @@
+"""
+Local index of all incarnations and their details, for fast lookups without calling the FoxOps API.
+
+    index = IncarnationIndex(client, path="incarnations.sqlite")
+    await index.refresh()
+
+    index.by_template("group/template", "v1.0.0")
+    index.by_repository("group/project")
+    index.by_commit_sha("0123abc...")
+"""
+import json
+import logging
+import sqlite3
+from collections import defaultdict
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any, Iterator, Self
+
+from foxops_client.client_async import AsyncFoxopsClient
+from foxops_client.types import Incarnation, IncarnationWithDetails
+
+log = logging.getLogger(__name__)
+
+# fields that are part of the list response. If any of them changed, the details are fetched again
+_LIST_FIELDS = tuple(f.name for f in fields(Incarnation))
+
+
+@dataclass(frozen=True)
+class RefreshStats:
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+
+
+class IncarnationIndex:
+    """
+    In-memory index of the incarnations of a FoxOps instance, with lookups by repository, template (version) and
+    commit.
+
+    `refresh` lists all incarnations and only fetches the details of incarnations that are new or whose list entry
+    changed (e.g. their `commit_sha`). Note that a change of only the merge request status doesn't show in the list,
+    use `refresh(full=True)` to fetch all details again.
+
+    With a `path`, the index is also stored in an SQLite database and loaded from there when it's created, so that
+    a process only needs to fetch what changed since the last run. Lookups are always served from memory.
+    The database records the base URL of the server it was built from; a database of another server is emptied
+    instead of being loaded.
+    """
+
+    def __init__(self, client: AsyncFoxopsClient, path: str | Path | None = None, concurrency: int = 10):
+        self.client = client
+        self.concurrency = concurrency
+
+        self._incarnations: dict[int, IncarnationWithDetails] = {}
+        self._by_repository: dict[str, set[int]] = defaultdict(set)
+        self._by_template: dict[str | None, set[int]] = defaultdict(set)
+        self._by_template_version: dict[tuple[str | None, str | None], set[int]] = defaultdict(set)
+        self._by_commit_sha: dict[str, set[int]] = defaultdict(set)
+
+        self._db: sqlite3.Connection | None = None
+        if path is not None:
+            self._db = _connect(path, self.client.base_url)
+            for (data,) in self._db.execute("SELECT data FROM incarnations"):
+                self._add(IncarnationWithDetails.from_dict(json.loads(data)))
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    async def refresh(self, full: bool = False) -> RefreshStats:
+        """Updates the index from the FoxOps API. Fetches the details of all incarnations if `full` is set."""
+
+        listed = {x.id: x for x in await self.client.list_incarnations()}
+
+        changed = [
+            incarnation_id
+            for incarnation_id, incarnation in listed.items()
+            if full or not _same_list_entry(self._incarnations.get(incarnation_id), incarnation)
+        ]
+        removed = [incarnation_id for incarnation_id in self._incarnations if incarnation_id not in listed]
+
+        added = updated = 0
+        fetched = []
+        for incarnation_id, details in zip(
+            changed, await self.client.get_incarnations(changed, concurrency=self.concurrency)
+        ):
+            if isinstance(details, IncarnationWithDetails):
+                fetched.append(details)
+                if incarnation_id in self._incarnations:
+                    updated += 1
+                else:
+                    added += 1
+            elif incarnation_id in self._incarnations:
+                # deleted after it was listed
+                removed.append(incarnation_id)
+
+        for incarnation_id in removed:
+            self._remove(incarnation_id)
+        for details in fetched:
+            self._remove(details.id)
+            self._add(details)
+
+        if self._db is not None:
+            with self._db:
+                self._db.executemany("DELETE FROM incarnations WHERE id = ?", [(x,) for x in removed])
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO incarnations (id, data) VALUES (?, ?)",
+                    [(x.id, json.dumps(x.to_dict(), default=dict)) for x in fetched],
+                )
+
+        return RefreshStats(added=added, updated=updated, removed=len(removed), unchanged=len(listed) - len(changed))
+
+    def get(self, incarnation_id: int) -> IncarnationWithDetails | None:
+        return self._incarnations.get(incarnation_id)
+
+    def by_repository(
+        self, incarnation_repository: str, target_directory: str | None = None
+    ) -> list[IncarnationWithDetails]:
+        result = self._lookup(self._by_repository.get(incarnation_repository))
+        if target_directory is not None:
+            result = [x for x in result if x.target_directory == target_directory]
+        return result
+
+    def by_template(self, template_repository: str, version: str | None = None) -> list[IncarnationWithDetails]:
+        if version is None:
+            return self._lookup(self._by_template.get(template_repository))
+        return self._lookup(self._by_template_version.get((template_repository, version)))
+
+    def by_commit_sha(self, commit_sha: str) -> list[IncarnationWithDetails]:
+        return self._lookup(self._by_commit_sha.get(commit_sha))
+
+    def __len__(self) -> int:
+        return len(self._incarnations)
+
+    def __contains__(self, incarnation_id: int) -> bool:
+        return incarnation_id in self._incarnations
+
+    def __iter__(self) -> Iterator[IncarnationWithDetails]:
+        return iter(list(self._incarnations.values()))
+
+    def _lookup(self, ids: set[int] | None) -> list[IncarnationWithDetails]:
+        if not ids:
+            return []
+        return [self._incarnations[x] for x in sorted(ids)]
+
+    def _add(self, incarnation: IncarnationWithDetails) -> None:
+        self._incarnations[incarnation.id] = incarnation
+        for index, key in self._keys(incarnation):
+            index[key].add(incarnation.id)
+
+    def _remove(self, incarnation_id: int) -> None:
+        incarnation = self._incarnations.pop(incarnation_id, None)
+        if incarnation is None:
+            return
+
+        for index, key in self._keys(incarnation):
+            ids = index[key]
+            ids.discard(incarnation_id)
+            if not ids:
+                del index[key]
+
+    def _keys(self, incarnation: IncarnationWithDetails) -> list[tuple[dict[Any, set[int]], Any]]:
+        return [
+            (self._by_repository, incarnation.incarnation_repository),
+            (self._by_template, incarnation.template_repository),
+            (self._by_template_version, (incarnation.template_repository, incarnation.template_repository_version)),
+            (self._by_commit_sha, incarnation.commit_sha),
+        ]
+
+
+def _same_list_entry(indexed: IncarnationWithDetails | None, listed: Incarnation) -> bool:
+    if indexed is None:
+        return False
+    return all(getattr(indexed, name) == getattr(listed, name) for name in _LIST_FIELDS)
+
+
+def _connect(path: str | Path, base_url: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path)
+    with db:
+        db.execute("CREATE TABLE IF NOT EXISTS incarnations (id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+        db.execute("CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        row = db.execute("SELECT value FROM metadata WHERE key = 'base_url'").fetchone()
+        if row is not None and row[0] == base_url:
+            return db
+
+        # also databases without a base URL, which can't be attributed to a server
+        if row is not None or db.execute("SELECT 1 FROM incarnations LIMIT 1").fetchone() is not None:
+            log.warning(f"index {path} is not from {base_url}, starting with an empty index")
+            db.execute("DELETE FROM incarnations")
+        db.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('base_url', ?)", (base_url,))
+    return db
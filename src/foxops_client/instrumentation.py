@@ -0,0 +1,283 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any
+
+# upper bounds of the latency histogram buckets in seconds (same as the Prometheus client library defaults)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+# trace events of httpcore that mark the end of waiting for a connection from the pool
+_CONNECTION_ACQUIRED_EVENTS = (".connect_tcp.started", ".connect_unix_socket.started", ".send_request_headers.started")
+
+
+@dataclass(frozen=True)
+class RequestEvent:
+    """Describes a finished call of a FoxOps API endpoint, including all of its retries."""
+
+    # templated path of the endpoint, e.g. "/api/incarnations/{id}"
+    endpoint: str
+    method: str
+
+    # status code of the final response, None if the request failed with an exception
+    status_code: int | None
+    exception: BaseException | None
+
+    # total time in seconds, including retries, the time spent waiting between them and `queue_wait`. For streamed
+    # responses, this includes receiving the body
+    duration: float
+    attempts: int
+
+    # time spent waiting for a connection from the pool. None if not reported by the transport
+    pool_wait: float | None
+
+    bytes_sent: int
+    bytes_received: int
+
+    # time spent waiting for the client-side limits (e.g. the rate and concurrency limiters) before sending
+    queue_wait: float = 0.0
+
+    @property
+    def retries(self) -> int:
+        return self.attempts - 1
+
+
+class RequestTimer:
+    """Measures a call of an API endpoint across all of its attempts and creates the resulting `RequestEvent`."""
+
+    def __init__(self, method: str, endpoint: str):
+        self.method = method
+        self.endpoint = endpoint
+
+        self.attempts = 0
+        self.pool_wait: float | None = None
+        self.queue_wait = 0.0
+        self.bytes_sent = 0
+
+        self._start = time.perf_counter()
+        self._attempt_start = self._start
+        self._connection_acquired = False
+
+    def attempt_started(self, request_size: int) -> None:
+        self.attempts += 1
+        self.bytes_sent += request_size
+
+        self._attempt_start = time.perf_counter()
+        self._connection_acquired = False
+
+    def sending(self) -> None:
+        """Marks the end of waiting for the client-side limits. The pool wait of the attempt starts now."""
+
+        now = time.perf_counter()
+        self.queue_wait += now - self._attempt_start
+        self._attempt_start = now
+
+    async def trace(self, event_name: str, info: dict[str, Any]) -> None:
+        """Callback for the `trace` request extension of httpx."""
+
+        if not self._connection_acquired and event_name.endswith(_CONNECTION_ACQUIRED_EVENTS):
+            self._connection_acquired = True
+            self.pool_wait = (self.pool_wait or 0.0) + time.perf_counter() - self._attempt_start
+
+    def finish(self, response: Any = None, exception: BaseException | None = None) -> RequestEvent:
+        return RequestEvent(
+            endpoint=self.endpoint,
+            method=self.method,
+            status_code=response.status_code if response is not None else None,
+            exception=exception,
+            duration=time.perf_counter() - self._start,
+            attempts=self.attempts,
+            pool_wait=self.pool_wait,
+            bytes_sent=self.bytes_sent,
+            bytes_received=response.num_bytes_downloaded if response is not None else 0,
+            queue_wait=self.queue_wait,
+        )
+
+
+class Observer:
+    """
+    Base class for observers that get notified about the requests of a FoxOps client.
+
+    Observers are called on the event loop of the client, so they must not block.
+    """
+
+    def request_finished(self, event: RequestEvent) -> None:
+        pass
+
+    def gauge(self, name: str, value: float, labels: dict[str, str]) -> None:
+        """Reports the current value of a client-internal gauge (e.g. a concurrency limit)."""
+
+
+@dataclass
+class Histogram:
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    counts: list[int] = field(default_factory=list)
+    sum: float = 0.0
+    count: int = 0
+
+    def __post_init__(self):
+        if not self.counts:
+            self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsCollector(Observer):
+    """
+    Aggregates request events into per-endpoint metrics: latency, pool wait and queue wait histograms, request counts
+    per status code, retries and bytes transferred. The metrics can be exported in the Prometheus text format.
+
+    The latency doesn't include the time spent waiting for the client-side limits, which is reported as queue wait.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS, prefix: str = "foxops_client"):
+        self.buckets = buckets
+        self.prefix = prefix
+
+        self.latency: dict[tuple[str, str], Histogram] = defaultdict(lambda: Histogram(self.buckets))
+        self.pool_wait: dict[tuple[str, str], Histogram] = defaultdict(lambda: Histogram(self.buckets))
+        self.queue_wait: dict[tuple[str, str], Histogram] = defaultdict(lambda: Histogram(self.buckets))
+        self.requests: dict[tuple[str, str, str], int] = defaultdict(int)
+        self.retries: dict[tuple[str, str], int] = defaultdict(int)
+        self.bytes_sent: dict[tuple[str, str], int] = defaultdict(int)
+        self.bytes_received: dict[tuple[str, str], int] = defaultdict(int)
+        self.gauges: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+
+        self._lock = threading.Lock()
+
+    def request_finished(self, event: RequestEvent) -> None:
+        key = (event.method, event.endpoint)
+        status = str(event.status_code) if event.status_code is not None else type(event.exception).__name__
+
+        with self._lock:
+            self.latency[key].observe(event.duration - event.queue_wait)
+            if event.pool_wait is not None:
+                self.pool_wait[key].observe(event.pool_wait)
+            self.queue_wait[key].observe(event.queue_wait)
+            self.requests[(event.method, event.endpoint, status)] += 1
+            self.retries[key] += event.retries
+            self.bytes_sent[key] += event.bytes_sent
+            self.bytes_received[key] += event.bytes_received
+
+    def gauge(self, name: str, value: float, labels: dict[str, str]) -> None:
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def render_prometheus(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format, e.g. to be served on a `/metrics` endpoint."""
+
+        lines: list[str] = []
+        p = self.prefix
+
+        with self._lock:
+            self._render_histograms(
+                lines,
+                f"{p}_request_duration_seconds",
+                "Duration of API calls, without waiting for the client-side limits",
+                self.latency,
+            )
+            self._render_histograms(
+                lines, f"{p}_pool_wait_seconds", "Time spent waiting for a connection", self.pool_wait
+            )
+            self._render_histograms(
+                lines, f"{p}_queue_wait_seconds", "Time spent waiting for the client-side limits", self.queue_wait
+            )
+
+            lines.append(f"# HELP {p}_requests_total Number of API calls by status code")
+            lines.append(f"# TYPE {p}_requests_total counter")
+            for (method, endpoint, status), count in self.requests.items():
+                labels = _labels(method=method, endpoint=endpoint, status=status)
+                lines.append(f"{p}_requests_total{labels} {count}")
+
+            for name, help, values in (
+                ("retries_total", "Number of retries", self.retries),
+                ("sent_bytes_total", "Bytes sent in request bodies", self.bytes_sent),
+                ("received_bytes_total", "Bytes received in response bodies", self.bytes_received),
+            ):
+                lines.append(f"# HELP {p}_{name} {help}")
+                lines.append(f"# TYPE {p}_{name} counter")
+                for (method, endpoint), value in values.items():
+                    lines.append(f"{p}_{name}{_labels(method=method, endpoint=endpoint)} {value}")
+
+            previous_name = None
+            for (gauge, gauge_labels), gauge_value in sorted(self.gauges.items()):
+                if gauge != previous_name:
+                    lines.append(f"# TYPE {p}_{gauge} gauge")
+                    previous_name = gauge
+                lines.append(f"{p}_{gauge}{_labels(**dict(gauge_labels))} {gauge_value}")
+
+        return "\n".join(lines) + "\n"
+
+    def _render_histograms(
+        self, lines: list[str], name: str, help: str, histograms: dict[tuple[str, str], Histogram]
+    ) -> None:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} histogram")
+
+        for (method, endpoint), histogram in histograms.items():
+            cumulative = 0
+            for bound, count in zip([*histogram.buckets, float("inf")], histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_labels(method=method, endpoint=endpoint, le=le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(method=method, endpoint=endpoint)} {histogram.sum}")
+            lines.append(f"{name}_count{_labels(method=method, endpoint=endpoint)} {histogram.count}")
+
+
+class OpenTelemetryObserver(Observer):
+    """
+    Emits an OpenTelemetry span for every API call. Requires the `opentelemetry-api` package.
+
+    The spans are children of the span that was active when the call was made.
+    """
+
+    def __init__(self, tracer: Any = None):
+        if tracer is None:
+            from opentelemetry import trace
+
+            tracer = trace.get_tracer("foxops_client")
+
+        self.tracer = tracer
+
+    def request_finished(self, event: RequestEvent) -> None:
+        end_time = time.time_ns()
+        start_time = end_time - int(event.duration * 1e9)
+
+        attributes: dict[str, Any] = {
+            "http.request.method": event.method,
+            "http.route": event.endpoint,
+            "foxops_client.attempts": event.attempts,
+            "foxops_client.queue_wait": event.queue_wait,
+        }
+        if event.status_code is not None:
+            attributes["http.response.status_code"] = event.status_code
+
+        span = self.tracer.start_span(
+            f"{event.method} {event.endpoint}", kind=_client_span_kind(), start_time=start_time, attributes=attributes
+        )
+        if event.exception is not None:
+            span.record_exception(event.exception)
+        if event.exception is not None or (event.status_code is not None and event.status_code >= 500):
+            from opentelemetry.trace import Status, StatusCode
+
+            span.set_status(Status(StatusCode.ERROR))
+        span.end(end_time=end_time)
+
+
+def _client_span_kind() -> Any:
+    from opentelemetry.trace import SpanKind
+
+    return SpanKind.CLIENT
+
+
+def _labels(**labels: str) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
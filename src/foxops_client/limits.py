@@ -0,0 +1,384 @@
+"""
+Client-side limits for bulk jobs that would otherwise overload the FoxOps API (and the Gitlab instance behind it).
+
+The limiters and the circuit breaker distinguish two endpoint classes: reads (`GET`) and writes (everything else),
+as writes are much more expensive for the server. They apply per attempt, so retries are limited as well.
+
+Limiters must only be used from a single event loop, but can be shared between clients on that loop
+(e.g. all clients of the sync `FoxopsClient`).
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from enum import Enum
+from typing import Iterable
+
+import httpx
+from httpx import Response
+
+from foxops_client.dispatch import Call, SendHandler
+from foxops_client.exceptions import CircuitOpenError
+from foxops_client.instrumentation import Observer
+from foxops_client.retries import HTTP_RETRYABLE_STATUS_CODES, TRANSPORT_ERRORS
+
+READ = "read"
+WRITE = "write"
+
+
+def endpoint_class(call: Call) -> str:
+    return READ if call.endpoint.is_read else WRITE
+
+
+class _Gauges:
+    """Reports gauges to the observers of the clients that use a limiter."""
+
+    def __init__(self) -> None:
+        self.observers: list[Observer] = []
+
+    def observe(self, observers: Iterable[Observer]) -> None:
+        """Adds observers that get notified about the current limits, and reports the current values to them."""
+
+        for observer in observers:
+            if observer not in self.observers:
+                self.observers.append(observer)
+        self._report_all()
+
+    def _report_all(self) -> None:
+        pass
+
+    def _gauge(self, name: str, value: float, labels: dict[str, str]) -> None:
+        for observer in self.observers:
+            observer.gauge(name, value, labels)
+
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average, and bursts of up to `burst` acquisitions.
+
+    Callers that exceed the rate wait for their turn, in the order in which they arrived.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+        # reserve a token. A negative balance is the queue of waiting callers
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return
+
+        try:
+            await asyncio.sleep(-self._tokens / self.rate)
+        except asyncio.CancelledError:
+            self._tokens += 1
+            raise
+
+
+class RateLimiter(_Gauges):
+    """
+    Limits the request rate of the clients that use it, separately for reads and writes.
+
+    :param reads_per_second: rate limit for reads, None for no limit
+    :param writes_per_second: rate limit for writes, None for no limit
+    :param burst: number of requests per class that may be sent at once after a period of inactivity.
+        Defaults to one second worth of requests
+    """
+
+    def __init__(
+        self, reads_per_second: float | None = None, writes_per_second: float | None = None, burst: float | None = None
+    ):
+        super().__init__()
+        self.buckets: dict[str, TokenBucket] = {}
+        if reads_per_second is not None:
+            self.buckets[READ] = TokenBucket(reads_per_second, burst)
+        if writes_per_second is not None:
+            self.buckets[WRITE] = TokenBucket(writes_per_second, burst)
+
+    async def __call__(self, call: Call, request: httpx.Request, send_next: SendHandler) -> Response:
+        bucket = self.buckets.get(endpoint_class(call))
+        if bucket is not None:
+            await bucket.acquire()
+
+        return await send_next(call, request)
+
+    def _report_all(self) -> None:
+        for cls, bucket in self.buckets.items():
+            self._gauge("rate_limit_per_second", bucket.rate, {"class": cls})
+
+
+class _AimdLimit:
+    def __init__(self, initial: int, min_limit: int, max_limit: int):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        # latencies of recent successful requests, per endpoint. Their minimum is the latency of the unloaded server
+        self.latencies: dict[str, deque[float]] = {}
+        self.last_decrease = -math.inf
+
+    async def acquire(self) -> None:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was already handed over to this caller
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self.wake()
+
+    def wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+
+class AdaptiveConcurrencyLimiter(_Gauges):
+    """
+    Limits the number of concurrent requests, separately for reads and writes, and adapts the limits to the
+    capacity of the server (additive increase, multiplicative decrease).
+
+    The limit grows by one for every `limit` successful requests, as long as the limit is actually used.
+    It is multiplied by `backoff_ratio` when the server is overloaded: on retryable status codes (e.g.
+    `503 Service Unavailable`), transport errors (e.g. timeouts), and when the latency grows beyond
+    `latency_tolerance` times the minimum latency of the recent requests to the same endpoint (listing incarnations
+    takes longer than getting one, even if the server isn't loaded). Requests that were started before the last
+    decrease don't cause another decrease, so that a burst of errors only halves the limit once.
+
+    Excess requests wait for a free slot in the order in which they arrived.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        backoff_ratio: float = 0.5,
+        latency_tolerance: float | None = 3.0,
+    ):
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError("limits must satisfy 1 <= min_limit <= initial_limit <= max_limit")
+
+        super().__init__()
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.limits = {cls: _AimdLimit(initial_limit, min_limit, max_limit) for cls in (READ, WRITE)}
+
+    def limit(self, cls: str) -> int:
+        """Returns the current concurrency limit of the endpoint class (`READ` or `WRITE`)."""
+
+        return int(self.limits[cls].limit)
+
+    def in_flight(self, cls: str) -> int:
+        return self.limits[cls].in_flight
+
+    async def __call__(self, call: Call, request: httpx.Request, send_next: SendHandler) -> Response:
+        cls = endpoint_class(call)
+        limit = self.limits[cls]
+
+        await limit.acquire()
+        start = time.monotonic()
+        try:
+            resp = await send_next(call, request)
+        except TRANSPORT_ERRORS:
+            self._release(cls, call.endpoint.name, limit, start, overloaded=True)
+            raise
+        except BaseException:
+            limit.release()
+            raise
+
+        self._release(cls, call.endpoint.name, limit, start, overloaded=resp.status_code in HTTP_RETRYABLE_STATUS_CODES)
+        return resp
+
+    def _release(self, cls: str, endpoint: str, limit: _AimdLimit, start: float, overloaded: bool) -> None:
+        latency = time.monotonic() - start
+        # only grow the limit if it's actually used, otherwise it would grow without bounds
+        saturated = limit.in_flight * 2 >= limit.limit
+        limit.release()
+
+        if not overloaded:
+            latencies = limit.latencies.get(endpoint)
+            if latencies is None:
+                latencies = limit.latencies[endpoint] = deque(maxlen=100)
+            latencies.append(latency)
+            if (
+                self.latency_tolerance is not None
+                and len(latencies) >= 10
+                and latency > self.latency_tolerance * min(latencies)
+            ):
+                overloaded = True
+
+        previous = int(limit.limit)
+        if overloaded:
+            if start < limit.last_decrease:
+                return
+            limit.limit = max(limit.min_limit, limit.limit * self.backoff_ratio)
+            limit.last_decrease = time.monotonic()
+        elif saturated:
+            limit.limit = min(limit.max_limit, limit.limit + 1 / limit.limit)
+            limit.wake()
+
+        if int(limit.limit) != previous:
+            self._gauge("concurrency_limit", int(limit.limit), {"class": cls})
+
+    def _report_all(self) -> None:
+        for cls, limit in self.limits.items():
+            self._gauge("concurrency_limit", int(limit.limit), {"class": cls})
+
+
+class CircuitState(Enum):
+    # requests are sent
+    CLOSED = "closed"
+    # requests fail immediately with `CircuitOpenError`
+    OPEN = "open"
+    # a limited number of requests is sent to find out whether the server recovered
+    HALF_OPEN = "half_open"
+
+
+# values of the `circuit_state` gauge
+_STATE_GAUGE = {CircuitState.CLOSED: 0, CircuitState.HALF_OPEN: 1, CircuitState.OPEN: 2}
+
+
+class _Circuit:
+    def __init__(self, window_size: int):
+        self.state = CircuitState.CLOSED
+        # (failed, slow) of the recent requests while closed
+        self.outcomes: deque[tuple[bool, bool]] = deque(maxlen=window_size)
+        self.opened_at = -math.inf
+        self.probes = 0
+
+
+class CircuitBreaker(_Gauges):
+    """
+    Fails requests immediately with `CircuitOpenError` while the server is unhealthy, separately for reads and
+    writes, instead of letting every caller wait for timeouts and retries.
+
+    The circuit opens when at least `failure_rate_threshold` of the last `window_size` requests failed (retryable
+    status codes, server errors and transport errors such as timeouts), or when at least `slow_call_rate_threshold`
+    of them took longer than `slow_call_duration`. At least `minimum_calls` requests are needed for a decision.
+
+    After `open_duration` seconds, the circuit is half-open: up to `half_open_probes` requests are let through.
+    The circuit closes when one of them succeeds and opens again when one of them fails.
+
+    `CircuitOpenError` is not retried, so calls fail fast even within the retries of a call.
+    """
+
+    def __init__(
+        self,
+        failure_rate_threshold: float = 0.5,
+        slow_call_duration: float | None = None,
+        slow_call_rate_threshold: float = 0.5,
+        window_size: int = 20,
+        minimum_calls: int = 10,
+        open_duration: float = 30.0,
+        half_open_probes: int = 1,
+    ):
+        if not 1 <= minimum_calls <= window_size:
+            raise ValueError("limits must satisfy 1 <= minimum_calls <= window_size")
+
+        super().__init__()
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.open_duration = open_duration
+        self.half_open_probes = half_open_probes
+        self.circuits = {cls: _Circuit(window_size) for cls in (READ, WRITE)}
+
+    def state(self, cls: str) -> CircuitState:
+        """Returns the current state of the circuit of the endpoint class (`READ` or `WRITE`)."""
+
+        circuit = self.circuits[cls]
+        if circuit.state == CircuitState.OPEN and time.monotonic() >= circuit.opened_at + self.open_duration:
+            self._transition(cls, circuit, CircuitState.HALF_OPEN)
+        return circuit.state
+
+    async def __call__(self, call: Call, request: httpx.Request, send_next: SendHandler) -> Response:
+        cls = endpoint_class(call)
+        circuit = self.circuits[cls]
+
+        state = self.state(cls)
+        if state == CircuitState.OPEN:
+            raise CircuitOpenError(cls, circuit.opened_at + self.open_duration - time.monotonic())
+        probe = state == CircuitState.HALF_OPEN
+        if probe:
+            if circuit.probes >= self.half_open_probes:
+                raise CircuitOpenError(cls, None)
+            circuit.probes += 1
+
+        start = time.monotonic()
+        try:
+            resp = await send_next(call, request)
+        except TRANSPORT_ERRORS:
+            self._record(cls, circuit, probe, start, failed=True)
+            raise
+        except BaseException:
+            if probe:
+                circuit.probes -= 1
+            raise
+
+        failed = resp.status_code in HTTP_RETRYABLE_STATUS_CODES or resp.status_code >= 500
+        self._record(cls, circuit, probe, start, failed=failed)
+        return resp
+
+    def _record(self, cls: str, circuit: _Circuit, probe: bool, start: float, failed: bool) -> None:
+        slow = self.slow_call_duration is not None and time.monotonic() - start >= self.slow_call_duration
+
+        if probe:
+            circuit.probes -= 1
+            if circuit.state == CircuitState.HALF_OPEN:
+                self._transition(cls, circuit, CircuitState.OPEN if failed or slow else CircuitState.CLOSED)
+            return
+
+        if circuit.state != CircuitState.CLOSED:
+            # sent before the circuit opened
+            return
+
+        circuit.outcomes.append((failed, slow))
+        if len(circuit.outcomes) < self.minimum_calls:
+            return
+
+        failures = sum(1 for failed, _ in circuit.outcomes if failed)
+        slow_calls = sum(1 for _, slow in circuit.outcomes if slow)
+        if (
+            failures >= self.failure_rate_threshold * len(circuit.outcomes)
+            or self.slow_call_duration is not None
+            and slow_calls >= self.slow_call_rate_threshold * len(circuit.outcomes)
+        ):
+            self._transition(cls, circuit, CircuitState.OPEN)
+
+    def _transition(self, cls: str, circuit: _Circuit, state: CircuitState) -> None:
+        circuit.state = state
+        if state == CircuitState.OPEN:
+            circuit.opened_at = time.monotonic()
+        elif state == CircuitState.CLOSED:
+            circuit.outcomes.clear()
+        self._gauge("circuit_state", _STATE_GAUGE[state], {"class": cls})
+
+    def _report_all(self) -> None:
+        for cls, circuit in self.circuits.items():
+            self._gauge("circuit_state", _STATE_GAUGE[circuit.state], {"class": cls})
@@ -0,0 +1,222 @@
+"""
+Creates many incarnations at once, e.g. when onboarding the repositories of a new template.
+
+    entries = load_manifest("incarnations.json")
+    report = await provision(client, entries, concurrency=20)
+    for result in report.failed:
+        print(result.incarnation_repository, result.error)
+
+Provisioning is idempotent: incarnations that already exist are reported instead of failing, so a manifest can
+simply be provisioned again after fixing the failed entries.
+"""
+import json
+import logging
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Any, Iterable, Self
+
+import httpx
+
+from foxops_client._bulk import StatusReport, run_bounded
+from foxops_client.client_async import AsyncFoxopsClient
+from foxops_client.client_sync import FoxopsClient
+from foxops_client.exceptions import (
+    CircuitOpenError,
+    FoxopsApiError,
+    IncarnationDoesNotExistError,
+)
+from foxops_client.types import IncarnationRecord, TemplateData
+
+log = logging.getLogger(__name__)
+
+# target directory that FoxOps uses if none is given
+DEFAULT_TARGET_DIRECTORY = "."
+
+
+class ProvisioningStatus(Enum):
+    CREATED = "created"
+    # an incarnation of the template already existed in the repository and directory
+    EXISTS = "exists"
+    FAILED = "failed"
+
+
+@dataclass(frozen=True)
+class ProvisioningEntry:
+    incarnation_repository: str
+    template_repository: str
+    template_repository_version: str
+    template_data: TemplateData = field(default_factory=dict)
+    target_directory: str = DEFAULT_TARGET_DIRECTORY
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Self:
+        return cls(
+            incarnation_repository=data["incarnation_repository"],
+            template_repository=data["template_repository"],
+            template_repository_version=data["template_repository_version"],
+            template_data=data.get("template_data") or {},
+            target_directory=data.get("target_directory") or DEFAULT_TARGET_DIRECTORY,
+        )
+
+
+@dataclass(frozen=True)
+class ProvisioningResult:
+    entry: ProvisioningEntry
+    status: ProvisioningStatus
+
+    # None if the incarnation couldn't be created
+    incarnation_id: int | None = None
+    # version of the template the incarnation is on. For existing incarnations, this can differ from the entry
+    template_repository_version: str | None = None
+    merge_request_url: str | None = None
+    error: str | None = None
+
+    @property
+    def incarnation_repository(self) -> str:
+        return self.entry.incarnation_repository
+
+    @property
+    def target_directory(self) -> str:
+        return self.entry.target_directory
+
+
+@dataclass
+class ProvisioningReport(StatusReport[ProvisioningResult, ProvisioningStatus]):
+    _statuses = ProvisioningStatus
+
+    # one result per entry, in the order of the entries
+    results: list[ProvisioningResult] = field(default_factory=list)
+
+    @property
+    def failed(self) -> list[ProvisioningResult]:
+        return self.with_status(ProvisioningStatus.FAILED)
+
+
+def load_manifest(path: str | Path) -> list[ProvisioningEntry]:
+    """
+    Reads the entries to provision from a JSON file, which contains a list of objects with the fields of
+    `ProvisioningEntry` (`template_data` and `target_directory` are optional).
+    """
+
+    with Path(path).open() as f:
+        return [ProvisioningEntry.from_dict(x) for x in json.load(f)]
+
+
+async def provision(
+    client: AsyncFoxopsClient,
+    entries: Iterable[ProvisioningEntry | dict[str, Any]],
+    concurrency: int = 10,
+    automerge: bool | None = None,
+) -> ProvisioningReport:
+    """
+    Creates an incarnation for every entry, with at most `concurrency` incarnations being created at the same time.
+
+    Before creating anything, all existing incarnations are listed once. Entries whose repository and target
+    directory already have an incarnation of the same template are reported as `EXISTS` without creating them again.
+    Incarnations that are created concurrently by someone else are detected when their creation fails, and are
+    reported in the same way. An existing incarnation of a different template is reported as `FAILED`.
+
+    :param automerge: passed on to `create_incarnation`
+    """
+
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
+    manifest = [x if isinstance(x, ProvisioningEntry) else ProvisioningEntry.from_dict(x) for x in entries]
+    results: list[ProvisioningResult | None] = [None] * len(manifest)
+
+    existing = {
+        (x.incarnation_repository, x.target_directory): x.id
+        for x in await client.list_incarnations(fields=["id", "incarnation_repository", "target_directory"])
+    }
+    known = [i for i, entry in enumerate(manifest) if _location(entry) in existing]
+    details = await client.get_incarnations(
+        [existing[_location(manifest[i])] for i in known],
+        concurrency=concurrency,
+        fields=["id", "template_repository", "template_repository_version"],
+    )
+    for i, incarnation in zip(known, details):
+        # details that can't be fetched anymore (e.g. the incarnation was deleted) are created again
+        if not isinstance(incarnation, FoxopsApiError):
+            results[i] = _existing(manifest[i], incarnation)
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    created = await run_bounded(missing, concurrency, lambda i: _create(client, manifest[i], automerge))
+    for i, result in zip(missing, created):
+        results[i] = result
+
+    return ProvisioningReport([r for r in results if r is not None])
+
+
+def provision_sync(
+    client: FoxopsClient, entries: Iterable[ProvisioningEntry | dict[str, Any]], **kwargs: Any
+) -> ProvisioningReport:
+    """Synchronous version of `provision`, for use with `FoxopsClient`."""
+
+    return client.run(provision(client.client, entries, **kwargs))
+
+
+async def _create(client: AsyncFoxopsClient, entry: ProvisioningEntry, automerge: bool | None) -> ProvisioningResult:
+    try:
+        created = await client.create_incarnation(
+            entry.incarnation_repository,
+            entry.template_repository,
+            entry.template_repository_version,
+            entry.template_data,
+            target_directory=entry.target_directory,
+            automerge=automerge,
+        )
+    except FoxopsApiError as e:
+        # most likely, the incarnation was created in the meantime
+        return await _resolve_conflict(client, entry, e)
+    except (httpx.HTTPError, CircuitOpenError) as e:
+        return ProvisioningResult(entry, ProvisioningStatus.FAILED, error=f"{type(e).__name__}: {e}")
+
+    return ProvisioningResult(
+        entry,
+        ProvisioningStatus.CREATED,
+        incarnation_id=created.id,
+        template_repository_version=created.template_repository_version,
+        merge_request_url=created.merge_request_url,
+    )
+
+
+async def _resolve_conflict(
+    client: AsyncFoxopsClient, entry: ProvisioningEntry, error: FoxopsApiError
+) -> ProvisioningResult:
+    try:
+        [incarnation] = await client.list_incarnations(entry.incarnation_repository, entry.target_directory)
+        details = await client.get_incarnation(
+            incarnation.id, fields=["id", "template_repository", "template_repository_version"]
+        )
+    except IncarnationDoesNotExistError:
+        # the creation failed for another reason
+        return ProvisioningResult(entry, ProvisioningStatus.FAILED, error=error.message)
+    except (FoxopsApiError, httpx.HTTPError, CircuitOpenError) as e:
+        log.warning(f"failed to look up the existing incarnation of {entry.incarnation_repository}: {e!r}")
+        return ProvisioningResult(entry, ProvisioningStatus.FAILED, error=error.message)
+
+    return _existing(entry, details)
+
+
+def _existing(entry: ProvisioningEntry, incarnation: IncarnationRecord) -> ProvisioningResult:
+    if incarnation.template_repository != entry.template_repository:
+        return ProvisioningResult(
+            entry,
+            ProvisioningStatus.FAILED,
+            incarnation_id=incarnation.id,
+            template_repository_version=incarnation.template_repository_version,
+            error=f"already an incarnation of {incarnation.template_repository}",
+        )
+
+    return ProvisioningResult(
+        entry,
+        ProvisioningStatus.EXISTS,
+        incarnation_id=incarnation.id,
+        template_repository_version=incarnation.template_repository_version,
+    )
+
+
+def _location(entry: ProvisioningEntry) -> tuple[str, str]:
+    return entry.incarnation_repository, entry.target_directory
@@ -0,0 +1,275 @@
+"""
+Reconciles the incarnations in FoxOps with a desired state, e.g. one that is kept in Git.
+
+    desired = load_manifest("incarnations.json")
+    changes = await plan(client, desired)
+    print(changes.counts())
+    report = await apply(client, changes, automerge=True)
+
+The desired state is described with the same entries as for provisioning (see `foxops_client.provisioning`).
+`plan` only reads, `apply` executes the writes of a plan. Incarnations that are already in the desired state
+are not written at all.
+"""
+import logging
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Iterable
+
+import httpx
+
+from foxops_client._bulk import StatusReport, run_bounded
+from foxops_client._diff import changed_data, removed_keys, same_version
+from foxops_client.client_async import AsyncFoxopsClient
+from foxops_client.client_sync import FoxopsClient
+from foxops_client.exceptions import CircuitOpenError, FoxopsApiError
+from foxops_client.provisioning import ProvisioningEntry
+from foxops_client.types import IncarnationWithDetails, TemplateData
+
+log = logging.getLogger(__name__)
+
+
+class Action(Enum):
+    CREATE = "create"
+    # update the version and/or set some template variables
+    PATCH = "patch"
+    # replace the template data, because variables were removed
+    PUT = "put"
+    DELETE = "delete"
+    NOOP = "noop"
+    # can't be reconciled through the API, e.g. because the incarnation uses a different template
+    CONFLICT = "conflict"
+
+
+@dataclass(frozen=True)
+class Change:
+    action: Action
+    incarnation_repository: str
+    target_directory: str
+    # None for incarnations that don't exist yet
+    incarnation_id: int | None = None
+    # the desired state, None for deletions
+    entry: ProvisioningEntry | None = None
+
+    # version of the template before the change
+    current_version: str | None = None
+    # for PATCH: the new version (None if unchanged) and the template variables that change
+    requested_version: str | None = None
+    requested_data: TemplateData = field(default_factory=dict)
+    # for CONFLICT: why the incarnation can't be reconciled
+    reason: str | None = None
+
+
+@dataclass
+class Plan(StatusReport[Change, Action]):
+    _statuses = Action
+    _results = "changes"
+    _status = "action"
+
+    # one change per desired entry (in the order of the entries), followed by the deletions
+    changes: list[Change] = field(default_factory=list)
+
+    @property
+    def writes(self) -> list[Change]:
+        """The changes that are executed by `apply`."""
+
+        return [c for c in self.changes if c.action not in (Action.NOOP, Action.CONFLICT)]
+
+    def with_action(self, action: Action) -> list[Change]:
+        return self.with_status(action)
+
+
+@dataclass(frozen=True)
+class ApplyResult:
+    change: Change
+    # the incarnation after the change, None for deletions and failed changes
+    incarnation: IncarnationWithDetails | None = None
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class ApplyReport:
+    # one result per write of the plan, in the order of the plan
+    results: list[ApplyResult] = field(default_factory=list)
+
+    @property
+    def failed(self) -> list[ApplyResult]:
+        return [r for r in self.results if not r.ok]
+
+
+async def plan(
+    client: AsyncFoxopsClient,
+    desired: Iterable[ProvisioningEntry | dict[str, Any]],
+    prune: bool = False,
+    concurrency: int = 10,
+) -> Plan:
+    """
+    Compares the desired state with the incarnations in FoxOps and returns the changes that are needed.
+
+    Incarnations are matched by their repository and target directory. A changed version and template variables
+    that were added or changed are applied with a PATCH, which only sends what changed. If template variables were
+    removed, the incarnation is updated with a PUT of the complete desired template data instead.
+
+    Incarnations that should follow a branch of their template are always patched to it, because the branch might
+    have moved. Only version tags and commit hashes are considered unchanged when they match.
+
+    :param prune: delete incarnations of the templates of the desired state that are not part of it. Incarnations
+        of other templates are never touched
+    :param concurrency: maximum number of incarnations that are fetched at the same time
+    """
+
+    entries = [x if isinstance(x, ProvisioningEntry) else ProvisioningEntry.from_dict(x) for x in desired]
+
+    listed = {(x.incarnation_repository, x.target_directory): x.id for x in await client.list_incarnations()}
+    wanted = {(e.incarnation_repository, e.target_directory) for e in entries}
+    if len(wanted) != len(entries):
+        raise ValueError("the desired state contains incarnations with the same repository and target directory")
+
+    # the details of all incarnations are only needed to find the ones to prune
+    ids = list(listed.values()) if prune else [listed[x] for x in wanted if x in listed]
+    actual = {}
+    for details in await client.get_incarnations(ids, concurrency=concurrency):
+        # incarnations that were deleted in the meantime are treated as missing
+        if isinstance(details, IncarnationWithDetails):
+            actual[(details.incarnation_repository, details.target_directory)] = details
+
+    changes = [_change(entry, actual.get((entry.incarnation_repository, entry.target_directory))) for entry in entries]
+
+    if prune:
+        templates = {e.template_repository for e in entries}
+        for location, details in sorted(actual.items(), key=lambda x: x[1].id):
+            if location not in wanted and details.template_repository in templates:
+                changes.append(
+                    Change(
+                        Action.DELETE,
+                        details.incarnation_repository,
+                        details.target_directory,
+                        incarnation_id=details.id,
+                        current_version=details.template_repository_version,
+                    )
+                )
+
+    return Plan(changes)
+
+
+async def apply(
+    client: AsyncFoxopsClient, changes: Plan, automerge: bool = False, concurrency: int = 10
+) -> ApplyReport:
+    """
+    Executes the writes of the plan, with at most `concurrency` of them running at the same time.
+
+    A failed write doesn't stop the others, it's reported in the result instead.
+
+    :param automerge: merge the changes immediately, instead of opening merge requests
+    """
+
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
+    return ApplyReport(await run_bounded(changes.writes, concurrency, lambda change: _apply(client, change, automerge)))
+
+
+async def reconcile(
+    client: AsyncFoxopsClient,
+    desired: Iterable[ProvisioningEntry | dict[str, Any]],
+    prune: bool = False,
+    automerge: bool = False,
+    concurrency: int = 10,
+) -> ApplyReport:
+    """Plans and applies the changes in one go."""
+
+    return await apply(
+        client,
+        await plan(client, desired, prune=prune, concurrency=concurrency),
+        automerge=automerge,
+        concurrency=concurrency,
+    )
+
+
+def plan_sync(client: FoxopsClient, desired: Iterable[ProvisioningEntry | dict[str, Any]], **kwargs: Any) -> Plan:
+    """Synchronous version of `plan`, for use with `FoxopsClient`."""
+
+    return client.run(plan(client.client, desired, **kwargs))
+
+
+def apply_sync(client: FoxopsClient, changes: Plan, **kwargs: Any) -> ApplyReport:
+    """Synchronous version of `apply`, for use with `FoxopsClient`."""
+
+    return client.run(apply(client.client, changes, **kwargs))
+
+
+def _change(entry: ProvisioningEntry, actual: IncarnationWithDetails | None) -> Change:
+    location: dict[str, Any] = {
+        "incarnation_repository": entry.incarnation_repository,
+        "target_directory": entry.target_directory,
+        "entry": entry,
+    }
+    if actual is None:
+        return Change(Action.CREATE, **location)
+
+    location.update(incarnation_id=actual.id, current_version=actual.template_repository_version)
+    if actual.template_repository != entry.template_repository:
+        return Change(
+            Action.CONFLICT, **location, reason=f"incarnation of {actual.template_repository}, can't be changed"
+        )
+
+    if removed_keys(actual.template_data, entry.template_data):
+        return Change(Action.PUT, **location)
+
+    version_changed = not same_version(
+        entry.template_repository_version, actual.template_repository_version, actual.template_repository_version_hash
+    )
+    data = changed_data(actual.template_data, entry.template_data)
+    if not version_changed and not data:
+        return Change(Action.NOOP, **location)
+
+    return Change(
+        Action.PATCH,
+        **location,
+        requested_version=entry.template_repository_version if version_changed else None,
+        requested_data=data,
+    )
+
+
+async def _apply(client: AsyncFoxopsClient, change: Change, automerge: bool) -> ApplyResult:
+    entry = change.entry
+    try:
+        if change.action == Action.CREATE:
+            assert entry is not None
+            incarnation = await client.create_incarnation(
+                entry.incarnation_repository,
+                entry.template_repository,
+                entry.template_repository_version,
+                entry.template_data,
+                target_directory=entry.target_directory,
+                automerge=automerge,
+            )
+        elif change.action == Action.PATCH:
+            assert change.incarnation_id is not None
+            incarnation = await client.patch_incarnation(
+                change.incarnation_id,
+                automerge,
+                requested_version=change.requested_version,
+                requested_data=change.requested_data or None,
+            )
+        elif change.action == Action.PUT:
+            assert change.incarnation_id is not None and entry is not None
+            incarnation = await client.put_incarnation(
+                change.incarnation_id, automerge, entry.template_repository_version, entry.template_data
+            )
+        elif change.action == Action.DELETE:
+            assert change.incarnation_id is not None
+            await client.delete_incarnation(change.incarnation_id)
+            return ApplyResult(change)
+        else:
+            raise ValueError(f"{change.action} is not a write")
+    except FoxopsApiError as e:
+        return ApplyResult(change, error=e.message)
+    except (httpx.HTTPError, CircuitOpenError) as e:
+        log.warning(f"failed to {change.action.value} {change.incarnation_repository}: {e!r}")
+        return ApplyResult(change, error=f"{type(e).__name__}: {e}")
+
+    return ApplyResult(change, incarnation)
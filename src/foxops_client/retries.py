@@ -1,34 +1,272 @@
-import functools
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable
 
 import httpx
 from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
     retry,
     retry_if_exception,
+    retry_if_result,
     stop_after_delay,
     wait_random_exponential,
 )
+from tenacity.stop import stop_base
+from tenacity.wait import wait_base
 
 HTTP_RETRYABLE_STATUS_CODES = (
     httpx.codes.REQUEST_TIMEOUT,
+    httpx.codes.TOO_MANY_REQUESTS,
     httpx.codes.BAD_GATEWAY,
     httpx.codes.SERVICE_UNAVAILABLE,
     httpx.codes.GATEWAY_TIMEOUT,
 )
 
+# the gateway might have forwarded the request before failing, so these are only retried for idempotent requests
+HTTP_GATEWAY_STATUS_CODES = (httpx.codes.BAD_GATEWAY, httpx.codes.GATEWAY_TIMEOUT)
+
+# methods that can safely be repeated, even if the server might have already processed the first request
+IDEMPOTENT_HTTP_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+# errors that occur before the request was sent to the server. It's always safe to retry those.
+CONNECTION_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# errors that might occur after the server already received the request
+TRANSPORT_ERRORS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+
+MAX_RETRY_AFTER = 5 * 60
+
+
+@dataclass(frozen=True)
+class RetryAttempt:
+    """Describes a failed attempt that is about to be retried. Passed to the `on_retry` hook."""
+
+    attempt_number: int
+    next_delay: float
+
+    response: httpx.Response | None
+    exception: BaseException | None
+
+
+class RetryBudget:
+    """
+    Token bucket that limits the number of retries to a fraction of the requests.
+
+    Every request deposits `ratio` tokens, every retry withdraws one token. Additionally, the bucket is refilled
+    with `min_retries_per_second` tokens per second, so that clients with little traffic can still retry.
+    The balance never exceeds `max_tokens`.
+
+    When the FoxOps API is down, this prevents the retries from multiplying the request volume.
+    A single budget can be shared between multiple clients.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries_per_second: float = 1.0, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.max_tokens = max_tokens
+
+        self._tokens = max_tokens
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+
+            self._tokens -= 1
+            return True
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._last_refill) * self.min_retries_per_second)
+        self._last_refill = now
+
 
 def retryable_exception(e: BaseException) -> bool:
-    if not isinstance(e, httpx.HTTPStatusError):
-        return False
+    if isinstance(e, httpx.HTTPStatusError):
+        return _retryable_status(e.response)
 
-    if e.response.status_code in HTTP_RETRYABLE_STATUS_CODES:
+    if isinstance(e, CONNECTION_ERRORS):
         return True
 
+    if isinstance(e, TRANSPORT_ERRORS):
+        try:
+            return e.request.method in IDEMPOTENT_HTTP_METHODS
+        except RuntimeError:
+            # the request is not known
+            return False
+
     return False
 
 
-default_retry = functools.partial(
-    retry,
-    wait=wait_random_exponential(multiplier=1, max=60),
-    stop=stop_after_delay(5 * 60),
-    retry=retry_if_exception(retryable_exception),
-)
+def retryable_response(resp: Any) -> bool:
+    return isinstance(resp, httpx.Response) and _retryable_status(resp)
+
+
+def _retryable_status(resp: httpx.Response) -> bool:
+    if resp.status_code not in HTTP_RETRYABLE_STATUS_CODES:
+        return False
+
+    if resp.status_code in HTTP_GATEWAY_STATUS_CODES:
+        try:
+            return resp.request.method in IDEMPOTENT_HTTP_METHODS
+        except RuntimeError:
+            # the request is not known
+            return False
+
+    return True
+
+
+def parse_retry_after(resp: httpx.Response) -> float | None:
+    """Returns the delay in seconds requested by the `Retry-After` header of the response, if present."""
+
+    value = resp.headers.get("Retry-After")
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _outcome_response(retry_state: RetryCallState) -> httpx.Response | None:
+    if retry_state.outcome is None:
+        return None
+
+    if retry_state.outcome.failed:
+        exception = retry_state.outcome.exception()
+        if isinstance(exception, httpx.HTTPStatusError):
+            return exception.response
+        return None
+
+    result = retry_state.outcome.result()
+    if isinstance(result, httpx.Response):
+        return result
+    return None
+
+
+class wait_retry_after(wait_base):
+    """Waits as long as requested by the `Retry-After` response header, and falls back to `fallback` otherwise."""
+
+    def __init__(self, fallback: wait_base, max: float = MAX_RETRY_AFTER):
+        self.fallback = fallback
+        self.max = max
+
+    def __call__(self, retry_state: RetryCallState) -> float:
+        resp = _outcome_response(retry_state)
+        if resp is not None:
+            delay = parse_retry_after(resp)
+            if delay is not None:
+                return min(delay, self.max)
+
+        return self.fallback(retry_state)
+
+
+class stop_if_retry_budget_exhausted(stop_base):
+    """Stops retrying when the retry budget doesn't allow for another retry. Withdraws from the budget otherwise."""
+
+    def __init__(self, budget: RetryBudget):
+        self.budget = budget
+
+    def __call__(self, retry_state: RetryCallState) -> bool:
+        return not self.budget.try_withdraw()
+
+
+def _return_last_outcome(retry_state: RetryCallState) -> Any:
+    # when giving up, return the last response (or raise the last exception) instead of raising a RetryError.
+    # That way, the caller handles the response just like any other unexpected response.
+    assert retry_state.outcome is not None
+    return retry_state.outcome.result()
+
+
+def retry_policy(
+    budget: RetryBudget | None = None,
+    on_retry: Callable[[RetryAttempt], None] | None = None,
+    **kwargs: Any,
+) -> AsyncRetrying:
+    """
+    Returns the retry policy for coroutines that perform an HTTP request and return the response: retries on
+    retryable status codes and transport errors.
+
+    The policy is meant to be built once and copied for every call (`policy.copy()(fn, *args)`).
+
+    :param budget: limits the number of retries. Every call deposits into the budget
+    :param on_retry: called before sleeping ahead of a retry
+    :param kwargs: override the default arguments of `tenacity.AsyncRetrying`
+    """
+
+    return AsyncRetrying(**_retry_arguments(budget, on_retry, **kwargs))
+
+
+def default_retry(
+    budget: RetryBudget | None = None,
+    on_retry: Callable[[RetryAttempt], None] | None = None,
+    **kwargs: Any,
+):
+    """
+    Returns a decorator that retries the decorated function (which performs an HTTP request and returns the response)
+    with the same policy as `retry_policy`.
+    """
+
+    return retry(**_retry_arguments(budget, on_retry, **kwargs))
+
+
+def _retry_arguments(
+    budget: RetryBudget | None,
+    on_retry: Callable[[RetryAttempt], None] | None,
+    **kwargs: Any,
+) -> dict[str, Any]:
+    stop: stop_base = stop_after_delay(5 * 60)
+    if budget is not None:
+        stop = stop | stop_if_retry_budget_exhausted(budget)
+
+    def before(retry_state: RetryCallState) -> None:
+        if budget is not None and retry_state.attempt_number == 1:
+            budget.deposit()
+
+    def before_sleep(retry_state: RetryCallState) -> None:
+        if on_retry is None or retry_state.outcome is None:
+            return
+
+        on_retry(
+            RetryAttempt(
+                attempt_number=retry_state.attempt_number,
+                next_delay=retry_state.upcoming_sleep,
+                response=_outcome_response(retry_state),
+                exception=retry_state.outcome.exception() if retry_state.outcome.failed else None,
+            )
+        )
+
+    arguments: dict[str, Any] = {
+        "wait": wait_retry_after(wait_random_exponential(multiplier=1, max=60)),
+        "stop": stop,
+        "retry": retry_if_result(retryable_response) | retry_if_exception(retryable_exception),
+        "before": before,
+        "before_sleep": before_sleep,
+        "retry_error_callback": _return_last_outcome,
+    }
+    arguments.update(kwargs)
+
+    return arguments
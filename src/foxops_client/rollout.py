@@ -0,0 +1,315 @@
+"""
+Rolls out a version of a template to all of its incarnations.
+
+    report = await rollout(client, "group/template", "v2.0.0", canary=5, max_error_rate=0.1, progress="rollout.jsonl")
+    for result in report.failed:
+        print(result.incarnation_repository, result.error)
+"""
+import json
+import logging
+from dataclasses import asdict, dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Any, Iterable, Self
+
+import httpx
+
+from foxops_client._bulk import StatusReport, run_bounded
+from foxops_client._diff import same_version
+from foxops_client.client_async import AsyncFoxopsClient
+from foxops_client.client_sync import FoxopsClient
+from foxops_client.exceptions import (
+    CircuitOpenError,
+    FoxopsApiError,
+    IncarnationDoesNotExistError,
+)
+from foxops_client.types import IncarnationWithDetails
+
+log = logging.getLogger(__name__)
+
+
+class RolloutStatus(Enum):
+    # the incarnation was updated to the new version
+    UPDATED = "updated"
+    # the incarnation already was on the new version
+    UP_TO_DATE = "up_to_date"
+    # the incarnation would have been updated, but this was a dry run
+    WOULD_UPDATE = "would_update"
+    FAILED = "failed"
+    # the incarnation was deleted during the rollout
+    NOT_FOUND = "not_found"
+    # the incarnation was not updated because the rollout was stopped
+    SKIPPED = "skipped"
+
+
+# statuses of incarnations that are done and are not touched again when resuming a rollout
+_DONE = (RolloutStatus.UPDATED, RolloutStatus.UP_TO_DATE, RolloutStatus.NOT_FOUND)
+
+
+@dataclass(frozen=True)
+class RolloutResult:
+    incarnation_id: int
+    incarnation_repository: str
+    target_directory: str
+    status: RolloutStatus
+
+    # version of the template before the rollout
+    previous_version: str | None
+    merge_request_url: str | None = None
+    error: str | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {**asdict(self), "status": self.status.value}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Self:
+        return cls(**{**data, "status": RolloutStatus(data["status"])})
+
+
+@dataclass
+class RolloutReport(StatusReport[RolloutResult, RolloutStatus]):
+    _statuses = RolloutStatus
+
+    template_repository: str
+    version: str
+    dry_run: bool
+    # one result per incarnation of the template, ordered by incarnation id
+    results: list[RolloutResult] = field(default_factory=list)
+    # why the rollout was stopped before all incarnations were updated. None if it wasn't stopped
+    stop_reason: str | None = None
+
+    @property
+    def stopped(self) -> bool:
+        return self.stop_reason is not None
+
+    @property
+    def failed(self) -> list[RolloutResult]:
+        return self.with_status(RolloutStatus.FAILED)
+
+
+class RolloutProgress:
+    """
+    Records the finished incarnations of a rollout in a file (one JSON object per line), so that an interrupted or
+    stopped rollout can be resumed. Incarnations that were updated in a previous run are not touched again,
+    failed and skipped ones are retried.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.results: dict[int, RolloutResult] = {}
+        self._header: dict[str, str] | None = None
+
+        if self.path.exists():
+            with self.path.open() as f:
+                lines = [json.loads(line) for line in f if line.strip()]
+            if lines:
+                self._header = lines[0]
+                for line in lines[1:]:
+                    result = RolloutResult.from_dict(line)
+                    self.results[result.incarnation_id] = result
+
+    def start(self, template_repository: str, version: str) -> None:
+        header = {"template_repository": template_repository, "version": version}
+        if self._header is None:
+            self._header = header
+            self._append(header)
+        elif self._header != header:
+            raise ValueError(
+                f"{self.path} records the rollout of {self._header['template_repository']} "
+                f"{self._header['version']}, not of {template_repository} {version}"
+            )
+
+    def done(self, incarnation_id: int) -> RolloutResult | None:
+        result = self.results.get(incarnation_id)
+        if result is not None and result.status in _DONE:
+            return result
+        return None
+
+    def record(self, result: RolloutResult) -> None:
+        self.results[result.incarnation_id] = result
+        self._append(result.to_dict())
+
+    def _append(self, data: dict[str, Any]) -> None:
+        with self.path.open("a") as f:
+            f.write(json.dumps(data) + "\n")
+
+
+async def rollout(
+    client: AsyncFoxopsClient,
+    template_repository: str,
+    version: str,
+    from_versions: Iterable[str] | None = None,
+    automerge: bool = False,
+    concurrency: int = 10,
+    dry_run: bool = False,
+    canary: int = 0,
+    max_error_rate: float | None = None,
+    min_attempts: int = 10,
+    progress: RolloutProgress | str | Path | None = None,
+) -> RolloutReport:
+    """
+    Updates all incarnations of the template to the given version, using `patch_incarnation`.
+
+    Incarnations that are already on the version are up to date if it's a version tag or commit hash. Branches might
+    have moved, so incarnations on the branch are updated again.
+
+    :param from_versions: only update incarnations that are currently on one of these versions
+    :param automerge: merge the changes immediately, instead of opening merge requests
+    :param concurrency: maximum number of incarnations that are read or updated at the same time
+    :param dry_run: only report which incarnations would be updated
+    :param canary: number of incarnations that are updated first. The rollout stops if any of them fails
+    :param max_error_rate: stop the rollout when the fraction of failed updates exceeds this value (after at least
+        `min_attempts` updates). Updates that are in progress are completed, the remaining incarnations are skipped
+    :param progress: file (or `RolloutProgress`) to record the progress in. Rolling out again with the same file
+        resumes the rollout
+    """
+
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
+    if progress is not None and not isinstance(progress, RolloutProgress):
+        progress = RolloutProgress(progress)
+    if progress is not None and not dry_run:
+        progress.start(template_repository, version)
+
+    runner = _Rollout(
+        client,
+        RolloutReport(template_repository, version, dry_run),
+        automerge=automerge,
+        concurrency=concurrency,
+        max_error_rate=max_error_rate,
+        min_attempts=min_attempts,
+        progress=progress if not dry_run else None,
+    )
+
+    candidates = await runner.select(set(from_versions) if from_versions is not None else None)
+    await runner.run(candidates[:canary])
+    if not runner.stopped and runner.failures:
+        runner.stop(f"{runner.failures} of {len(candidates[:canary])} canaries failed")
+    await runner.run(candidates[canary:])
+
+    runner.report.results.sort(key=lambda r: r.incarnation_id)
+    return runner.report
+
+
+def rollout_sync(client: FoxopsClient, template_repository: str, version: str, **kwargs: Any) -> RolloutReport:
+    """Synchronous version of `rollout`, for use with `FoxopsClient`."""
+
+    return client.run(rollout(client.client, template_repository, version, **kwargs))
+
+
+class _Rollout:
+    def __init__(
+        self,
+        client: AsyncFoxopsClient,
+        report: RolloutReport,
+        automerge: bool,
+        concurrency: int,
+        max_error_rate: float | None,
+        min_attempts: int,
+        progress: RolloutProgress | None,
+    ):
+        self.client = client
+        self.report = report
+        self.automerge = automerge
+        self.concurrency = concurrency
+        self.max_error_rate = max_error_rate
+        self.min_attempts = min_attempts
+        self.progress = progress
+
+        self.attempts = 0
+        self.failures = 0
+
+    @property
+    def stopped(self) -> bool:
+        return self.report.stopped
+
+    def stop(self, reason: str) -> None:
+        if not self.stopped:
+            log.warning(f"stopping rollout of {self.report.template_repository} {self.report.version}: {reason}")
+            self.report.stop_reason = reason
+
+    async def select(self, from_versions: set[str] | None) -> list[IncarnationWithDetails]:
+        """Returns the incarnations to update. Reports incarnations that are up to date or already done."""
+
+        ids = []
+        for incarnation in await self.client.list_incarnations():
+            done = self.progress.done(incarnation.id) if self.progress is not None else None
+            if done is not None:
+                self.report.results.append(done)
+            else:
+                ids.append(incarnation.id)
+
+        candidates = []
+        for details in await self.client.get_incarnations(sorted(ids), concurrency=self.concurrency):
+            # incarnations that were deleted in the meantime are ignored, it's unknown whether they used the template
+            if isinstance(details, FoxopsApiError) or details.template_repository != self.report.template_repository:
+                continue
+
+            if same_version(
+                self.report.version, details.template_repository_version, details.template_repository_version_hash
+            ):
+                self._finish(_result(details, RolloutStatus.UP_TO_DATE))
+            elif from_versions is None or details.template_repository_version in from_versions:
+                candidates.append(details)
+
+        return candidates
+
+    async def run(self, incarnations: list[IncarnationWithDetails]) -> None:
+        await run_bounded(incarnations, self.concurrency, self._process)
+
+    async def _process(self, incarnation: IncarnationWithDetails) -> None:
+        if self.stopped:
+            self.report.results.append(_result(incarnation, RolloutStatus.SKIPPED))
+            return
+
+        self._finish(await self._update(incarnation))
+
+    async def _update(self, incarnation: IncarnationWithDetails) -> RolloutResult:
+        if self.report.dry_run:
+            return _result(incarnation, RolloutStatus.WOULD_UPDATE)
+
+        try:
+            updated = await self.client.patch_incarnation(
+                incarnation.id, automerge=self.automerge, requested_version=self.report.version
+            )
+        except IncarnationDoesNotExistError:
+            return _result(incarnation, RolloutStatus.NOT_FOUND)
+        except CircuitOpenError as e:
+            # the server is unhealthy, the remaining incarnations are skipped (and updated when resuming)
+            self.stop(str(e))
+            return _result(incarnation, RolloutStatus.SKIPPED)
+        except FoxopsApiError as e:
+            return _result(incarnation, RolloutStatus.FAILED, error=e.message)
+        except httpx.HTTPError as e:
+            return _result(incarnation, RolloutStatus.FAILED, error=f"{type(e).__name__}: {e}")
+
+        return _result(incarnation, RolloutStatus.UPDATED, merge_request_url=updated.merge_request_url)
+
+    def _finish(self, result: RolloutResult) -> None:
+        self.report.results.append(result)
+        if self.progress is not None:
+            self.progress.record(result)
+
+        if result.status in (RolloutStatus.UPDATED, RolloutStatus.FAILED):
+            self.attempts += 1
+        if result.status == RolloutStatus.FAILED:
+            self.failures += 1
+
+        if (
+            self.max_error_rate is not None
+            and self.attempts >= self.min_attempts
+            and self.failures / self.attempts > self.max_error_rate
+        ):
+            self.stop(f"{self.failures} of {self.attempts} updates failed")
+
+
+def _result(incarnation: IncarnationWithDetails, status: RolloutStatus, **kwargs: Any) -> RolloutResult:
+    return RolloutResult(
+        incarnation_id=incarnation.id,
+        incarnation_repository=incarnation.incarnation_repository,
+        target_directory=incarnation.target_directory,
+        status=status,
+        previous_version=incarnation.template_repository_version,
+        **kwargs,
+    )
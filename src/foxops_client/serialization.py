@@ -0,0 +1,239 @@
+import json
+import sys
+from dataclasses import fields
+from typing import Any, Mapping, TypeVar
+
+from foxops_client.types import (
+    Incarnation,
+    IncarnationRecord,
+    IncarnationWithDetails,
+    LazyTemplateData,
+)
+
+T = TypeVar("T", bound=Incarnation)
+R = TypeVar("R", bound=IncarnationRecord)
+
+# fields of `IncarnationWithDetails` that can be decoded lazily
+LAZY_FIELDS = ("template_data", "template_data_full")
+
+# string fields that `from_dict` interns, because they are shared by many incarnations
+INTERNED_FIELDS = (
+    "incarnation_repository",
+    "target_directory",
+    "template_repository",
+    "template_repository_version",
+    "template_repository_version_hash",
+)
+
+
+class JsonCodec:
+    """
+    Encodes request bodies and decodes response bodies of the FoxOps API.
+
+    This implementation uses the `json` module of the standard library and is the default. The subclasses use faster
+    JSON libraries and can be passed to the client explicitly, see `fastest_codec`.
+    """
+
+    name = "json"
+    content_type = "application/json"
+
+    def encode(self, obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), default=_encode_mapping).encode()
+
+    def decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+    def decode_object(self, data: bytes, cls: type[T]) -> T:
+        return cls.from_dict(self.decode(data))
+
+    def decode_list(self, data: bytes, cls: type[T]) -> list[T]:
+        return [cls.from_dict(x) for x in self.decode(data)]
+
+    def decode_record(self, data: bytes, record: type[R]) -> R:
+        return record.from_dict(self.decode(data))
+
+    def decode_records(self, data: bytes, record: type[R]) -> list[R]:
+        return [record.from_dict(x) for x in self.decode(data)]
+
+
+class OrjsonCodec(JsonCodec):
+    """Uses `orjson` for encoding and decoding."""
+
+    name = "orjson"
+
+    def __init__(self) -> None:
+        import orjson
+
+        self._orjson = orjson
+
+    def encode(self, obj: Any) -> bytes:
+        return self._orjson.dumps(obj, default=_encode_mapping)
+
+    def decode(self, data: bytes) -> Any:
+        return self._orjson.loads(data)
+
+
+class MsgspecCodec(JsonCodec):
+    """
+    Uses `msgspec` for encoding and decoding.
+
+    Responses are decoded directly into the dataclasses of `foxops_client.types`, without building intermediate
+    dictionaries. msgspec doesn't intern strings, so the fields that `from_dict` interns are interned afterwards.
+    msgspec validates the types of all fields, responses that don't match them (e.g. a number where a string is
+    expected) are decoded like `JsonCodec` does instead.
+
+    :param lazy_template_data: keep `template_data` and `template_data_full` of incarnations as raw JSON, which is
+        only decoded when they are accessed (see `LazyTemplateData`). Always uses less memory, but trades CPU time
+        for it: building the incarnations is slower, so decoding is only faster for template data with more than
+        about 10 variables (and only if most of it is never accessed). See `benchmarks/parsing.py`
+    """
+
+    name = "msgspec"
+
+    def __init__(self, lazy_template_data: bool = False) -> None:
+        import msgspec
+
+        self._msgspec = msgspec
+        self._encoder = msgspec.json.Encoder(enc_hook=self._enc_hook)
+        self._decoder = msgspec.json.Decoder()
+        self._typed_decoders: dict[Any, Any] = {}
+        self._record_structs: dict[type[IncarnationRecord], Any] = {}
+        self._interned_fields: dict[type[Incarnation], list[str]] = {}
+        self._astuple = msgspec.structs.astuple
+
+        self.lazy_template_data = lazy_template_data
+        if lazy_template_data:
+            # same fields as IncarnationWithDetails, but the template data is kept as raw JSON
+            self._lazy_struct = msgspec.defstruct(
+                "LazyIncarnationWithDetails",
+                [(f.name, msgspec.Raw if f.name in LAZY_FIELDS else f.type) for f in fields(IncarnationWithDetails)],
+                gc=False,
+            )
+            self._lazy_indices = [i for i, f in enumerate(fields(IncarnationWithDetails)) if f.name in LAZY_FIELDS]
+            self._interned_indices = [
+                i for i, f in enumerate(fields(IncarnationWithDetails)) if f.name in INTERNED_FIELDS
+            ]
+            self._dict_decoder = msgspec.json.Decoder(dict[str, Any])
+            self._slot_setters: dict[type[Incarnation], list[Any]] = {}
+
+    def encode(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj)
+
+    def decode(self, data: bytes) -> Any:
+        return self._decoder.decode(data)
+
+    def decode_object(self, data: bytes, cls: type[T]) -> T:
+        try:
+            if self.lazy_template_data and issubclass(cls, IncarnationWithDetails):
+                return self._lazy_incarnation(self._typed_decoder(self._lazy_struct).decode(data), cls)
+            return self._intern(self._typed_decoder(cls).decode(data))
+        except self._msgspec.ValidationError:
+            return super().decode_object(data, cls)
+
+    def decode_list(self, data: bytes, cls: type[T]) -> list[T]:
+        try:
+            if self.lazy_template_data and issubclass(cls, IncarnationWithDetails):
+                lazy_items = self._typed_decoder(list[self._lazy_struct]).decode(data)  # type: ignore[name-defined]
+                return [self._lazy_incarnation(x, cls) for x in lazy_items]
+            items = self._typed_decoder(list[cls]).decode(data)  # type: ignore[valid-type]
+        except self._msgspec.ValidationError:
+            return super().decode_list(data, cls)
+        self._intern_all(items, cls)
+        return items
+
+    def decode_record(self, data: bytes, record: type[R]) -> R:
+        try:
+            decoded = self._typed_decoder(self._record_struct(record)).decode(data)
+        except self._msgspec.ValidationError:
+            return super().decode_record(data, record)
+        return tuple.__new__(record, self._astuple(decoded))
+
+    def decode_records(self, data: bytes, record: type[R]) -> list[R]:
+        try:
+            items = self._typed_decoder(list[self._record_struct(record)]).decode(data)  # type: ignore[misc]
+        except self._msgspec.ValidationError:
+            return super().decode_records(data, record)
+        astuple = self._astuple
+        return [tuple.__new__(record, astuple(x)) for x in items]
+
+    def _record_struct(self, record: type[IncarnationRecord]) -> Any:
+        # only the fields of the record are decoded, all other fields are skipped without creating any objects
+        struct = self._record_structs.get(record)
+        if struct is None:
+            struct = self._record_structs[record] = self._msgspec.defstruct(
+                "IncarnationRecord", list(record._field_types.items()), gc=False
+            )
+        return struct
+
+    def _lazy_incarnation(self, decoded: Any, cls: type[T]) -> T:
+        values = list(self._astuple(decoded))
+        for i in self._lazy_indices:
+            raw = bytes(values[i])
+            values[i] = None if raw == b"null" else LazyTemplateData(raw, self._dict_decoder.decode)
+        for i in self._interned_indices:
+            if values[i] is not None:
+                values[i] = sys.intern(values[i])
+
+        # the generated `__init__` of frozen dataclasses is slow, so the slots are filled directly (like msgspec does
+        # when it decodes into a dataclass)
+        setters = self._slot_setters.get(cls)
+        if setters is None:
+            setters = self._slot_setters[cls] = [getattr(cls, f.name).__set__ for f in fields(cls)]
+        incarnation = object.__new__(cls)
+        for set_, value in zip(setters, values):
+            set_(incarnation, value)
+        return incarnation
+
+    def _intern(self, incarnation: T) -> T:
+        self._intern_all([incarnation], type(incarnation))
+        return incarnation
+
+    def _intern_all(self, incarnations: list[T], cls: type[T]) -> None:
+        names = self._interned_fields.get(cls)
+        if names is None:
+            names = self._interned_fields[cls] = [f.name for f in fields(cls) if f.name in INTERNED_FIELDS]
+
+        intern, setattr_ = sys.intern, object.__setattr__
+        for incarnation in incarnations:
+            for name in names:
+                value = getattr(incarnation, name)
+                if value is not None:
+                    # the dataclasses are frozen
+                    setattr_(incarnation, name, intern(value))
+
+    def _enc_hook(self, obj: Any) -> Any:
+        if isinstance(obj, LazyTemplateData) and obj.raw is not None:
+            # not decoded yet, so it's unchanged
+            return self._msgspec.Raw(obj.raw)
+        return _encode_mapping(obj)
+
+    def _typed_decoder(self, type_: Any) -> Any:
+        decoder = self._typed_decoders.get(type_)
+        if decoder is None:
+            decoder = self._typed_decoders[type_] = self._msgspec.json.Decoder(type_)
+        return decoder
+
+
+def _encode_mapping(obj: Any) -> Any:
+    # e.g. `LazyTemplateData`, or template data of incarnations that is passed on to other requests
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def default_codec() -> JsonCodec:
+    """Returns the codec that clients use unless another one is passed: `JsonCodec`."""
+
+    return JsonCodec()
+
+
+def fastest_codec() -> JsonCodec:
+    """Returns the fastest available codec: `msgspec` or `orjson` if installed, the standard library otherwise."""
+
+    for codec in (MsgspecCodec, OrjsonCodec):
+        try:
+            return codec()
+        except ImportError:
+            pass
+
+    return JsonCodec()
@@ -0,0 +1,54 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+from foxops_client.dispatch import Call, CallHandler, Result
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls: while a call for a key is in flight, further calls for the same key don't start
+    a new call but wait for the result of the first one.
+
+    The call runs in its own task, so that cancelling one of the waiting callers doesn't affect the others.
+    """
+
+    def __init__(self) -> None:
+        self.coalesced = 0
+        self._calls: dict[Hashable, asyncio.Future[Any]] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._done(key, f))
+        else:
+            self.coalesced += 1
+
+        return await asyncio.shield(future)
+
+    def _done(self, key: Hashable, future: asyncio.Future[Any]) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+        # mark the exception as retrieved, in case all callers were cancelled
+        if not future.cancelled():
+            future.exception()
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+class CoalescingMiddleware:
+    """Lets concurrent identical reads share a single request and its result."""
+
+    def __init__(self, single_flight: SingleFlight):
+        self.single_flight = single_flight
+
+    async def __call__(self, call: Call, call_next: CallHandler) -> Result:
+        if not call.endpoint.is_read:
+            return await call_next(call)
+
+        return await self.single_flight.do((call.endpoint.name, call.key), lambda: call_next(call))
@@ -0,0 +1,173 @@
+"""
+Saves the entries of a `ResponseCache` to disk and restores them, so that short-lived processes (e.g. cron jobs)
+can start with a warm cache instead of downloading all incarnations again.
+
+    cache = ResponseCache(stale_while_revalidate=3600)
+    load_snapshot(cache, "foxops.snapshot", url)
+    client = AsyncFoxopsClient(url, token, cache=cache)
+    ...
+    save_snapshot(cache, "foxops.snapshot", url)
+
+Entries keep their expiry time. Expired entries with an ETag are kept and revalidated when they are used (in the
+background, if the cache allows serving stale entries). Expired entries without ETag are kept as long as the cache
+may serve them while they are downloaded again. Snapshots record the base URL of the server their entries came
+from, and are only loaded for the same server.
+
+File format (all integers little endian):
+
+    header: magic "FOXSNAP\\0", format version (uint16), number of entries (uint32), length of the base URL
+            (uint16), base URL (UTF-8)
+    entry:  endpoint (uint8), expiry as unix timestamp (float64), length of key, ETag and body (uint32 each),
+            key (JSON), ETag (UTF-8, empty if none), body (JSON, like the API response)
+"""
+import json
+import logging
+import os
+import struct
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Hashable
+
+from foxops_client.cache import (
+    GET_INCARNATION,
+    LIST_INCARNATIONS,
+    CacheEntry,
+    ResponseCache,
+)
+from foxops_client.serialization import JsonCodec, default_codec
+from foxops_client.types import Incarnation, IncarnationWithDetails
+
+SNAPSHOT_VERSION = 2
+
+log = logging.getLogger(__name__)
+
+_MAGIC = b"FOXSNAP\0"
+_HEADER = struct.Struct("<8sHIH")
+_ENTRY = struct.Struct("<BdIII")
+
+_ENDPOINTS = [GET_INCARNATION, LIST_INCARNATIONS]
+
+
+def save_snapshot(cache: ResponseCache, path: str | Path, base_url: str, codec: JsonCodec | None = None) -> int:
+    """
+    Writes all entries of the cache to the file (atomically replacing it). Returns the number of entries.
+
+    :param base_url: of the server that the entries of the cache came from
+    """
+
+    codec = codec or default_codec()
+    now, now_monotonic = time.time(), time.monotonic()
+
+    chunks = []
+    count = 0
+    for endpoint, key, entry in cache.entries():
+        if endpoint == LIST_INCARNATIONS:
+            body = codec.encode([x.to_dict() for x in entry.value])
+        else:
+            body = codec.encode(entry.value.to_dict())
+        key_bytes = json.dumps(key).encode()
+        etag_bytes = (entry.etag or "").encode()
+        expires_at = now + entry.expires_at - now_monotonic
+
+        chunks += [
+            _ENTRY.pack(_ENDPOINTS.index(endpoint), expires_at, len(key_bytes), len(etag_bytes), len(body)),
+            key_bytes,
+            etag_bytes,
+            body,
+        ]
+        count += 1
+
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            base_url_bytes = _normalize(base_url).encode()
+            f.write(_HEADER.pack(_MAGIC, SNAPSHOT_VERSION, count, len(base_url_bytes)))
+            f.write(base_url_bytes)
+            f.writelines(chunks)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+    return count
+
+
+def load_snapshot(cache: ResponseCache, path: str | Path, base_url: str, codec: JsonCodec | None = None) -> int:
+    """
+    Adds the entries of the snapshot file to the cache. Returns the number of restored entries.
+
+    Missing, outdated or corrupt snapshots are ignored, as are snapshots of other servers and anything that can't be
+    used anymore (entries without ETag that expired more than `stale_while_revalidate` seconds ago).
+
+    :param base_url: of the server that the cache is used with
+    """
+
+    codec = codec or default_codec()
+    try:
+        data = Path(path).read_bytes()
+    except FileNotFoundError:
+        return 0
+
+    try:
+        entries = _parse(data, codec, cache.stale_while_revalidate, _normalize(base_url))
+    except (ValueError, KeyError, IndexError, TypeError, struct.error) as e:
+        log.warning(f"ignoring snapshot {path}: {e!r}")
+        return 0
+
+    for endpoint, key, entry in entries:
+        cache.restore(endpoint, key, entry)
+    return len(entries)
+
+
+def _parse(
+    data: bytes, codec: JsonCodec, stale_while_revalidate: float, base_url: str
+) -> list[tuple[str, Hashable, CacheEntry]]:
+    magic, version, count, base_url_length = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("not a snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"unsupported snapshot version {version}")
+
+    offset = _HEADER.size + base_url_length
+    snapshot_base_url = data[_HEADER.size : offset].decode()
+    if snapshot_base_url != base_url:
+        raise ValueError(f"snapshot of {snapshot_base_url}, not of {base_url}")
+
+    now, now_monotonic = time.time(), time.monotonic()
+    view = memoryview(data)
+
+    entries = []
+    for _ in range(count):
+        endpoint_index, expires_at, key_length, etag_length, body_length = _ENTRY.unpack_from(data, offset)
+        offset += _ENTRY.size
+        key = json.loads(bytes(view[offset : offset + key_length]))
+        offset += key_length
+        etag = bytes(view[offset : offset + etag_length]).decode() or None
+        offset += etag_length
+        body = bytes(view[offset : offset + body_length])
+        offset += body_length
+        if offset > len(data):
+            raise ValueError("truncated snapshot")
+
+        if etag is None and expires_at + stale_while_revalidate <= now:
+            continue
+
+        endpoint = _ENDPOINTS[endpoint_index]
+        value: Any
+        if endpoint == LIST_INCARNATIONS:
+            # list keys are tuples of (parameter, value) pairs
+            key = tuple(tuple(x) for x in key)
+            value = codec.decode_list(body, Incarnation)
+        else:
+            value = codec.decode_object(body, IncarnationWithDetails)
+
+        entries.append((endpoint, key, CacheEntry(value, etag, now_monotonic + expires_at - now)))
+
+    return entries
+
+
+def _normalize(base_url: str) -> str:
+    # like `AsyncFoxopsClient` does
+    return base_url.rstrip("/")
@@ -0,0 +1,78 @@
+import codecs
+import json
+from typing import Any, AsyncIterable, AsyncIterator
+
+_WHITESPACE = " \t\n\r"
+
+
+async def iter_json_array(chunks: AsyncIterable[bytes]) -> AsyncIterator[Any]:
+    """
+    Incrementally parses a JSON array from a stream of (UTF-8 encoded) chunks and yields its items one by one.
+
+    Only the current item (and the remainder of the current chunk) is kept in memory, independent of the size
+    of the whole array.
+    """
+
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+
+    buffer = ""
+    started = False
+    finished = False
+
+    async def parse(eof: bool) -> AsyncIterator[Any]:
+        nonlocal buffer, started, finished
+
+        pos = 0
+        while not finished:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos == len(buffer):
+                break
+
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError(f"expected a JSON array, got: {buffer[pos:pos + 20]!r}")
+                started = True
+                pos += 1
+                continue
+
+            if buffer[pos] == "]":
+                finished = True
+                pos += 1
+                break
+
+            if buffer[pos] == ",":
+                pos += 1
+                continue
+
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # the item is not complete yet, wait for more data
+                break
+
+            if end == len(buffer) and not eof:
+                # a number at the end of the buffer might still continue in the next chunk
+                break
+
+            pos = end
+            yield item
+
+        buffer = buffer[pos:]
+
+    async for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        async for item in parse(eof=False):
+            yield item
+
+    buffer += text_decoder.decode(b"", final=True)
+    async for item in parse(eof=True):
+        yield item
+
+    if not finished:
+        raise ValueError("incomplete JSON array")
+    if buffer.strip(_WHITESPACE):
+        raise ValueError(f"unexpected data after JSON array: {buffer[:20]!r}")
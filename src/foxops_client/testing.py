@@ -0,0 +1,262 @@
+"""
+In-process stand-in for the FoxOps API, for testing and benchmarking code that uses the FoxOps client
+without running FoxOps (and Gitlab).
+
+    server = FakeFoxopsServer()
+    server.add_incarnation(incarnation_repository="group/project", template_repository="group/template")
+
+    client = AsyncFoxopsClient("http://foxops", server.token, transport=server.transport())
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+from collections import Counter
+from typing import Any, Callable
+
+import httpx
+
+_INCARNATIONS_PATH = re.compile(r"/api/incarnations(?:/(?P<id>\d+))?$")
+
+
+class FakeFoxopsServer:
+    """
+    Implements the endpoints of the FoxOps API that are used by the client, backed by an in-memory dictionary.
+
+    :param token: the only token that is accepted
+    :param latency: delay before every response in seconds. Can be a callable, e.g. to simulate a latency distribution
+    :param error_rate: fraction of requests that fail with `503 Service Unavailable`
+    :param template_data_size: number of bytes of filler data added to the `template_data_full` of every incarnation
+    :param etags: whether to send ETags and answer conditional requests with `304 Not Modified` (off by default)
+    """
+
+    def __init__(
+        self,
+        token: str = "dummy",
+        latency: float | Callable[[], float] = 0.0,
+        error_rate: float = 0.0,
+        template_data_size: int = 0,
+        etags: bool = False,
+        seed: int | None = None,
+    ):
+        self.token = token
+        self.latency = latency
+        self.error_rate = error_rate
+        self.template_data_size = template_data_size
+        self.etags = etags
+
+        self.incarnations: dict[int, dict[str, Any]] = {}
+        self.requests: Counter[tuple[str, str]] = Counter()
+
+        self._next_id = 1
+        self._random = random.Random(seed)
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def add_incarnation(
+        self,
+        incarnation_repository: str | None = None,
+        target_directory: str = ".",
+        template_repository: str = "group/template",
+        template_repository_version: str = "v1.0.0",
+        template_data: dict[str, Any] | None = None,
+        automerge: bool = True,
+    ) -> dict[str, Any]:
+        """Adds an incarnation and returns its API representation."""
+
+        incarnation_id = self._next_id
+        self._next_id += 1
+
+        if incarnation_repository is None:
+            incarnation_repository = f"group/incarnation-{incarnation_id}"
+
+        self.incarnations[incarnation_id] = {
+            "id": incarnation_id,
+            "incarnation_repository": incarnation_repository,
+            "target_directory": target_directory,
+            "commit_sha": "",
+            "commit_url": "",
+            "merge_request_id": None,
+            "merge_request_url": None,
+            "merge_request_status": None,
+            "template_repository": template_repository,
+            "template_repository_version": template_repository_version,
+            "template_repository_version_hash": "",
+            "template_data": template_data or {},
+            "template_data_full": {},
+        }
+        self._commit(incarnation_id, automerge)
+
+        return self.incarnations[incarnation_id]
+
+    def add_incarnations(self, count: int, **kwargs: Any) -> list[dict[str, Any]]:
+        return [self.add_incarnation(**kwargs) for _ in range(count)]
+
+    def merge(self, incarnation_id: int, status: str = "merged") -> None:
+        """Changes the status of the open merge request of the incarnation (to `merged` or `closed`)."""
+
+        self.incarnations[incarnation_id]["merge_request_status"] = status
+
+    def _commit(self, incarnation_id: int, automerge: bool) -> None:
+        incarnation = self.incarnations[incarnation_id]
+
+        commit_sha = hashlib.sha1(
+            json.dumps([incarnation["template_repository_version"], incarnation["template_data"]]).encode()
+            + str(self._random.random()).encode()
+        ).hexdigest()
+
+        url = f"https://gitlab.example.com/{incarnation['incarnation_repository']}"
+        incarnation["commit_sha"] = commit_sha
+        incarnation["commit_url"] = f"{url}/-/commit/{commit_sha}"
+        incarnation["template_repository_version_hash"] = hashlib.sha1(
+            incarnation["template_repository_version"].encode()
+        ).hexdigest()
+        incarnation["template_data_full"] = {**incarnation["template_data"]}
+        if self.template_data_size:
+            incarnation["template_data_full"]["filler"] = "x" * self.template_data_size
+
+        if automerge:
+            incarnation["merge_request_id"] = None
+            incarnation["merge_request_url"] = None
+            incarnation["merge_request_status"] = None
+        else:
+            merge_request_id = str(self._random.randint(1, 1_000_000))
+            incarnation["merge_request_id"] = merge_request_id
+            incarnation["merge_request_url"] = f"{url}/-/merge_requests/{merge_request_id}"
+            incarnation["merge_request_status"] = "open"
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+        if request.headers.get("Authorization") != f"Bearer {self.token}":
+            return httpx.Response(httpx.codes.UNAUTHORIZED, json={"message": "invalid token"})
+
+        if self.error_rate and self._random.random() < self.error_rate:
+            return httpx.Response(httpx.codes.SERVICE_UNAVAILABLE, json={"message": "service unavailable"})
+
+        path = request.url.path
+        if path.endswith("/auth/test"):
+            self.requests[(request.method, "/auth/test")] += 1
+            return httpx.Response(httpx.codes.OK, text="OK")
+
+        match = _INCARNATIONS_PATH.search(path)
+        if match is None:
+            return httpx.Response(httpx.codes.NOT_FOUND, json={"message": "not found"})
+
+        if match["id"] is None:
+            self.requests[(request.method, "/api/incarnations")] += 1
+            match request.method:
+                case "GET":
+                    return self._list(request)
+                case "POST":
+                    return self._create(request)
+        else:
+            self.requests[(request.method, "/api/incarnations/{id}")] += 1
+            incarnation_id = int(match["id"])
+            if incarnation_id not in self.incarnations:
+                return httpx.Response(
+                    httpx.codes.NOT_FOUND, json={"message": f"Incarnation with id '{incarnation_id}' not found."}
+                )
+
+            match request.method:
+                case "GET":
+                    return self._get(request, incarnation_id)
+                case "DELETE":
+                    del self.incarnations[incarnation_id]
+                    return httpx.Response(httpx.codes.NO_CONTENT)
+                case "PATCH":
+                    return self._patch(request, incarnation_id)
+                case "PUT":
+                    return self._put(request, incarnation_id)
+
+        return httpx.Response(httpx.codes.METHOD_NOT_ALLOWED, json={"message": "method not allowed"})
+
+    def _list(self, request: httpx.Request) -> httpx.Response:
+        incarnation_repository = request.url.params.get("incarnation_repository")
+        target_directory = request.url.params.get("target_directory")
+
+        incarnations = [
+            {k: x[k] for k in _INCARNATION_FIELDS}
+            for x in self.incarnations.values()
+            if (incarnation_repository is None or x["incarnation_repository"] == incarnation_repository)
+            and (target_directory is None or x["target_directory"] == target_directory)
+        ]
+        if not incarnations and (incarnation_repository is not None or target_directory is not None):
+            return httpx.Response(httpx.codes.NOT_FOUND, json={"message": "No incarnations found."})
+
+        return self._json_response(request, incarnations)
+
+    def _get(self, request: httpx.Request, incarnation_id: int) -> httpx.Response:
+        return self._json_response(request, self.incarnations[incarnation_id])
+
+    def _create(self, request: httpx.Request) -> httpx.Response:
+        data = json.loads(request.content)
+
+        incarnation_repository = data["incarnation_repository"]
+        target_directory = data.get("target_directory", ".")
+        for x in self.incarnations.values():
+            if x["incarnation_repository"] == incarnation_repository and x["target_directory"] == target_directory:
+                return httpx.Response(
+                    httpx.codes.CONFLICT,
+                    json={"message": f"{incarnation_repository} ({target_directory}) is already a foxops incarnation"},
+                )
+
+        incarnation = self.add_incarnation(
+            incarnation_repository=incarnation_repository,
+            target_directory=target_directory,
+            template_repository=data["template_repository"],
+            template_repository_version=data["template_repository_version"],
+            template_data=data["template_data"],
+            automerge=data.get("automerge", True),
+        )
+        return httpx.Response(httpx.codes.CREATED, json=incarnation)
+
+    def _patch(self, request: httpx.Request, incarnation_id: int) -> httpx.Response:
+        data = json.loads(request.content)
+        incarnation = self.incarnations[incarnation_id]
+
+        if "requested_version" in data:
+            incarnation["template_repository_version"] = data["requested_version"]
+        if "requested_data" in data:
+            incarnation["template_data"] = {**incarnation["template_data"], **data["requested_data"]}
+
+        self._commit(incarnation_id, data["automerge"])
+        return httpx.Response(httpx.codes.OK, json=incarnation)
+
+    def _put(self, request: httpx.Request, incarnation_id: int) -> httpx.Response:
+        data = json.loads(request.content)
+        incarnation = self.incarnations[incarnation_id]
+
+        incarnation["template_repository_version"] = data["template_repository_version"]
+        incarnation["template_data"] = data["template_data"]
+
+        self._commit(incarnation_id, data["automerge"])
+        return httpx.Response(httpx.codes.OK, json=incarnation)
+
+    def _json_response(self, request: httpx.Request, data: Any) -> httpx.Response:
+        content = json.dumps(data).encode()
+        if not self.etags:
+            return httpx.Response(httpx.codes.OK, content=content, headers={"Content-Type": "application/json"})
+
+        etag = f'"{hashlib.sha1(content).hexdigest()}"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(httpx.codes.NOT_MODIFIED, headers={"ETag": etag})
+
+        return httpx.Response(
+            httpx.codes.OK, content=content, headers={"Content-Type": "application/json", "ETag": etag}
+        )
+
+
+_INCARNATION_FIELDS = (
+    "id",
+    "incarnation_repository",
+    "target_directory",
+    "commit_sha",
+    "commit_url",
+    "merge_request_id",
+    "merge_request_url",
+)
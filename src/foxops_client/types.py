@@ -1,10 +1,64 @@
-from dataclasses import asdict, dataclass
+import copy
+import sys
+from collections import namedtuple
+from dataclasses import dataclass, fields
 from enum import Enum
-from typing import Any, Self
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Mapping, Self
 
 TemplateData = dict[str, Any]
 
 
+class LazyTemplateData(Mapping[str, Any]):
+    """
+    Template data that is kept as raw JSON and only decoded when it's accessed for the first time.
+
+    Behaves like a read-only dictionary (and compares equal to one with the same content).
+    """
+
+    __slots__ = ("_raw", "_decode", "_data")
+
+    def __init__(self, raw: bytes, decode: Callable[[bytes], dict[str, Any]]):
+        self._raw: bytes | None = raw
+        self._decode: Callable[[bytes], dict[str, Any]] | None = decode
+        self._data: dict[str, Any] | None = None
+
+    @property
+    def raw(self) -> bytes | None:
+        """The raw JSON, None once it was decoded."""
+
+        return self._raw
+
+    @property
+    def data(self) -> dict[str, Any]:
+        if self._data is None:
+            assert self._raw is not None and self._decode is not None
+            self._data = self._decode(self._raw)
+            # the raw JSON is not needed anymore
+            self._raw = self._decode = None
+        return self._data
+
+    def __getitem__(self, key: str) -> Any:
+        return self.data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __repr__(self) -> str:
+        if self._data is None:
+            return f"LazyTemplateData({self._raw!r})"
+        return repr(self._data)
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> "LazyTemplateData":
+        # the raw JSON is immutable and can be shared, so copies of undecoded template data stay lazy
+        copied = LazyTemplateData.__new__(LazyTemplateData)
+        copied._raw, copied._decode = self._raw, self._decode
+        copied._data = copy.deepcopy(self._data, memo)
+        return copied
+
+
 class MergeRequestStatus(Enum):
     OPEN = "open"
     MERGED = "merged"
@@ -12,7 +66,15 @@ class MergeRequestStatus(Enum):
     UNKNOWN = "unknown"
 
 
-@dataclass(frozen=True)
+def _intern(value: str | None) -> str | None:
+    # repository names, directories and versions are shared by many incarnations. Interning them saves memory
+    # when holding many incarnations and speeds up comparisons.
+    if value is None:
+        return None
+    return sys.intern(value)
+
+
+@dataclass(frozen=True, slots=True)
 class Incarnation:
     id: int
     incarnation_repository: str
@@ -28,24 +90,30 @@ class Incarnation:
     def from_dict(cls, data: dict[str, Any]) -> Self:
         return cls(
             id=data["id"],
-            incarnation_repository=data["incarnation_repository"],
-            target_directory=data["target_directory"],
+            incarnation_repository=sys.intern(data["incarnation_repository"]),
+            target_directory=sys.intern(data["target_directory"]),
             commit_sha=data["commit_sha"],
             commit_url=data["commit_url"],
             merge_request_id=data["merge_request_id"],
             merge_request_url=data["merge_request_url"],
         )
 
+    def to_dict(self) -> dict[str, Any]:
+        """Returns the API representation of the incarnation."""
+
+        return {f.name: getattr(self, f.name) for f in fields(self)}
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class IncarnationWithDetails(Incarnation):
     merge_request_status: MergeRequestStatus | None
 
     template_repository: str | None
     template_repository_version: str | None
     template_repository_version_hash: str | None
-    template_data: TemplateData | None
-    template_data_full: TemplateData | None
+    # dictionaries, or `LazyTemplateData` if the codec decodes them lazily
+    template_data: Mapping[str, Any] | None
+    template_data_full: Mapping[str, Any] | None
 
     @classmethod
     def from_dict(cls, data: dict[str, Any]) -> Self:
@@ -54,11 +122,89 @@ class IncarnationWithDetails(Incarnation):
             merge_request_status = MergeRequestStatus(data["merge_request_status"])
 
         return cls(
+            id=data["id"],
+            incarnation_repository=sys.intern(data["incarnation_repository"]),
+            target_directory=sys.intern(data["target_directory"]),
+            commit_sha=data["commit_sha"],
+            commit_url=data["commit_url"],
+            merge_request_id=data["merge_request_id"],
+            merge_request_url=data["merge_request_url"],
             merge_request_status=merge_request_status,
-            template_repository=data["template_repository"],
-            template_repository_version=data["template_repository_version"],
-            template_repository_version_hash=data["template_repository_version_hash"],
+            template_repository=_intern(data["template_repository"]),
+            template_repository_version=_intern(data["template_repository_version"]),
+            template_repository_version_hash=_intern(data["template_repository_version_hash"]),
             template_data=data["template_data"],
             template_data_full=data["template_data_full"],
-            **asdict(Incarnation.from_dict(data)),
         )
+
+    def to_dict(self) -> dict[str, Any]:
+        data = Incarnation.to_dict(self)
+        if self.merge_request_status is not None:
+            data["merge_request_status"] = self.merge_request_status.value
+        return data
+
+
+class IncarnationRecord(tuple):
+    """
+    Read-only record with a subset of the fields of an incarnation, as returned when passing `fields` to
+    `list_incarnations` or `get_incarnation`.
+
+    Records are named tuples of the requested fields (in the requested order), so they are accessed like the full
+    types (`record.commit_sha`) but are much cheaper to create and hold.
+    """
+
+    __slots__ = ()
+
+    _fields: tuple[str, ...] = ()
+    # types of the fields, e.g. to decode records directly with msgspec
+    _field_types: dict[str, Any] = {}
+    # position of `merge_request_status`, which is converted to `MergeRequestStatus`. None if it wasn't requested
+    _status_index: int | None = None
+
+    @classmethod
+    def of(cls, result_type: type[Incarnation], names: Iterable[str]) -> type["IncarnationRecord"]:
+        """Returns the record type with the given fields of the result type (`Incarnation` or its subclass)."""
+
+        names = tuple(dict.fromkeys(names))
+        record = _record_types.get((result_type, names))
+        if record is None:
+            record = _record_types[(result_type, names)] = _record_type(result_type, names)
+        return record
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Self:
+        values = [data[name] for name in cls._fields]
+        if cls._status_index is not None and values[cls._status_index] is not None:
+            values[cls._status_index] = MergeRequestStatus(values[cls._status_index])
+        return tuple.__new__(cls, values)
+
+    def to_dict(self) -> dict[str, Any]:
+        return dict(zip(self._fields, self))
+
+    if TYPE_CHECKING:
+        # the fields of a record are only known at runtime
+        def __getattr__(self, name: str) -> Any:
+            ...
+
+
+_record_types: dict[tuple[type[Incarnation], tuple[str, ...]], type[IncarnationRecord]] = {}
+
+
+def _record_type(result_type: type[Incarnation], names: tuple[str, ...]) -> type[IncarnationRecord]:
+    available = [f.name for f in fields(result_type)]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"{result_type.__name__} has no fields {', '.join(unknown)}")
+    if not names:
+        raise ValueError("at least one field must be selected")
+
+    types = {f.name: f.type for f in fields(result_type)}
+    return type(
+        "IncarnationRecord",
+        (namedtuple("IncarnationRecord", names), IncarnationRecord),
+        {
+            "__slots__": (),
+            "_field_types": {name: types[name] for name in names},
+            "_status_index": names.index("merge_request_status") if "merge_request_status" in names else None,
+        },
+    )
@@ -0,0 +1,208 @@
+"""
+Waits for the merge requests of many incarnations to be merged or closed.
+
+    watcher = MergeRequestWatcher(client, requests_per_second=5)
+    for incarnation in updated:
+        watcher.watch(incarnation.id)
+
+    async for transition in watcher.transitions():
+        print(transition.incarnation_id, transition.previous, "->", transition.current)
+"""
+import asyncio
+import heapq
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+import httpx
+
+from foxops_client.client_async import AsyncFoxopsClient
+from foxops_client.exceptions import (
+    CircuitOpenError,
+    FoxopsApiError,
+    IncarnationDoesNotExistError,
+)
+from foxops_client.limits import TokenBucket
+from foxops_client.types import IncarnationWithDetails, MergeRequestStatus
+
+log = logging.getLogger(__name__)
+
+# statuses after which an incarnation is no longer watched. None means that the incarnation has no merge request
+FINAL_STATUSES = (MergeRequestStatus.MERGED, MergeRequestStatus.CLOSED, None)
+
+
+@dataclass(frozen=True)
+class MergeRequestTransition:
+    incarnation_id: int
+    previous: MergeRequestStatus | None
+    current: MergeRequestStatus | None
+    # the incarnation as of the transition, None if it was deleted
+    incarnation: IncarnationWithDetails | None
+
+    @property
+    def final(self) -> bool:
+        """Whether the incarnation is no longer watched after this transition."""
+
+        return self.incarnation is None or self.current in FINAL_STATUSES
+
+
+@dataclass
+class _Watched:
+    status: MergeRequestStatus | None
+    interval: float
+    # time of the next poll. Heap entries with a different time are outdated
+    due: float
+
+
+class MergeRequestWatcher:
+    """
+    Polls the merge request status of the watched incarnations and reports every change.
+
+    Every incarnation is polled with its own interval, which starts at `min_interval` and grows by `backoff` (up to
+    `max_interval`) with every poll that doesn't show a change. A change resets the interval, so incarnations that
+    are currently being worked on are polled more often. The intervals are randomized by +/- `jitter`, to spread the
+    polls of incarnations that were added at the same time.
+
+    All polls share a budget of `requests_per_second` and at most `concurrency` of them run at the same time. Polls
+    that are due are served in the order of their due time when the budget is exhausted.
+
+    The client should not have a `ResponseCache` with a `get_incarnation_ttl` above `min_interval`, as the watcher
+    would see cached statuses otherwise. A cache with a TTL of 0 is useful though: unchanged incarnations are then
+    revalidated with `304 Not Modified` responses.
+    """
+
+    def __init__(
+        self,
+        client: AsyncFoxopsClient,
+        requests_per_second: float = 10.0,
+        concurrency: int = 10,
+        min_interval: float = 5.0,
+        max_interval: float = 300.0,
+        backoff: float = 1.5,
+        jitter: float = 0.2,
+    ):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+
+        self.client = client
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+
+        self.polls = 0
+        self._budget = TokenBucket(requests_per_second)
+        self._watched: dict[int, _Watched] = {}
+        self._heap: list[tuple[float, int]] = []
+        self._wakeup = asyncio.Event()
+
+    def watch(self, incarnation_id: int, status: MergeRequestStatus | None = MergeRequestStatus.OPEN) -> None:
+        """
+        Starts watching the incarnation. Changes are reported relative to `status`, the last known status of its
+        merge request. The first poll happens after `min_interval`.
+        """
+
+        self._watched[incarnation_id] = _Watched(status, self.min_interval, 0.0)
+        self._schedule(incarnation_id, self._watched[incarnation_id])
+        self._wakeup.set()
+
+    def unwatch(self, incarnation_id: int) -> None:
+        self._watched.pop(incarnation_id, None)
+
+    def __len__(self) -> int:
+        return len(self._watched)
+
+    def __contains__(self, incarnation_id: int) -> bool:
+        return incarnation_id in self._watched
+
+    async def transitions(self) -> AsyncIterator[MergeRequestTransition]:
+        """
+        Yields the status changes of the watched merge requests, until no incarnation is watched anymore.
+
+        Incarnations are no longer watched after their merge request was merged or closed, or after they were deleted.
+        Incarnations can be added with `watch` while iterating.
+        """
+
+        polls: set[asyncio.Task[MergeRequestTransition | None]] = set()
+        try:
+            while self._watched or polls:
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now and len(polls) < self.concurrency:
+                    due, incarnation_id = heapq.heappop(self._heap)
+                    watched = self._watched.get(incarnation_id)
+                    if watched is not None and watched.due == due:
+                        polls.add(asyncio.create_task(self._poll(incarnation_id, watched)))
+
+                timeout = None
+                if self._heap and len(polls) < self.concurrency:
+                    timeout = max(0.0, self._heap[0][0] - now)
+
+                self._wakeup.clear()
+                wakeup = asyncio.create_task(self._wakeup.wait())
+                try:
+                    await asyncio.wait([*polls, wakeup], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    wakeup.cancel()
+
+                for task in [task for task in polls if task.done()]:
+                    polls.discard(task)
+                    transition = task.result()
+                    if transition is not None:
+                        yield transition
+        finally:
+            for task in polls:
+                task.cancel()
+
+    async def _poll(self, incarnation_id: int, watched: _Watched) -> MergeRequestTransition | None:
+        await self._budget.acquire()
+        if self._watched.get(incarnation_id) is not watched:
+            return None
+
+        self.polls += 1
+        try:
+            incarnation = await self.client.get_incarnation(incarnation_id)
+        except IncarnationDoesNotExistError:
+            if self._watched.get(incarnation_id) is not watched:
+                return None
+            return self._transition(incarnation_id, watched, None, None)
+        except (FoxopsApiError, httpx.HTTPError, CircuitOpenError) as e:
+            log.warning(f"failed to poll incarnation {incarnation_id}: {e!r}")
+            self._unchanged(incarnation_id, watched)
+            return None
+
+        if self._watched.get(incarnation_id) is not watched:
+            # unwatched (or watched again) in the meantime
+            return None
+        if incarnation.merge_request_status == watched.status:
+            self._unchanged(incarnation_id, watched)
+            return None
+        return self._transition(incarnation_id, watched, incarnation.merge_request_status, incarnation)
+
+    def _unchanged(self, incarnation_id: int, watched: _Watched) -> None:
+        watched.interval = min(self.max_interval, watched.interval * self.backoff)
+        self._schedule(incarnation_id, watched)
+
+    def _transition(
+        self,
+        incarnation_id: int,
+        watched: _Watched,
+        status: MergeRequestStatus | None,
+        incarnation: IncarnationWithDetails | None,
+    ) -> MergeRequestTransition:
+        transition = MergeRequestTransition(incarnation_id, watched.status, status, incarnation)
+
+        if transition.final:
+            del self._watched[incarnation_id]
+        else:
+            watched.status = status
+            watched.interval = self.min_interval
+            self._schedule(incarnation_id, watched)
+
+        return transition
+
+    def _schedule(self, incarnation_id: int, watched: _Watched) -> None:
+        watched.due = time.monotonic() + watched.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        heapq.heappush(self._heap, (watched.due, incarnation_id))
@@ -27,7 +27,8 @@ from infrastructure.gitlab import (
 from infrastructure.network import network
 from pytest import fixture
 
-from foxops_client import FoxopsClient
+from foxops_client import AsyncFoxopsClient, FoxopsClient
+from foxops_client.testing import FakeFoxopsServer
 
 # This variable is never used. We just declare it to mark the imported fixtures as used for linting.
 IMPORTED_FIXTURES = [
@@ -64,6 +65,21 @@ def foxops_client_invalid_token(foxops_host_url):
     return FoxopsClient(foxops_host_url, FOXOPS_STATIC_TOKEN + "invalid")
 
 
+@fixture
+def fake_foxops_server():
+    return FakeFoxopsServer(seed=0)
+
+
+@fixture
+async def fake_foxops_client(fake_foxops_server):
+    """Async client that talks to the in-process fake FoxOps server instead of a real one."""
+
+    async with AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, transport=fake_foxops_server.transport()
+    ) as client:
+        yield client
+
+
 @fixture
 def template(gitlab_api_client, locally_cloned_gitlab_project):
     """Creates a new foxops template in Gitlab and returns its Path with namespace. Delete it after the test."""
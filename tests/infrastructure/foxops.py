@@ -52,14 +52,16 @@ foxops_container = container(
 )
 
 
-@fixture(scope="session", autouse=True)
+@fixture(scope="session")
 def foxops_database_initialization(foxops_container: FoxOpsContainer):
     foxops_container.exec_run("rm /home/foxops/test.db")
     foxops_container.exec_run("alembic upgrade head")
 
 
 @fixture(scope="session")
-def foxops_host_port(foxops_container: FoxOpsContainer):
+def foxops_host_port(foxops_container: FoxOpsContainer, foxops_database_initialization):
+    # depending on the database initialization (instead of making it autouse) ensures that tests that don't need
+    # a real FoxOps server (e.g. those using the in-process fake server) don't require docker
     return foxops_container.ports[FOXOPS_LISTEN_PORT][0]
 
 
@@ -0,0 +1,153 @@
+import asyncio
+
+import httpx
+import pytest
+
+from foxops_client import AsyncFoxopsClient
+from foxops_client.cache import ResponseCache
+from foxops_client.serialization import MsgspecCodec
+from foxops_client.types import LazyTemplateData
+
+
+async def test_cache_serves_repeated_reads_and_revalidates_with_etag(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.etags = True
+    fake_foxops_server.add_incarnation()
+    cache = ResponseCache(get_incarnation_ttl=0)
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, cache=cache, transport=fake_foxops_server.transport()
+    )
+
+    # WHEN
+    first = await client.get_incarnation(1)
+    second = await client.get_incarnation(1)
+
+    # THEN
+    assert second == first
+    assert cache.stats.revalidations == 1
+
+
+async def test_cache_is_invalidated_by_writes(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, cache=ResponseCache(), transport=fake_foxops_server.transport()
+    )
+    before = await client.get_incarnation(1)
+
+    # WHEN
+    await client.patch_incarnation(1, automerge=True, requested_version="v2")
+
+    # THEN
+    after = await client.get_incarnation(1)
+    assert after.template_repository_version == "v2"
+    assert after.commit_sha != before.commit_sha
+
+
+async def test_cached_lists_are_invalidated_by_creating_an_incarnation(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    cache = ResponseCache()
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, cache=cache, transport=fake_foxops_server.transport()
+    )
+    assert len(await client.list_incarnations()) == 1
+
+    # WHEN
+    await client.create_incarnation("group/new", "group/template", "v1", {})
+
+    # THEN
+    assert len(await client.list_incarnations()) == 2
+    assert cache.stats.invalidations == 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    # GIVEN
+    cache = ResponseCache(max_entries=2)
+    cache.store("get_incarnation", 1, "first")
+    cache.store("get_incarnation", 2, "second")
+    cache.lookup("get_incarnation", 1)
+
+    # WHEN
+    cache.store("get_incarnation", 3, "third")
+
+    # THEN
+    assert cache.lookup("get_incarnation", 2) is None
+    assert cache.lookup("get_incarnation", 1).value == "first"
+    assert cache.stats.evictions == 1
+
+
+async def test_cache_hits_return_copies_of_the_template_data(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation(template_data={"name": "foo", "nested": {"list": [1]}})
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, cache=ResponseCache(), transport=fake_foxops_server.transport()
+    )
+    first = await client.get_incarnation(1)
+
+    # WHEN
+    first.template_data["name"] = "changed"
+    first.template_data["nested"]["list"].append(2)
+    second = await client.get_incarnation(1)
+    second.template_data_full.clear()
+    third = await client.get_incarnation(1)
+
+    # THEN
+    assert second.template_data == {"name": "foo", "nested": {"list": [1]}}
+    assert third.template_data_full == second.template_data
+    assert fake_foxops_server.requests[("GET", "/api/incarnations/{id}")] == 1
+
+
+async def test_reads_that_started_before_a_write_are_not_cached(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation(template_repository_version="v1")
+    waiting_reads, reads_sent, write_done = [], asyncio.Event(), asyncio.Event()
+
+    async def reads_wait_for_the_write(request: httpx.Request) -> httpx.Response:
+        response = await fake_foxops_server.handle(request)
+        if request.method == "GET" and not write_done.is_set():
+            waiting_reads.append(request)
+            if len(waiting_reads) == 2:
+                reads_sent.set()
+            await write_done.wait()
+        return response
+
+    cache = ResponseCache()
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, cache=cache, transport=httpx.MockTransport(reads_wait_for_the_write)
+    )
+    read = asyncio.create_task(client.get_incarnation(1))
+    listed = asyncio.create_task(client.list_incarnations())
+    await reads_sent.wait()
+
+    # WHEN
+    await client.patch_incarnation(1, automerge=True, requested_version="v2")
+    write_done.set()
+
+    # THEN
+    assert (await read).template_repository_version == "v1"
+    await listed
+    assert len(cache) == 0
+    assert (await client.get_incarnation(1)).template_repository_version == "v2"
+
+
+async def test_copies_of_lazy_template_data_stay_lazy(fake_foxops_server):
+    # GIVEN
+    pytest.importorskip("msgspec")
+    fake_foxops_server.add_incarnation(template_data={"name": "foo"})
+    client = AsyncFoxopsClient(
+        "http://foxops",
+        fake_foxops_server.token,
+        cache=ResponseCache(),
+        codec=MsgspecCodec(lazy_template_data=True),
+        transport=fake_foxops_server.transport(),
+    )
+    await client.get_incarnation(1)
+
+    # WHEN
+    incarnation = await client.get_incarnation(1)
+
+    # THEN
+    assert isinstance(incarnation.template_data, LazyTemplateData)
+    assert incarnation.template_data.raw is not None
+    assert incarnation.template_data == {"name": "foo"}
@@ -84,6 +84,16 @@ def test_get_incarnation_with_non_existing_incarnation(foxops_client):
         foxops_client.get_incarnation(9999999)
 
 
+def test_get_incarnations_returns_results_and_errors_in_input_order(incarnation, foxops_client):
+    # WHEN
+    response = foxops_client.get_incarnations([incarnation.id, 9999999, incarnation.id], concurrency=2)
+
+    # THEN
+    assert response[0] == incarnation
+    assert isinstance(response[1], IncarnationDoesNotExistError)
+    assert response[2] == incarnation
+
+
 def test_list_incarnation(incarnation, foxops_client):
     # GIVEN
     assert incarnation
@@ -95,6 +105,15 @@ def test_list_incarnation(incarnation, foxops_client):
     assert len(response) >= 1
 
 
+def test_iter_incarnations(incarnation, foxops_client):
+    # WHEN
+    response = list(foxops_client.iter_incarnations())
+
+    # THEN
+    assert response == foxops_client.list_incarnations()
+    assert incarnation.id in [i.id for i in response]
+
+
 def test_list_incarnation_with_non_existing_incarnation(foxops_client):
     with pytest.raises(IncarnationDoesNotExistError):
         foxops_client.list_incarnations(incarnation_repository="nonexisting", target_directory=".")
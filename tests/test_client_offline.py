@@ -0,0 +1,66 @@
+"""Tests for client features that don't need a real FoxOps server. They run against the in-process fake server."""
+import pytest
+
+from foxops_client import (
+    AsyncFoxopsClient,
+    AuthenticationError,
+    FoxopsApiError,
+    IncarnationDoesNotExistError,
+)
+
+
+async def test_get_incarnations_returns_results_and_errors_in_input_order(fake_foxops_server, fake_foxops_client):
+    # GIVEN
+    fake_foxops_server.add_incarnations(3)
+
+    # WHEN
+    response = await fake_foxops_client.get_incarnations([3, 999, 1], concurrency=2)
+
+    # THEN
+    assert response[0].id == 3
+    assert isinstance(response[1], IncarnationDoesNotExistError)
+    assert response[2].id == 1
+
+
+async def test_verify_token_raises_unauthenticated_exception_when_using_an_invalid_token(fake_foxops_server):
+    client = AsyncFoxopsClient("http://foxops", "invalid", transport=fake_foxops_server.transport())
+
+    with pytest.raises(AuthenticationError):
+        await client.verify_token()
+
+
+async def test_create_incarnation_with_conflicting_existing_incarnation(fake_foxops_server, fake_foxops_client):
+    # GIVEN
+    existing = fake_foxops_server.add_incarnation()
+
+    # WHEN
+    with pytest.raises(FoxopsApiError) as e:
+        await fake_foxops_client.create_incarnation(existing["incarnation_repository"], "group/template", "v1", {})
+
+    # THEN
+    assert e.value.message.find("is already a foxops incarnation") != -1
+
+
+async def test_iter_incarnations_yields_all_incarnations(fake_foxops_server, fake_foxops_client):
+    # GIVEN
+    fake_foxops_server.add_incarnations(100)
+
+    # WHEN
+    incarnations = [x async for x in fake_foxops_client.iter_incarnations()]
+
+    # THEN
+    assert incarnations == await fake_foxops_client.list_incarnations()
+
+
+async def test_iter_incarnations_with_non_existing_incarnation(fake_foxops_client):
+    with pytest.raises(IncarnationDoesNotExistError):
+        async for _ in fake_foxops_client.iter_incarnations(incarnation_repository="nonexisting"):
+            pass
+
+
+async def test_writes_map_error_responses_to_exceptions(fake_foxops_client):
+    with pytest.raises(IncarnationDoesNotExistError):
+        await fake_foxops_client.delete_incarnation(42)
+
+    with pytest.raises(IncarnationDoesNotExistError):
+        await fake_foxops_client.put_incarnation(42, automerge=True, template_repository_version="v1", template_data={})
@@ -0,0 +1,122 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from foxops_client import FoxopsClient
+
+
+def test_sync_client_can_be_used_from_a_running_event_loop(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+
+    async def main():
+        with FoxopsClient(
+            "http://foxops", fake_foxops_server.token, transport=fake_foxops_server.transport()
+        ) as client:
+            return client.get_incarnation(1)
+
+    # WHEN
+    incarnation = asyncio.run(main())
+
+    # THEN
+    assert incarnation.id == 1
+
+
+def test_sync_client_runs_coroutines_of_its_async_client(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnations(2)
+
+    async def both(client):
+        return await asyncio.gather(client.get_incarnation(1), client.get_incarnation(2))
+
+    # WHEN
+    with FoxopsClient("http://foxops", fake_foxops_server.token, transport=fake_foxops_server.transport()) as client:
+        incarnations = client.run(both(client.client))
+
+    # THEN
+    assert [x.id for x in incarnations] == [1, 2]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+def test_sync_client_can_be_used_in_a_forked_child(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    with FoxopsClient("http://foxops", fake_foxops_server.token, transport=fake_foxops_server.transport()) as client:
+        # starts the shared event loop in the parent
+        client.get_incarnation(1)
+
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+
+    def child():
+        with FoxopsClient(
+            "http://foxops", fake_foxops_server.token, transport=fake_foxops_server.transport()
+        ) as client:
+            results.put(client.get_incarnation(1).id)
+
+    # WHEN
+    process = context.Process(target=child)
+    process.start()
+    process.join(timeout=10)
+
+    # THEN
+    if process.is_alive():
+        process.kill()
+    assert process.exitcode == 0
+    assert results.get(timeout=1) == 1
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+def test_sync_client_created_before_fork_can_be_used_in_the_child(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    client = FoxopsClient("http://foxops", fake_foxops_server.token, transport=fake_foxops_server.transport())
+    client.get_incarnation(1)
+    inherited_connections = client.client.client
+
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+
+    def child():
+        results.put((client.get_incarnation(1).id, client.client.client is not inherited_connections))
+        client.close()
+
+    # WHEN
+    process = context.Process(target=child)
+    process.start()
+    process.join(timeout=10)
+
+    # THEN
+    if process.is_alive():
+        process.kill()
+    assert process.exitcode == 0
+    assert results.get(timeout=1) == (1, True)
+    # the parent is not affected
+    assert client.get_incarnation(1).id == 1
+    assert client.client.client is inherited_connections
+    client.close()
+
+
+def test_sync_clients_share_one_event_loop_and_can_be_used_from_many_threads(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnations(20)
+    fake_foxops_server.latency = 0.01
+    clients = [
+        FoxopsClient("http://foxops", fake_foxops_server.token, transport=fake_foxops_server.transport())
+        for _ in range(2)
+    ]
+
+    # WHEN
+    start = time.monotonic()
+    with ThreadPoolExecutor(20) as executor:
+        ids = list(executor.map(lambda i: clients[i % 2].get_incarnation(i + 1).id, range(20)))
+
+    # THEN
+    assert ids == list(range(1, 21))
+    assert clients[0].loop is clients[1].loop
+    # the calls ran concurrently
+    assert time.monotonic() - start < 0.15
@@ -0,0 +1,86 @@
+import json
+
+import httpx
+import pytest
+
+from foxops_client import AsyncFoxopsClient
+from foxops_client._diff import same_version
+from foxops_client.cache import ResponseCache
+
+
+async def test_unchanged_writes_are_skipped(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation(template_repository_version="v1", template_data={"a": 1, "b": 2})
+    sent = []
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        if request.method in ("PATCH", "PUT"):
+            sent.append(json.loads(request.content))
+        return await fake_foxops_server.handle(request)
+
+    client = AsyncFoxopsClient(
+        "http://foxops",
+        fake_foxops_server.token,
+        cache=ResponseCache(),
+        skip_unchanged_writes=True,
+        transport=httpx.MockTransport(handle),
+    )
+
+    # WHEN
+    unchanged = await client.patch_incarnation(1, True, requested_version="v1", requested_data={"a": 1})
+    await client.put_incarnation(1, True, "v1", {"a": 1, "b": 2})
+    updated = await client.patch_incarnation(1, True, requested_version="v1", requested_data={"a": 1, "b": 3})
+
+    # THEN
+    assert unchanged.template_data == {"a": 1, "b": 2}
+    assert updated.template_data == {"a": 1, "b": 3}
+    assert sent == [{"automerge": True, "requested_data": {"b": 3}}]
+    assert client.write_elision is not None
+    assert client.write_elision.stats.elided == 2
+    assert client.write_elision.stats.reduced == 1
+
+
+async def test_writes_to_a_branch_are_sent_because_it_might_have_moved(fake_foxops_server):
+    # GIVEN
+    incarnation = fake_foxops_server.add_incarnation(template_repository_version="main", template_data={"a": 1})
+    # `main` is pinned down to the commit it resolved to
+    commit = incarnation["template_repository_version_hash"]
+    sent = []
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        if request.method in ("PATCH", "PUT"):
+            sent.append((request.method, json.loads(request.content)))
+        return await fake_foxops_server.handle(request)
+
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, skip_unchanged_writes=True, transport=httpx.MockTransport(handle)
+    )
+
+    # WHEN
+    await client.patch_incarnation(1, True, requested_version="main", requested_data={"a": 1})
+    await client.put_incarnation(1, True, "main", {"a": 1})
+    await client.patch_incarnation(1, True, requested_version=commit[:8])
+
+    # THEN
+    assert sent == [
+        ("PATCH", {"automerge": True, "requested_version": "main"}),
+        ("PUT", {"automerge": True, "template_repository_version": "main", "template_data": {"a": 1}}),
+    ]
+    assert client.write_elision is not None
+    assert client.write_elision.stats.elided == 1
+
+
+@pytest.mark.parametrize(
+    "requested, current_version, expected",
+    [
+        ("v1.2.0", "v1.2.0", True),
+        ("1.2.0-rc1", "1.2.0-rc1", True),
+        ("v1.2.0", "v1.1.0", False),
+        ("main", "main", False),
+        ("release/1.x", "release/1.x", False),
+        ("0123abcd", "main", True),
+        ("0123abce", "main", False),
+    ],
+)
+def test_same_version_only_trusts_pinned_refs(requested, current_version, expected):
+    assert same_version(requested, current_version, "0123abcd" + "0" * 32) is expected
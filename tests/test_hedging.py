@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+import httpx
+
+from foxops_client import AsyncFoxopsClient
+from foxops_client.hedging import RequestHedger
+
+
+async def test_slow_reads_are_hedged(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    reads = 0
+
+    async def first_read_stalls(request: httpx.Request) -> httpx.Response:
+        nonlocal reads
+        if request.method == "GET":
+            reads += 1
+            if reads == 1:
+                await asyncio.sleep(10)
+        return await fake_foxops_server.handle(request)
+
+    hedger = RequestHedger(delay=0.01)
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, hedger=hedger, transport=httpx.MockTransport(first_read_stalls)
+    )
+
+    # WHEN
+    start = time.monotonic()
+    incarnation = await client.get_incarnation(1)
+    await client.patch_incarnation(1, automerge=True)
+
+    # THEN
+    assert incarnation.id == 1
+    assert time.monotonic() - start < 1
+    assert hedger.hedges == 1
+    assert hedger.wins == 1
+
+
+async def test_hedge_rate_is_limited(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    fake_foxops_server.latency = 0.01
+    hedger = RequestHedger(delay=0.001, max_hedge_ratio=0.0)
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, hedger=hedger, transport=fake_foxops_server.transport()
+    )
+
+    # WHEN
+    for _ in range(20):
+        await client.get_incarnation(1)
+
+    # THEN
+    # only the initial allowance of the budget
+    assert hedger.hedges == hedger.budget.max_tokens
@@ -0,0 +1,80 @@
+from foxops_client import AsyncFoxopsClient
+from foxops_client.index import IncarnationIndex, RefreshStats
+
+
+async def test_index_lookups(fake_foxops_server, fake_foxops_client):
+    # GIVEN
+    fake_foxops_server.add_incarnations(2, template_repository="group/template", template_repository_version="v1")
+    fake_foxops_server.add_incarnation(
+        incarnation_repository="group/mono", target_directory="a", template_repository="group/template"
+    )
+    fake_foxops_server.add_incarnation(
+        incarnation_repository="group/mono", target_directory="b", template_repository="group/other"
+    )
+    index = IncarnationIndex(fake_foxops_client)
+
+    # WHEN
+    await index.refresh()
+
+    # THEN
+    assert [x.id for x in index.by_template("group/template", "v1")] == [1, 2]
+    assert [x.id for x in index.by_template("group/template")] == [1, 2, 3]
+    assert [x.id for x in index.by_repository("group/mono")] == [3, 4]
+    assert [x.id for x in index.by_repository("group/mono", "b")] == [4]
+    assert index.by_commit_sha(fake_foxops_server.incarnations[2]["commit_sha"])[0].id == 2
+
+
+async def test_index_refresh_only_fetches_changed_incarnations(fake_foxops_server, fake_foxops_client):
+    # GIVEN
+    fake_foxops_server.add_incarnations(5)
+    index = IncarnationIndex(fake_foxops_client)
+    await index.refresh()
+
+    await fake_foxops_client.patch_incarnation(1, automerge=True, requested_version="v2")
+    await fake_foxops_client.delete_incarnation(2)
+    fake_foxops_server.add_incarnation()
+    gets = fake_foxops_server.requests[("GET", "/api/incarnations/{id}")]
+
+    # WHEN
+    stats = await index.refresh()
+
+    # THEN
+    assert stats == RefreshStats(added=1, updated=1, removed=1, unchanged=3)
+    assert fake_foxops_server.requests[("GET", "/api/incarnations/{id}")] == gets + 2
+    assert index.get(1).template_repository_version == "v2"
+    assert 2 not in index
+
+
+async def test_index_is_persisted_in_sqlite(fake_foxops_server, fake_foxops_client, tmp_path):
+    # GIVEN
+    fake_foxops_server.add_incarnations(3)
+    with IncarnationIndex(fake_foxops_client, path=tmp_path / "index.sqlite") as index:
+        await index.refresh()
+
+    # WHEN
+    with IncarnationIndex(fake_foxops_client, path=tmp_path / "index.sqlite") as index:
+        loaded = list(index)
+        stats = await index.refresh()
+
+    # THEN
+    assert len(loaded) == 3
+    assert stats == RefreshStats(unchanged=3)
+
+
+async def test_index_of_another_server_is_not_loaded(fake_foxops_server, fake_foxops_client, tmp_path):
+    # GIVEN
+    fake_foxops_server.add_incarnations(3)
+    with IncarnationIndex(fake_foxops_client, path=tmp_path / "index.sqlite") as index:
+        await index.refresh()
+    other = AsyncFoxopsClient("http://other", fake_foxops_server.token, transport=fake_foxops_server.transport())
+
+    # WHEN
+    with IncarnationIndex(other, path=tmp_path / "index.sqlite") as index:
+        loaded = list(index)
+        stats = await index.refresh()
+
+    # THEN
+    assert loaded == []
+    assert stats == RefreshStats(added=3)
+    with IncarnationIndex(fake_foxops_client, path=tmp_path / "index.sqlite") as index:
+        assert len(index) == 0
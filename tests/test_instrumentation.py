@@ -0,0 +1,118 @@
+import asyncio
+
+import httpx
+import pytest
+
+from foxops_client import AsyncFoxopsClient, IncarnationDoesNotExistError
+from foxops_client.instrumentation import MetricsCollector, Observer
+from foxops_client.limits import RateLimiter
+
+
+async def test_observers_are_notified_about_every_api_call(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    metrics = MetricsCollector()
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, observers=[metrics], transport=fake_foxops_server.transport()
+    )
+
+    # WHEN
+    await client.get_incarnation(1)
+    with pytest.raises(IncarnationDoesNotExistError):
+        await client.get_incarnation(2)
+
+    # THEN
+    assert metrics.requests[("GET", "/api/incarnations/{id}", "200")] == 1
+    assert metrics.requests[("GET", "/api/incarnations/{id}", "404")] == 1
+    assert metrics.latency[("GET", "/api/incarnations/{id}")].count == 2
+    assert 'foxops_client_requests_total{method="GET",endpoint="/api/incarnations/{id}",status="404"} 1' in (
+        metrics.render_prometheus()
+    )
+
+
+class RecordingObserver(Observer):
+    def __init__(self):
+        self.events = []
+
+    def request_finished(self, event):
+        self.events.append(event)
+
+
+async def test_waiting_for_the_limits_is_reported_as_queue_wait(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    observer = RecordingObserver()
+    client = AsyncFoxopsClient(
+        "http://foxops",
+        fake_foxops_server.token,
+        rate_limiter=RateLimiter(writes_per_second=20, burst=1),
+        observers=[observer],
+        transport=fake_foxops_server.transport(),
+    )
+
+    # WHEN
+    await asyncio.gather(*[client.patch_incarnation(1, automerge=True) for _ in range(3)])
+
+    # THEN
+    assert sum(e.queue_wait for e in observer.events) >= 0.1
+    # the requests themselves are fast
+    assert all(e.duration - e.queue_wait < 0.02 for e in observer.events)
+
+
+class ChunkedStream(httpx.AsyncByteStream):
+    def __init__(self, content: bytes):
+        self.content = content
+
+    async def __aiter__(self):
+        for i in range(0, len(self.content), 100):
+            yield self.content[i : i + 100]
+
+
+def streaming(fake_foxops_server, bodies):
+    """Returns a transport that streams the responses of the fake server in chunks, and records their bodies."""
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        resp = await fake_foxops_server.handle(request)
+        bodies.append(resp.content)
+        return httpx.Response(resp.status_code, headers=resp.headers, stream=ChunkedStream(resp.content))
+
+    return httpx.MockTransport(handle)
+
+
+async def test_streamed_calls_are_reported_once_the_body_was_received(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnations(50)
+    metrics, bodies = MetricsCollector(), []
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, observers=[metrics], transport=streaming(fake_foxops_server, bodies)
+    )
+
+    # WHEN
+    incarnations = client.iter_incarnations()
+    await anext(incarnations)
+    reported_while_streaming = metrics.latency[("GET", "/api/incarnations")].count
+    remaining = [x async for x in incarnations]
+
+    # THEN
+    assert reported_while_streaming == 0
+    assert len(remaining) == 49
+    assert metrics.latency[("GET", "/api/incarnations")].count == 1
+    assert metrics.bytes_received[("GET", "/api/incarnations")] == len(bodies[0])
+
+
+async def test_streamed_calls_are_reported_when_they_are_aborted(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnations(50)
+    observer, bodies = RecordingObserver(), []
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, observers=[observer], transport=streaming(fake_foxops_server, bodies)
+    )
+
+    # WHEN
+    incarnations = client.iter_incarnations()
+    await anext(incarnations)
+    await incarnations.aclose()
+
+    # THEN
+    assert len(observer.events) == 1
+    assert 0 < observer.events[0].bytes_received < len(bodies[0])
@@ -0,0 +1,46 @@
+import httpx
+
+from foxops_client import AsyncFoxopsClient, FoxopsClient
+
+
+async def test_async_context_manager_closes_the_connections(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+
+    # WHEN
+    async with AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, transport=fake_foxops_server.transport()
+    ) as client:
+        await client.get_incarnation(1)
+
+    # THEN
+    assert client.client.is_closed
+
+
+async def test_injected_clients_are_shared_and_left_open(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    http_client = httpx.AsyncClient(transport=fake_foxops_server.transport())
+
+    # WHEN
+    async with AsyncFoxopsClient("http://foxops", fake_foxops_server.token, client=http_client) as first:
+        await first.get_incarnation(1)
+    async with AsyncFoxopsClient("http://foxops/", fake_foxops_server.token, client=http_client) as second:
+        incarnation = await second.get_incarnation(1)
+
+    # THEN
+    assert incarnation.id == 1
+    assert not http_client.is_closed
+    await http_client.aclose()
+
+
+def test_sync_client_closes_the_connections(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+
+    # WHEN
+    with FoxopsClient("http://foxops", fake_foxops_server.token, transport=fake_foxops_server.transport()) as client:
+        client.get_incarnation(1)
+
+    # THEN
+    assert client.client.client.is_closed
@@ -0,0 +1,159 @@
+import asyncio
+import pickle
+import time
+
+import httpx
+import pytest
+
+from foxops_client import AsyncFoxopsClient, CircuitOpenError
+from foxops_client.dispatch import GET_INCARNATION, PATCH_INCARNATION, Call
+from foxops_client.instrumentation import MetricsCollector
+from foxops_client.limits import (
+    READ,
+    WRITE,
+    AdaptiveConcurrencyLimiter,
+    CircuitBreaker,
+    CircuitState,
+    RateLimiter,
+)
+
+
+async def test_rate_limiter_spaces_out_writes(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    client = AsyncFoxopsClient(
+        "http://foxops",
+        fake_foxops_server.token,
+        rate_limiter=RateLimiter(writes_per_second=50, burst=1),
+        transport=fake_foxops_server.transport(),
+    )
+
+    # WHEN
+    start = time.monotonic()
+    for _ in range(6):
+        await client.patch_incarnation(1, automerge=True)
+    await client.get_incarnation(1)
+
+    # THEN
+    assert time.monotonic() - start >= 0.1
+
+
+async def test_adaptive_concurrency_limit_backs_off_when_the_server_is_overloaded():
+    # GIVEN
+    metrics = MetricsCollector()
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8)
+    limiter.observe([metrics])
+
+    async def overloaded(call, request):
+        return httpx.Response(httpx.codes.SERVICE_UNAVAILABLE)
+
+    # WHEN
+    await limiter(Call(PATCH_INCARNATION, 1), httpx.Request("PATCH", "http://foxops/api/incarnations/1"), overloaded)
+
+    # THEN
+    assert limiter.limit(WRITE) == 4
+    assert limiter.limit(READ) == 8
+    assert metrics.gauges[("concurrency_limit", (("class", "write"),))] == 4
+
+
+async def test_adaptive_concurrency_limit_grows_while_it_is_used(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    fake_foxops_server.latency = 0.001
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, latency_tolerance=None)
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, concurrency_limiter=limiter, transport=fake_foxops_server.transport()
+    )
+
+    # WHEN
+    await asyncio.gather(*[client.get_incarnation(1) for _ in range(50)])
+
+    # THEN
+    assert limiter.limit(READ) > 2
+    assert limiter.in_flight(READ) == 0
+
+
+async def test_adaptive_concurrency_limit_compares_latencies_per_endpoint(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnations(3)
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2)
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        # listing is much slower than getting a single incarnation, even though the server isn't overloaded
+        await asyncio.sleep(0.02 if request.url.path == "/api/incarnations" else 0.001)
+        return await fake_foxops_server.handle(request)
+
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, concurrency_limiter=limiter, transport=httpx.MockTransport(handle)
+    )
+
+    # WHEN
+    for _ in range(15):
+        await client.get_incarnation(1)
+        await client.list_incarnations()
+
+    # THEN
+    assert limiter.limit(READ) >= 2
+
+
+async def test_circuit_breaker_opens_on_errors_and_closes_after_a_successful_probe():
+    # GIVEN
+    breaker = CircuitBreaker(window_size=4, minimum_calls=4, open_duration=0.05)
+    call = Call(GET_INCARNATION, 1)
+    request = httpx.Request("GET", "http://foxops/api/incarnations/1")
+
+    async def respond(status):
+        async def send(call, request):
+            return httpx.Response(status)
+
+        return await breaker(call, request, send)
+
+    # WHEN
+    for status in (200, 503, 502, 500):
+        await respond(status)
+
+    # THEN
+    assert breaker.state(READ) == CircuitState.OPEN
+    assert breaker.state(WRITE) == CircuitState.CLOSED
+    with pytest.raises(CircuitOpenError) as e:
+        await respond(200)
+    assert 0 < e.value.retry_after <= 0.05
+
+    await asyncio.sleep(0.05)
+    assert breaker.state(READ) == CircuitState.HALF_OPEN
+    await respond(200)
+    assert breaker.state(READ) == CircuitState.CLOSED
+
+
+def test_circuit_open_error_can_be_pickled():
+    # WHEN
+    error = pickle.loads(pickle.dumps(CircuitOpenError("read", 1.0)))
+
+    # THEN
+    assert (error.endpoint_class, error.retry_after) == ("read", 1.0)
+    assert str(error) == "circuit breaker for read requests is open"
+
+
+async def test_open_circuit_fails_calls_without_sending_requests(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    metrics = MetricsCollector()
+    breaker = CircuitBreaker(failure_rate_threshold=0.5, window_size=2, minimum_calls=2, slow_call_duration=0.01)
+    client = AsyncFoxopsClient(
+        "http://foxops",
+        fake_foxops_server.token,
+        circuit_breaker=breaker,
+        observers=[metrics],
+        transport=fake_foxops_server.transport(),
+    )
+    fake_foxops_server.latency = 0.02
+
+    # WHEN
+    await client.get_incarnation(1)
+    await client.get_incarnation(1)
+    with pytest.raises(CircuitOpenError):
+        await client.get_incarnation(1)
+
+    # THEN
+    assert fake_foxops_server.requests[("GET", "/api/incarnations/{id}")] == 2
+    assert metrics.gauges[("circuit_state", (("class", "read"),))] == 2
@@ -0,0 +1,39 @@
+import pytest
+
+from foxops_client import AsyncFoxopsClient
+from foxops_client.cache import ResponseCache
+from foxops_client.serialization import JsonCodec, fastest_codec
+from foxops_client.types import MergeRequestStatus
+
+
+@pytest.mark.parametrize("codec", [JsonCodec(), fastest_codec()], ids=lambda c: c.name)
+async def test_fields_decodes_only_the_requested_fields(fake_foxops_server, codec):
+    # GIVEN
+    fake_foxops_server.add_incarnations(3)
+    fake_foxops_server.merge(2, status="open")
+    cache = ResponseCache()
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, codec=codec, cache=cache, transport=fake_foxops_server.transport()
+    )
+
+    # WHEN
+    records = await client.list_incarnations(fields=["id", "commit_sha"])
+    record = await client.get_incarnation(2, fields=["merge_request_status", "template_data"])
+
+    # THEN
+    assert [(r.id, r.commit_sha) for r in records] == [
+        (i, fake_foxops_server.incarnations[i]["commit_sha"]) for i in (1, 2, 3)
+    ]
+    assert records[0] == (1, fake_foxops_server.incarnations[1]["commit_sha"])
+    assert record.merge_request_status == MergeRequestStatus.OPEN
+    assert record.to_dict()["template_data"] == fake_foxops_server.incarnations[2]["template_data"]
+
+    # projections don't end up in the cache
+    assert len(cache) == 0
+    assert (await client.get_incarnation(2)).id == 2
+
+
+async def test_fields_must_exist(fake_foxops_client):
+    with pytest.raises(ValueError):
+        # details are only returned by get_incarnation
+        await fake_foxops_client.list_incarnations(fields=["id", "template_data"])
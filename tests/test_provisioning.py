@@ -0,0 +1,110 @@
+import json
+
+import httpx
+
+from foxops_client import AsyncFoxopsClient, FoxopsClient
+from foxops_client.limits import CircuitBreaker
+from foxops_client.provisioning import (
+    ProvisioningEntry,
+    ProvisioningStatus,
+    load_manifest,
+    provision,
+    provision_sync,
+)
+
+
+async def test_provision_creates_missing_incarnations_and_resolves_existing_ones(
+    fake_foxops_server, fake_foxops_client
+):
+    # GIVEN
+    existing = fake_foxops_server.add_incarnation("group/existing", template_repository_version="v0")
+    fake_foxops_server.add_incarnation("group/other", template_repository="group/other-template")
+    entries = [
+        ProvisioningEntry("group/new", "group/template", "v1", {"name": "new"}),
+        ProvisioningEntry("group/existing", "group/template", "v1"),
+        ProvisioningEntry("group/other", "group/template", "v1"),
+        ProvisioningEntry("group/new", "group/template", "v1", target_directory="subdir"),
+    ]
+
+    # WHEN
+    report = await provision(fake_foxops_client, entries, concurrency=2)
+
+    # THEN
+    assert [r.status for r in report.results] == [
+        ProvisioningStatus.CREATED,
+        ProvisioningStatus.EXISTS,
+        ProvisioningStatus.FAILED,
+        ProvisioningStatus.CREATED,
+    ]
+    assert report.results[1].incarnation_id == existing["id"]
+    assert report.results[1].template_repository_version == "v0"
+    assert report.failed[0].error == "already an incarnation of group/other-template"
+    assert fake_foxops_server.requests[("POST", "/api/incarnations")] == 2
+
+
+async def test_provision_resolves_incarnations_that_were_created_concurrently(fake_foxops_server):
+    # GIVEN
+    async def handle(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            # someone else creates the incarnation right before us
+            fake_foxops_server.add_incarnation(json.loads(request.content)["incarnation_repository"])
+        return await fake_foxops_server.handle(request)
+
+    client = AsyncFoxopsClient("http://foxops", fake_foxops_server.token, transport=httpx.MockTransport(handle))
+
+    # WHEN
+    report = await provision(client, [ProvisioningEntry("group/raced", "group/template", "v1")])
+
+    # THEN
+    assert report.results[0].status == ProvisioningStatus.EXISTS
+    assert report.results[0].incarnation_id == 1
+
+
+def test_provision_sync_from_manifest(fake_foxops_server, tmp_path):
+    # GIVEN
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(
+        json.dumps(
+            [
+                {
+                    "incarnation_repository": f"group/repo-{i}",
+                    "template_repository": "group/template",
+                    "template_repository_version": "v1",
+                }
+                for i in range(20)
+            ]
+        )
+    )
+    client = FoxopsClient("http://foxops", fake_foxops_server.token, transport=fake_foxops_server.transport())
+
+    # WHEN
+    first = provision_sync(client, load_manifest(manifest))
+    second = provision_sync(client, load_manifest(manifest))
+
+    # THEN
+    assert first.counts()[ProvisioningStatus.CREATED] == 20
+    assert second.counts()[ProvisioningStatus.EXISTS] == 20
+    assert len(fake_foxops_server.incarnations) == 20
+
+
+async def test_provision_reports_entries_rejected_by_an_open_circuit_as_failed(fake_foxops_server):
+    # GIVEN
+    async def handle(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            return httpx.Response(httpx.codes.INTERNAL_SERVER_ERROR)
+        return await fake_foxops_server.handle(request)
+
+    client = AsyncFoxopsClient(
+        "http://foxops",
+        fake_foxops_server.token,
+        circuit_breaker=CircuitBreaker(window_size=2, minimum_calls=2, open_duration=60),
+        transport=httpx.MockTransport(handle),
+    )
+
+    # WHEN
+    entries = [ProvisioningEntry(f"group/repo-{i}", "group/template", "v1") for i in range(4)]
+    report = await provision(client, entries, concurrency=1)
+
+    # THEN
+    assert len(report.failed) == 4
+    assert [r.error for r in report.failed[2:]] == ["CircuitOpenError: circuit breaker for write requests is open"] * 2
@@ -0,0 +1,103 @@
+from foxops_client import FoxopsClient
+from foxops_client.provisioning import ProvisioningEntry
+from foxops_client.reconcile import Action, apply, apply_sync, plan, plan_sync
+
+
+def entry(repository, version="v1", **template_data):
+    return ProvisioningEntry(repository, "group/template", version, template_data)
+
+
+async def test_plan_only_contains_the_necessary_changes(fake_foxops_server, fake_foxops_client):
+    # GIVEN
+    fake_foxops_server.add_incarnation("group/same", template_repository_version="v1", template_data={"a": 1})
+    fake_foxops_server.add_incarnation("group/upgrade", template_repository_version="v1", template_data={"a": 1})
+    fake_foxops_server.add_incarnation("group/data", template_repository_version="v1", template_data={"a": 1, "b": 2})
+    fake_foxops_server.add_incarnation("group/removed", template_repository_version="v1", template_data={"a": 1})
+    fake_foxops_server.add_incarnation("group/other", template_repository="group/other-template")
+    fake_foxops_server.add_incarnation("group/obsolete")
+    fake_foxops_server.add_incarnation("group/unrelated", template_repository="group/unrelated-template")
+
+    # WHEN
+    changes = await plan(
+        fake_foxops_client,
+        [
+            entry("group/same", a=1),
+            entry("group/upgrade", "v2", a=1),
+            entry("group/data", a=1, b=True),
+            entry("group/removed"),
+            entry("group/other"),
+            entry("group/new", a=1),
+        ],
+        prune=True,
+    )
+
+    # THEN
+    assert [(c.incarnation_repository, c.action) for c in changes.changes] == [
+        ("group/same", Action.NOOP),
+        ("group/upgrade", Action.PATCH),
+        ("group/data", Action.PATCH),
+        ("group/removed", Action.PUT),
+        ("group/other", Action.CONFLICT),
+        ("group/new", Action.CREATE),
+        ("group/obsolete", Action.DELETE),
+    ]
+    assert changes.changes[1].requested_version == "v2"
+    assert changes.changes[1].requested_data == {}
+    assert changes.changes[2].requested_version is None
+    assert changes.changes[2].requested_data == {"b": True}
+
+
+async def test_apply_executes_the_writes_of_the_plan(fake_foxops_server, fake_foxops_client):
+    # GIVEN
+    fake_foxops_server.add_incarnation("group/upgrade", template_repository_version="v1", template_data={"a": 1})
+    fake_foxops_server.add_incarnation("group/removed", template_repository_version="v1", template_data={"a": 1})
+    fake_foxops_server.add_incarnation("group/obsolete")
+    desired = [entry("group/upgrade", "v2", a=1, b=2), entry("group/removed", b=2), entry("group/new")]
+    changes = await plan(fake_foxops_client, desired, prune=True)
+
+    # WHEN
+    report = await apply(fake_foxops_client, changes, automerge=True)
+
+    # THEN
+    assert not report.failed
+    assert len(report.results) == 4
+    assert fake_foxops_server.incarnations[1]["template_repository_version"] == "v2"
+    assert fake_foxops_server.incarnations[1]["template_data"] == {"a": 1, "b": 2}
+    assert fake_foxops_server.incarnations[2]["template_data"] == {"b": 2}
+    assert 3 not in fake_foxops_server.incarnations
+    assert fake_foxops_server.incarnations[4]["incarnation_repository"] == "group/new"
+
+    # everything is in the desired state now
+    assert (await plan(fake_foxops_client, desired, prune=True)).writes == []
+
+
+def test_reconciling_an_unchanged_state_does_not_write(fake_foxops_server):
+    # GIVEN
+    for i in range(5):
+        fake_foxops_server.add_incarnation(f"group/repo-{i}", template_repository_version="v1", template_data={"i": i})
+    client = FoxopsClient("http://foxops", fake_foxops_server.token, transport=fake_foxops_server.transport())
+
+    # WHEN
+    report = apply_sync(client, plan_sync(client, [entry(f"group/repo-{i}", i=i) for i in range(5)]))
+
+    # THEN
+    assert report.results == []
+    assert fake_foxops_server.requests[("PATCH", "/api/incarnations/{id}")] == 0
+    assert fake_foxops_server.requests[("PUT", "/api/incarnations/{id}")] == 0
+
+
+async def test_incarnations_following_a_branch_are_always_updated(fake_foxops_server, fake_foxops_client):
+    # GIVEN
+    fake_foxops_server.add_incarnation("group/branch", template_repository_version="main", template_data={"a": 1})
+    pinned = fake_foxops_server.add_incarnation("group/pinned", template_repository_version="main")
+
+    # WHEN
+    changes = await plan(
+        fake_foxops_client,
+        [entry("group/branch", "main", a=1), entry("group/pinned", pinned["template_repository_version_hash"])],
+    )
+
+    # THEN
+    assert [c.action for c in changes.changes] == [Action.PATCH, Action.NOOP]
+    assert changes.changes[0].requested_version == "main"
+    assert changes.changes[0].requested_data == {}
@@ -0,0 +1,151 @@
+import time
+
+import httpx
+import pytest
+from tenacity import wait_none
+
+from foxops_client import AsyncFoxopsClient
+from foxops_client.retries import RetryBudget, wait_retry_after
+
+
+def responding_first(fake_foxops_server, *responses, sent=None):
+    """Returns a transport that responds with the given responses first, and with the fake server afterwards."""
+
+    pending = list(responses)
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        if sent is not None:
+            sent.append(request.method)
+        if pending:
+            return pending.pop(0)
+        return await fake_foxops_server.handle(request)
+
+    return httpx.MockTransport(handle)
+
+
+def without_backoff(client):
+    # only `Retry-After` delays, so that the tests don't sleep for the exponential backoff
+    client.retrying.wait = wait_retry_after(wait_none())
+    return client
+
+
+async def test_reads_are_retried_on_retryable_status_codes(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    sent, attempts = [], []
+    transport = responding_first(
+        fake_foxops_server,
+        httpx.Response(httpx.codes.SERVICE_UNAVAILABLE),
+        httpx.Response(httpx.codes.GATEWAY_TIMEOUT),
+        sent=sent,
+    )
+    client = without_backoff(
+        AsyncFoxopsClient("http://foxops", fake_foxops_server.token, on_retry=attempts.append, transport=transport)
+    )
+
+    # WHEN
+    incarnation = await client.get_incarnation(1)
+
+    # THEN
+    assert incarnation.id == 1
+    assert sent == ["GET"] * 3
+    assert [(a.attempt_number, a.response.status_code) for a in attempts] == [(1, 503), (2, 504)]
+    assert all(a.exception is None for a in attempts)
+
+
+async def test_retries_wait_as_requested_by_retry_after(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    attempts = []
+    transport = responding_first(
+        fake_foxops_server, httpx.Response(httpx.codes.TOO_MANY_REQUESTS, headers={"Retry-After": "0.05"})
+    )
+    client = AsyncFoxopsClient("http://foxops", fake_foxops_server.token, on_retry=attempts.append, transport=transport)
+
+    # WHEN
+    start = time.monotonic()
+    await client.get_incarnation(1)
+
+    # THEN
+    assert time.monotonic() - start >= 0.05
+    assert attempts[0].next_delay == 0.05
+
+
+async def test_writes_are_only_retried_on_gateway_errors_if_they_are_idempotent(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    sent = []
+    transport = responding_first(
+        fake_foxops_server,
+        httpx.Response(httpx.codes.GATEWAY_TIMEOUT),
+        httpx.Response(httpx.codes.BAD_GATEWAY),
+        httpx.Response(httpx.codes.SERVICE_UNAVAILABLE),
+        sent=sent,
+    )
+    client = without_backoff(AsyncFoxopsClient("http://foxops", fake_foxops_server.token, transport=transport))
+
+    # WHEN
+    with pytest.raises(httpx.HTTPStatusError) as e:
+        await client.create_incarnation("group/new", "group/template", "v1", {})
+    with pytest.raises(httpx.HTTPStatusError):
+        await client.create_incarnation("group/new", "group/template", "v1", {})
+    # the server might have processed the POST before the gateway gave up. 503 means that it didn't
+    await client.create_incarnation("group/new", "group/template", "v1", {})
+
+    # THEN
+    assert e.value.response.status_code == httpx.codes.GATEWAY_TIMEOUT
+    assert sent == ["POST", "POST", "POST", "POST"]
+    assert fake_foxops_server.requests[("POST", "/api/incarnations")] == 1
+
+
+async def test_exhausted_retry_budget_returns_the_last_response(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    sent = []
+    transport = responding_first(
+        fake_foxops_server, *[httpx.Response(httpx.codes.SERVICE_UNAVAILABLE) for _ in range(3)], sent=sent
+    )
+    budget = RetryBudget(ratio=0.0, min_retries_per_second=0.0, max_tokens=1)
+    client = without_backoff(
+        AsyncFoxopsClient("http://foxops", fake_foxops_server.token, retry_budget=budget, transport=transport)
+    )
+
+    # WHEN
+    with pytest.raises(httpx.HTTPStatusError) as first:
+        await client.get_incarnation(1)
+    with pytest.raises(httpx.HTTPStatusError):
+        await client.get_incarnation(1)
+
+    # THEN
+    assert first.value.response.status_code == httpx.codes.SERVICE_UNAVAILABLE
+    # one retry for the first call, none for the second one
+    assert sent == ["GET"] * 3
+
+
+async def test_transport_errors_are_only_retried_if_the_request_can_be_repeated(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    sent = []
+    errors = [httpx.ConnectError("refused"), httpx.ReadTimeout("timeout"), httpx.ReadTimeout("timeout")]
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        sent.append(request.method)
+        if errors:
+            raise errors.pop(0)
+        return await fake_foxops_server.handle(request)
+
+    client = without_backoff(
+        AsyncFoxopsClient("http://foxops", fake_foxops_server.token, transport=httpx.MockTransport(handle))
+    )
+
+    # WHEN
+    # the connection failed before the request was sent, so even a POST is retried. The timeout happened after
+    # sending it, so it's not
+    with pytest.raises(httpx.ReadTimeout):
+        await client.create_incarnation("group/new", "group/template", "v1", {})
+    # reads are retried on timeouts
+    incarnation = await client.get_incarnation(1)
+
+    # THEN
+    assert sent == ["POST", "POST", "GET", "GET"]
+    assert incarnation.id == 1
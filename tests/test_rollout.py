@@ -0,0 +1,134 @@
+import httpx
+import pytest
+
+from foxops_client import AsyncFoxopsClient, FoxopsClient
+from foxops_client.limits import WRITE, CircuitBreaker, CircuitState
+from foxops_client.rollout import RolloutStatus, rollout, rollout_sync
+
+
+@pytest.fixture
+def template_incarnations(fake_foxops_server):
+    fake_foxops_server.add_incarnations(4, template_repository="group/template", template_repository_version="v1")
+    fake_foxops_server.add_incarnation(template_repository="group/template", template_repository_version="v2")
+    fake_foxops_server.add_incarnation(template_repository="group/other", template_repository_version="v1")
+
+
+def failing_patches(server, failing_ids, status=httpx.codes.CONFLICT):
+    """Transport that lets patches of the given incarnations fail (with a conflict by default)."""
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        if request.method == "PATCH" and int(request.url.path.rsplit("/", 1)[1]) in failing_ids:
+            return httpx.Response(status, json={"message": "merge conflict"})
+        return await server.handle(request)
+
+    return httpx.MockTransport(handle)
+
+
+async def test_rollout_updates_all_incarnations_of_the_template(
+    fake_foxops_server, fake_foxops_client, template_incarnations
+):
+    # WHEN
+    report = await rollout(fake_foxops_client, "group/template", "v2", automerge=True)
+
+    # THEN
+    assert [r.status for r in report.results] == [RolloutStatus.UPDATED] * 4 + [RolloutStatus.UP_TO_DATE]
+    assert all(fake_foxops_server.incarnations[i]["template_repository_version"] == "v2" for i in range(1, 6))
+    assert fake_foxops_server.incarnations[6]["template_repository_version"] == "v1"
+
+
+async def test_rollout_of_a_branch_updates_incarnations_that_are_already_on_it(fake_foxops_server, fake_foxops_client):
+    # GIVEN
+    incarnations = fake_foxops_server.add_incarnations(2, template_repository_version="main")
+    fake_foxops_server.add_incarnation(template_repository_version="v1")
+
+    # WHEN
+    branch = await rollout(fake_foxops_client, "group/template", "main", automerge=True)
+    # the commit `main` currently points to
+    commit = await rollout(fake_foxops_client, "group/template", incarnations[0]["template_repository_version_hash"])
+
+    # THEN
+    # the branch might have moved since the incarnations were updated
+    assert [r.status for r in branch.results] == [RolloutStatus.UPDATED] * 3
+    assert [r.status for r in commit.results] == [RolloutStatus.UP_TO_DATE] * 3
+    assert fake_foxops_server.requests[("PATCH", "/api/incarnations/{id}")] == 3
+
+
+async def test_rollout_dry_run_does_not_change_incarnations(
+    fake_foxops_server, fake_foxops_client, template_incarnations
+):
+    # WHEN
+    report = await rollout(fake_foxops_client, "group/template", "v2", dry_run=True)
+
+    # THEN
+    assert report.counts()[RolloutStatus.WOULD_UPDATE] == 4
+    assert fake_foxops_server.requests[("PATCH", "/api/incarnations/{id}")] == 0
+
+
+async def test_rollout_stops_when_a_canary_fails(fake_foxops_server, template_incarnations):
+    # GIVEN
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, transport=failing_patches(fake_foxops_server, {1})
+    )
+
+    # WHEN
+    report = await rollout(client, "group/template", "v2", canary=2, concurrency=1)
+
+    # THEN
+    assert report.stopped
+    assert report.failed[0].incarnation_id == 1
+    assert report.failed[0].error == "merge conflict"
+    assert report.counts()[RolloutStatus.UPDATED] == 1
+    assert report.counts()[RolloutStatus.SKIPPED] == 2
+
+
+async def test_rollout_stops_when_the_error_rate_is_exceeded(fake_foxops_server, template_incarnations):
+    # GIVEN
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, transport=failing_patches(fake_foxops_server, {1, 2})
+    )
+
+    # WHEN
+    report = await rollout(client, "group/template", "v2", concurrency=1, max_error_rate=0.5, min_attempts=2)
+
+    # THEN
+    assert report.stop_reason == "2 of 2 updates failed"
+    assert report.counts()[RolloutStatus.SKIPPED] == 2
+
+
+async def test_rollout_stops_when_the_circuit_breaker_opens(fake_foxops_server, template_incarnations):
+    # GIVEN
+    breaker = CircuitBreaker(window_size=2, minimum_calls=2, open_duration=60)
+    client = AsyncFoxopsClient(
+        "http://foxops",
+        fake_foxops_server.token,
+        circuit_breaker=breaker,
+        transport=failing_patches(fake_foxops_server, {1, 2, 3, 4}, status=httpx.codes.INTERNAL_SERVER_ERROR),
+    )
+
+    # WHEN
+    report = await rollout(client, "group/template", "v2", concurrency=2)
+
+    # THEN
+    assert breaker.state(WRITE) == CircuitState.OPEN
+    assert report.stop_reason == "circuit breaker for write requests is open"
+    assert report.counts()[RolloutStatus.FAILED] == 2
+    assert report.counts()[RolloutStatus.SKIPPED] == 2
+
+
+def test_rollout_can_be_resumed(fake_foxops_server, template_incarnations, tmp_path):
+    # GIVEN
+    progress = tmp_path / "rollout.jsonl"
+    failing = FoxopsClient(
+        "http://foxops", fake_foxops_server.token, transport=failing_patches(fake_foxops_server, {3})
+    )
+    rollout_sync(failing, "group/template", "v2", progress=progress)
+    patches = fake_foxops_server.requests[("PATCH", "/api/incarnations/{id}")]
+
+    # WHEN
+    client = FoxopsClient("http://foxops", fake_foxops_server.token, transport=fake_foxops_server.transport())
+    report = rollout_sync(client, "group/template", "v2", progress=progress)
+
+    # THEN
+    assert fake_foxops_server.requests[("PATCH", "/api/incarnations/{id}")] == patches + 1
+    assert report.counts()[RolloutStatus.UPDATED] == 4
+    assert not report.failed
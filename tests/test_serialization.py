@@ -0,0 +1,150 @@
+import json
+import sys
+
+import pytest
+
+from foxops_client import AsyncFoxopsClient
+from foxops_client.serialization import JsonCodec, MsgspecCodec, OrjsonCodec
+from foxops_client.types import Incarnation, IncarnationWithDetails, LazyTemplateData
+
+
+def available_codecs():
+    codecs = [JsonCodec()]
+    for codec in (OrjsonCodec, MsgspecCodec):
+        try:
+            codecs.append(codec())
+        except ImportError:
+            pass
+    return codecs
+
+
+@pytest.fixture(params=available_codecs(), ids=lambda c: c.name)
+def codec(request):
+    return request.param
+
+
+async def test_codecs_decode_the_same_incarnations(fake_foxops_server, codec):
+    # GIVEN
+    fake_foxops_server.add_incarnations(2, template_data={"name": "foo", "nested": {"list": [1, True, None]}})
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, codec=codec, transport=fake_foxops_server.transport()
+    )
+
+    # WHEN
+    listed = await client.list_incarnations()
+    incarnation = await client.get_incarnation(2)
+
+    # THEN
+    assert listed == [Incarnation.from_dict(x) for x in fake_foxops_server.incarnations.values()]
+    assert incarnation == IncarnationWithDetails.from_dict(fake_foxops_server.incarnations[2])
+
+
+async def test_codecs_encode_request_bodies(fake_foxops_server, codec):
+    # GIVEN
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, codec=codec, transport=fake_foxops_server.transport()
+    )
+
+    # WHEN
+    incarnation = await client.create_incarnation(
+        "group/new", "group/template", "v1", {"name": "ü", "count": 1, "enabled": False}
+    )
+
+    # THEN
+    assert incarnation.template_data == {"name": "ü", "count": 1, "enabled": False}
+    assert json.loads(codec.encode(incarnation.template_data)) == incarnation.template_data
+
+
+@pytest.mark.parametrize("lazy_template_data", [False, True])
+async def test_msgspec_codec_interns_shared_strings(fake_foxops_server, lazy_template_data):
+    # GIVEN
+    pytest.importorskip("msgspec")
+    fake_foxops_server.add_incarnation("group/repo", target_directory="a")
+    fake_foxops_server.add_incarnation("group/repo", target_directory="b")
+    client = AsyncFoxopsClient(
+        "http://foxops",
+        fake_foxops_server.token,
+        codec=MsgspecCodec(lazy_template_data=lazy_template_data),
+        transport=fake_foxops_server.transport(),
+    )
+
+    # WHEN
+    listed = await client.list_incarnations()
+    details = [await client.get_incarnation(1), await client.get_incarnation(2)]
+
+    # THEN
+    repository = sys.intern("group/repo")
+    assert all(x.incarnation_repository is repository for x in listed + details)
+    assert details[0].target_directory is sys.intern("a")
+    assert details[0].template_repository is details[1].template_repository
+    assert details[0].template_repository_version is details[1].template_repository_version
+
+
+async def test_lazy_template_data_is_decoded_on_access(fake_foxops_server):
+    # GIVEN
+    pytest.importorskip("msgspec")
+    fake_foxops_server.add_incarnation(template_data={"name": "foo", "nested": {"list": [1, 2]}})
+    client = AsyncFoxopsClient(
+        "http://foxops",
+        fake_foxops_server.token,
+        codec=MsgspecCodec(lazy_template_data=True),
+        transport=fake_foxops_server.transport(),
+    )
+
+    # WHEN
+    incarnation = await client.get_incarnation(1)
+
+    # THEN
+    assert isinstance(incarnation.template_data, LazyTemplateData)
+    assert incarnation.template_data.raw is not None
+    assert incarnation.template_data["nested"] == {"list": [1, 2]}
+    assert incarnation.template_data == {"name": "foo", "nested": {"list": [1, 2]}}
+
+    # template data can be passed on to writes, decoded or not
+    updated = await client.put_incarnation(1, True, "v2", incarnation.template_data_full)
+    assert updated.template_data == incarnation.template_data
+
+
+def test_clients_use_the_standard_library_codec_by_default(fake_foxops_server):
+    # WHEN
+    client = AsyncFoxopsClient("http://foxops", fake_foxops_server.token, transport=fake_foxops_server.transport())
+
+    # THEN
+    assert type(client.codec) is JsonCodec
+
+
+async def test_codecs_decode_fields_with_unexpected_types(fake_foxops_server, codec):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    fake_foxops_server.incarnations[1]["merge_request_id"] = 42
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, codec=codec, transport=fake_foxops_server.transport()
+    )
+
+    # WHEN
+    incarnation = await client.get_incarnation(1)
+    listed = await client.list_incarnations()
+
+    # THEN
+    assert incarnation.merge_request_id == 42
+    assert listed[0].merge_request_id == 42
+
+
+async def test_lazy_msgspec_codec_decodes_fields_with_unexpected_types(fake_foxops_server):
+    # GIVEN
+    pytest.importorskip("msgspec")
+    fake_foxops_server.add_incarnation(template_data={"name": "foo"})
+    fake_foxops_server.incarnations[1]["merge_request_id"] = 42
+    client = AsyncFoxopsClient(
+        "http://foxops",
+        fake_foxops_server.token,
+        codec=MsgspecCodec(lazy_template_data=True),
+        transport=fake_foxops_server.transport(),
+    )
+
+    # WHEN
+    incarnation = await client.get_incarnation(1)
+
+    # THEN
+    assert incarnation.merge_request_id == 42
+    assert incarnation.template_data == {"name": "foo"}
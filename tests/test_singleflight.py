@@ -0,0 +1,73 @@
+import asyncio
+
+from foxops_client import AsyncFoxopsClient, IncarnationDoesNotExistError
+from foxops_client.singleflight import SingleFlight
+
+
+async def test_concurrent_identical_reads_are_coalesced(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    fake_foxops_server.latency = 0.01
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, coalesce_reads=True, transport=fake_foxops_server.transport()
+    )
+
+    # WHEN
+    results = await asyncio.gather(*[client.get_incarnation(1) for _ in range(10)])
+
+    # THEN
+    assert all(r is results[0] for r in results)
+    assert fake_foxops_server.requests[("GET", "/api/incarnations/{id}")] == 1
+
+
+async def test_coalesced_callers_share_the_error(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.latency = 0.01
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, coalesce_reads=True, transport=fake_foxops_server.transport()
+    )
+
+    # WHEN
+    results = await asyncio.gather(*[client.get_incarnation(1) for _ in range(3)], return_exceptions=True)
+
+    # THEN
+    assert all(isinstance(r, IncarnationDoesNotExistError) for r in results)
+    assert fake_foxops_server.requests[("GET", "/api/incarnations/{id}")] == 1
+    assert len(client.single_flight) == 0
+
+
+async def test_cancelling_a_caller_does_not_cancel_the_others():
+    # GIVEN
+    single_flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def fn():
+        await release.wait()
+        return "result"
+
+    first = asyncio.create_task(single_flight.do("key", fn))
+    second = asyncio.create_task(single_flight.do("key", fn))
+    await asyncio.sleep(0)
+
+    # WHEN
+    first.cancel()
+    release.set()
+
+    # THEN
+    assert await second == "result"
+    assert first.cancelled()
+    assert single_flight.coalesced == 1
+
+
+async def test_writes_are_not_coalesced(fake_foxops_server):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, coalesce_reads=True, transport=fake_foxops_server.transport()
+    )
+
+    # WHEN
+    await asyncio.gather(*[client.patch_incarnation(1, automerge=True) for _ in range(3)])
+
+    # THEN
+    assert fake_foxops_server.requests[("PATCH", "/api/incarnations/{id}")] == 3
@@ -0,0 +1,115 @@
+import asyncio
+
+from foxops_client import AsyncFoxopsClient
+from foxops_client.cache import ResponseCache
+from foxops_client.snapshot import load_snapshot, save_snapshot
+from foxops_client.testing import FakeFoxopsServer
+
+
+async def test_snapshot_warms_the_cache_of_a_new_client(fake_foxops_server, tmp_path):
+    # GIVEN
+    fake_foxops_server.add_incarnations(3, automerge=False)
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, cache=ResponseCache(), transport=fake_foxops_server.transport()
+    )
+    incarnations = await client.list_incarnations()
+    incarnation = await client.get_incarnation(2)
+    assert save_snapshot(client.cache, tmp_path / "snapshot", "http://foxops") == 2
+    requests = sum(fake_foxops_server.requests.values())
+
+    # WHEN
+    cache = ResponseCache()
+    restored = load_snapshot(cache, tmp_path / "snapshot", "http://foxops")
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, cache=cache, transport=fake_foxops_server.transport()
+    )
+
+    # THEN
+    assert restored == 2
+    assert await client.list_incarnations() == incarnations
+    assert await client.get_incarnation(2) == incarnation
+    assert sum(fake_foxops_server.requests.values()) == requests
+
+
+async def test_stale_snapshot_entries_are_revalidated_in_the_background(fake_foxops_server, tmp_path):
+    # GIVEN
+    fake_foxops_server.etags = True
+    fake_foxops_server.add_incarnation()
+    client = AsyncFoxopsClient(
+        "http://foxops",
+        fake_foxops_server.token,
+        cache=ResponseCache(get_incarnation_ttl=0),
+        transport=fake_foxops_server.transport(),
+    )
+    await client.get_incarnation(1)
+    save_snapshot(client.cache, tmp_path / "snapshot", "http://foxops")
+
+    cache = ResponseCache(stale_while_revalidate=60)
+    load_snapshot(cache, tmp_path / "snapshot", "http://foxops")
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, cache=cache, transport=fake_foxops_server.transport()
+    )
+    await client.patch_incarnation(1, automerge=True, requested_version="v2")
+    load_snapshot(cache, tmp_path / "snapshot", "http://foxops")
+
+    # WHEN
+    stale = await client.get_incarnation(1)
+    await asyncio.sleep(0.01)
+    fresh = await client.get_incarnation(1)
+
+    # THEN
+    assert stale.template_repository_version == "v1.0.0"
+    assert cache.stats.stale_hits >= 1
+    assert fresh.template_repository_version == "v2"
+
+
+async def test_stale_snapshot_entries_without_etag_are_served_while_they_are_downloaded_again(tmp_path):
+    # GIVEN
+    server = FakeFoxopsServer(etags=False)
+    server.add_incarnation()
+    client = AsyncFoxopsClient(
+        "http://foxops", server.token, cache=ResponseCache(get_incarnation_ttl=0), transport=server.transport()
+    )
+    await client.get_incarnation(1)
+    save_snapshot(client.cache, tmp_path / "snapshot", "http://foxops")
+    await client.patch_incarnation(1, automerge=True, requested_version="v2")
+
+    cache = ResponseCache(stale_while_revalidate=60)
+    assert load_snapshot(cache, tmp_path / "snapshot", "http://foxops") == 1
+    assert load_snapshot(ResponseCache(), tmp_path / "snapshot", "http://foxops") == 0
+    client = AsyncFoxopsClient("http://foxops", server.token, cache=cache, transport=server.transport())
+
+    # WHEN
+    stale = await client.get_incarnation(1)
+    await asyncio.sleep(0.01)
+    fresh = await client.get_incarnation(1)
+
+    # THEN
+    assert stale.template_repository_version == "v1.0.0"
+    assert cache.stats.stale_hits == 1
+    assert fresh.template_repository_version == "v2"
+
+
+def test_unreadable_snapshots_are_ignored(tmp_path):
+    (tmp_path / "snapshot").write_bytes(b"FOXSNAP\0garbage")
+
+    assert load_snapshot(ResponseCache(), tmp_path / "snapshot", "http://foxops") == 0
+    assert load_snapshot(ResponseCache(), tmp_path / "missing", "http://foxops") == 0
+
+
+async def test_snapshots_of_another_server_are_ignored(fake_foxops_server, tmp_path):
+    # GIVEN
+    fake_foxops_server.add_incarnation()
+    client = AsyncFoxopsClient(
+        "http://foxops", fake_foxops_server.token, cache=ResponseCache(), transport=fake_foxops_server.transport()
+    )
+    await client.get_incarnation(1)
+    save_snapshot(client.cache, tmp_path / "snapshot", "http://foxops/")
+
+    # WHEN
+    other = load_snapshot(ResponseCache(), tmp_path / "snapshot", "http://other")
+    same = load_snapshot(ResponseCache(), tmp_path / "snapshot", client.base_url)
+
+    # THEN
+    assert other == 0
+    assert same == 1
@@ -0,0 +1,70 @@
+import dataclasses
+import sys
+
+import pytest
+
+from foxops_client.types import (
+    Incarnation,
+    IncarnationWithDetails,
+    MergeRequestStatus,
+)
+
+
+def api_incarnation(**kwargs):
+    return {
+        "id": 1,
+        "incarnation_repository": "group/repo",
+        "target_directory": ".",
+        "commit_sha": "abc",
+        "commit_url": "https://gitlab.example.com/group/repo/-/commit/abc",
+        "merge_request_id": "7",
+        "merge_request_url": "https://gitlab.example.com/group/repo/-/merge_requests/7",
+        "merge_request_status": "open",
+        "template_repository": "group/template",
+        "template_repository_version": "v1.0.0",
+        "template_repository_version_hash": "0123abc",
+        "template_data": {"name": "foo"},
+        "template_data_full": {"name": "foo", "default": 1},
+        **kwargs,
+    }
+
+
+def test_incarnation_with_details_round_trips_through_its_api_representation():
+    # GIVEN
+    data = api_incarnation()
+
+    # WHEN
+    incarnation = IncarnationWithDetails.from_dict(data)
+
+    # THEN
+    assert incarnation.merge_request_status == MergeRequestStatus.OPEN
+    assert incarnation.to_dict() == data
+
+
+def test_incarnation_ignores_the_fields_of_the_details():
+    incarnation = Incarnation.from_dict(api_incarnation())
+
+    assert not hasattr(incarnation, "template_data")
+    assert incarnation.to_dict() == {
+        key: value
+        for key, value in api_incarnation().items()
+        if key in {f.name for f in dataclasses.fields(Incarnation)}
+    }
+
+
+def test_incarnations_are_slotted_and_immutable():
+    incarnation = IncarnationWithDetails.from_dict(api_incarnation(merge_request_status=None))
+
+    assert not hasattr(incarnation, "__dict__")
+    assert incarnation.merge_request_status is None
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        incarnation.commit_sha = "def"  # type: ignore[misc]
+
+
+def test_shared_strings_are_interned():
+    # the strings are built at runtime, so that they are different objects before interning
+    a = IncarnationWithDetails.from_dict(api_incarnation(incarnation_repository="".join(["group/", "repo"])))
+    b = IncarnationWithDetails.from_dict(api_incarnation(incarnation_repository="".join(["group/", "repo"])))
+
+    assert a.incarnation_repository is b.incarnation_repository is sys.intern("group/repo")
+    assert a.template_repository_version is b.template_repository_version
@@ -0,0 +1,46 @@
+import asyncio
+
+from foxops_client.types import MergeRequestStatus
+from foxops_client.watch import MergeRequestWatcher
+
+
+async def test_watcher_reports_merged_and_deleted_incarnations(fake_foxops_server, fake_foxops_client):
+    # GIVEN
+    fake_foxops_server.add_incarnations(3, automerge=False)
+    watcher = MergeRequestWatcher(fake_foxops_client, requests_per_second=1000, min_interval=0.01, max_interval=0.05)
+    for incarnation_id in (1, 2, 3):
+        watcher.watch(incarnation_id)
+
+    # far enough apart (compared to max_interval) that the transitions are seen in this order
+    loop = asyncio.get_running_loop()
+    loop.call_later(0.05, fake_foxops_server.merge, 1)
+    loop.call_later(0.2, fake_foxops_server.incarnations.pop, 2)
+    loop.call_later(0.35, fake_foxops_server.merge, 3, "closed")
+
+    # WHEN
+    transitions = [t async for t in watcher.transitions()]
+
+    # THEN
+    assert [(t.incarnation_id, t.current) for t in transitions] == [
+        (1, MergeRequestStatus.MERGED),
+        (2, None),
+        (3, MergeRequestStatus.CLOSED),
+    ]
+    assert transitions[1].incarnation is None
+    assert len(watcher) == 0
+
+
+async def test_watcher_polls_unchanged_incarnations_less_often(fake_foxops_server, fake_foxops_client):
+    # GIVEN
+    fake_foxops_server.add_incarnation(automerge=False)
+    watcher = MergeRequestWatcher(fake_foxops_client, requests_per_second=1000, min_interval=0.01, backoff=2, jitter=0)
+    watcher.watch(1)
+    asyncio.get_running_loop().call_later(0.3, fake_foxops_server.merge, 1)
+
+    # WHEN
+    transitions = [t async for t in watcher.transitions()]
+
+    # THEN
+    assert transitions[0].current == MergeRequestStatus.MERGED
+    # 0.01 * (1 + 2 + 4 + 8 + 16) = 0.31
+    assert watcher.polls <= 6